@@ -9,11 +9,94 @@ class Settings:
     HF_TOKEN: str = _clean(os.getenv("HF_TOKEN", ""))
     HF_MODEL: str = _clean(os.getenv("HF_MODEL", "HuggingFaceH4/zephyr-7b-beta"))
     EMBED_MODEL: str = _clean(os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    # backend de inferência dos embeddings: torch | onnx | onnx_int8 (ONNX quantizado p/ CPU)
+    EMBED_BACKEND: str = _clean(os.getenv("EMBED_BACKEND", "torch")).lower()
+    EMBED_ONNX_QCONFIG: str = _clean(os.getenv("EMBED_ONNX_QCONFIG", "avx2"))  # arm64 | avx2 | avx512 | avx512_vnni
+    # cache de embeddings: LRU em memória (nº de vetores) + cópia em disco em INDEX_DIR/embed_cache
+    EMBED_CACHE_SIZE: int = int(_clean(os.getenv("EMBED_CACHE_SIZE", "10000")))
+    EMBED_CACHE_DISK: bool = _clean(os.getenv("EMBED_CACHE_DISK", "1")) == "1"
+    EMBED_CACHE_DISK_MAX: int = int(_clean(os.getenv("EMBED_CACHE_DISK_MAX", "1000000")))  # 0 = sem limite
+    # cache semântico de respostas: pergunta com embedding a cosine ≥ ANSWER_CACHE_SIM de uma já respondida
+    # (mesmo top_k / faixa de temperatura / system prompt / parâmetros da busca) reaproveita a resposta;
+    # zera quando o índice muda. Desligado por padrão: paráfrases próximas podem pedir coisas diferentes
+    ANSWER_CACHE_SIZE: int = int(_clean(os.getenv("ANSWER_CACHE_SIZE", "0")))  # 0 = desliga
+    ANSWER_CACHE_SIM: float = float(_clean(os.getenv("ANSWER_CACHE_SIM", "0.95")))
+    ANSWER_CACHE_TTL_S: float = float(_clean(os.getenv("ANSWER_CACHE_TTL_S", "3600")))  # 0 = sem expiração
+    ANSWER_CACHE_TEMP_STEP: float = float(_clean(os.getenv("ANSWER_CACHE_TEMP_STEP", "0.25")))
+    # cache dos hits da recuperação (pergunta normalizada, k, filtros) → contextos; zera quando o índice muda
+    RETRIEVAL_CACHE_SIZE: int = int(_clean(os.getenv("RETRIEVAL_CACHE_SIZE", "2048")))  # 0 = desliga
+    # micro-batching de encodes concorrentes: espera até MAX_WAIT_MS ou MAX_SIZE textos e roda 1 forward
+    EMBED_MICROBATCH: bool = _clean(os.getenv("EMBED_MICROBATCH", "1")) == "1"
+    EMBED_BATCH_MAX_WAIT_MS: float = float(_clean(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5")))
+    EMBED_BATCH_MAX_SIZE: int = int(_clean(os.getenv("EMBED_BATCH_MAX_SIZE", "32")))
+    # lotes do model.encode por orçamento de tokens (itens × maior sequência); 0 = batch fixo do modelo
+    EMBED_TOKEN_BUDGET: int = int(_clean(os.getenv("EMBED_TOKEN_BUDGET", "8192")))
+    EMBED_MAX_BATCH: int = int(_clean(os.getenv("EMBED_MAX_BATCH", "256")))  # teto de itens por lote
+    # pool de processos p/ ingestão em massa (cada worker carrega uma cópia do modelo; 0 = desliga)
+    EMBED_POOL_WORKERS: int = int(_clean(os.getenv("EMBED_POOL_WORKERS", "0")))
+    EMBED_POOL_MIN_TEXTS: int = int(_clean(os.getenv("EMBED_POOL_MIN_TEXTS", "512")))  # abaixo disso: no processo
+    EMBED_POOL_CHUNK: int = int(_clean(os.getenv("EMBED_POOL_CHUNK", "128")))  # textos por tarefa
+
+    # chunking: "tokens" usa o tokenizer do EMBED_MODEL (orçamento = max_seq_length); "words" = split por palavras
+    CHUNK_MODE: str = _clean(os.getenv("CHUNK_MODE", "tokens")).lower()
+    CHUNK_MAX_TOKENS: int = int(_clean(os.getenv("CHUNK_MAX_TOKENS", "0")))  # 0 = max_seq_length do modelo
+    CHUNK_OVERLAP_TOKENS: int = int(_clean(os.getenv("CHUNK_OVERLAP_TOKENS", "32")))
+    # ingestão de arquivos em fluxo: bytes por leitura do upload e chunks por lote de encode + add
+    INGEST_READ_BYTES: int = int(_clean(os.getenv("INGEST_READ_BYTES", str(1024 * 1024))))
+    INGEST_BATCH_SIZE: int = int(_clean(os.getenv("INGEST_BATCH_SIZE", "1024")))
+    # jobs de ingestão: executor próprio (limita a concorrência) + fila limitada (429 quando cheia)
+    INGEST_WORKERS: int = int(_clean(os.getenv("INGEST_WORKERS", "1")))
+    INGEST_MAX_PENDING: int = int(_clean(os.getenv("INGEST_MAX_PENDING", "16")))
+    INGEST_JOBS_KEEP: int = int(_clean(os.getenv("INGEST_JOBS_KEEP", "100")))  # jobs terminados consultáveis
+    INGEST_SPOOL_DIR: str = _clean(os.getenv("INGEST_SPOOL_DIR", ""))  # uploads em espera (padrão: temp do SO)
+
+    # busca híbrida: candidatos densos (FAISS) + lexicais (BM25) fundidos por Reciprocal Rank Fusion
+    HYBRID_SEARCH: bool = _clean(os.getenv("HYBRID_SEARCH", "1")) == "1"
+    HYBRID_CANDIDATES: int = int(_clean(os.getenv("HYBRID_CANDIDATES", "20")))  # por lista, antes da fusão
+    RRF_K: int = int(_clean(os.getenv("RRF_K", "60")))
+    # MMR: diversifica o top-k (chunks sobrepostos viram 1 contexto só) antes de montar o prompt
+    MMR_ENABLED: bool = _clean(os.getenv("MMR_ENABLED", "0")) == "1"
+    MMR_LAMBDA: float = float(_clean(os.getenv("MMR_LAMBDA", "0.7")))        # 1 = só relevância
+    MMR_CANDIDATES: int = int(_clean(os.getenv("MMR_CANDIDATES", "20")))     # pool de onde saem os k
+    MMR_DUP_SIM: float = float(_clean(os.getenv("MMR_DUP_SIM", "0.9")))      # cosine entre chunks acima disso = duplicata
+
+    # 🔽 startup: modelos/índice carregam em background; até ficar pronto, a API responde 503
+    READINESS_GATE: bool = _clean(os.getenv("READINESS_GATE", "1")) == "1"
 
     # 🔽 persistência e seed
     INDEX_DIR: str = _clean(os.getenv("INDEX_DIR", "data"))
     PERSIST_INDEX: bool = _clean(os.getenv("PERSIST_INDEX", "1")) == "1"
     AUTO_SEED: bool = _clean(os.getenv("AUTO_SEED", "1")) == "1"   # semea se vazio
+    # WAL: cada ingestão é anexada em disco; checkpoints periódicos consolidam o snapshot
+    WAL_FSYNC: bool = _clean(os.getenv("WAL_FSYNC", "1")) == "1"
+    WAL_CHECKPOINT_SECS: int = int(_clean(os.getenv("WAL_CHECKPOINT_SECS", "300")))
+    # abre o índice FAISS via mmap (páginas sob demanda) e o doc store de forma preguiçosa
+    INDEX_MMAP: bool = _clean(os.getenv("INDEX_MMAP", "1")) == "1"
+    WAL_CHECKPOINT_BYTES: int = int(_clean(os.getenv("WAL_CHECKPOINT_BYTES", str(256 * 1024 * 1024))))
+    # remoção lógica: compacta (reconstrói sem os removidos) quando a fração removida passa disso
+    COMPACT_THRESHOLD: float = float(_clean(os.getenv("COMPACT_THRESHOLD", "0.2")))
+
+    # 🔽 shards: N índices independentes (docs roteados por hash, busca em paralelo + merge top-k)
+    INDEX_SHARDS: int = int(_clean(os.getenv("INDEX_SHARDS", "1")))
+
+    # 🔽 tipo de índice: flat | ivf_flat | hnsw | ivf_pq | sq8 | fp16
+    # (começa em IndexFlatIP e é promovido p/ o ANN ao atingir INDEX_PROMOTE_AT docs)
+    INDEX_TYPE: str = _clean(os.getenv("INDEX_TYPE", "flat")).lower()
+    INDEX_PROMOTE_AT: int = int(_clean(os.getenv("INDEX_PROMOTE_AT", "50000")))
+    IVF_NLIST: int = int(_clean(os.getenv("IVF_NLIST", "0")))        # 0 = automático (~4*sqrt(n))
+    IVF_NPROBE: int = int(_clean(os.getenv("IVF_NPROBE", "16")))
+    PQ_M: int = int(_clean(os.getenv("PQ_M", "48")))                 # subquantizadores (divide a dimensão)
+    PQ_NBITS: int = int(_clean(os.getenv("PQ_NBITS", "8")))
+    HNSW_M: int = int(_clean(os.getenv("HNSW_M", "32")))
+    HNSW_EF_CONSTRUCTION: int = int(_clean(os.getenv("HNSW_EF_CONSTRUCTION", "200")))
+    HNSW_EF_SEARCH: int = int(_clean(os.getenv("HNSW_EF_SEARCH", "64")))
+    # índices quantizados (sq8/fp16/ivf_pq): busca k*RESCORE_FACTOR candidatos e reordena pelo
+    # cosine exato (vetores float32 do doc store, via mmap); 0 = desliga
+    RESCORE_FACTOR: int = int(_clean(os.getenv("RESCORE_FACTOR", "4")))
+    # corte por similaridade via faiss range_search (raio = MIN_SIM); 0 = top-k + corte
+    RANGE_SEARCH: bool = _clean(os.getenv("RANGE_SEARCH", "0")) == "1"
+    # busca com filtro de metadados: até esse nº de docs filtrados usa força bruta exata (numpy)
+    FILTER_BRUTE_FORCE_MAX: int = int(_clean(os.getenv("FILTER_BRUTE_FORCE_MAX", "20000")))
 
     # fallback local (se você já tiver isso)
     HF_USE_LOCAL: bool = _clean(os.getenv("HF_USE_LOCAL", "0")) == "1"
@@ -1,5 +1,7 @@
 import os
 import json
+import threading
+from typing import Any, Dict, Iterator, Optional
 import requests
 from fastapi import HTTPException
 from app.core.config import settings
@@ -10,6 +12,9 @@ from app.core.config import settings
 # - faltou HF_TOKEN/HF_MODEL, OU
 # - a Inference API falhar (404/5xx/rede)
 # ------------------------------------------------------------
+# sequências que indicam eco do prompt: a resposta termina antes delas
+STOP_SEQUENCES = ["### CONTEXTO", "### PERGUNTA", "### HISTÓRICO", "### RESPOSTA", "```"]
+
 _LOCAL_PIPE = None
 _LOCAL_TASK = None  # guarda a task atual p/ reusar pipeline
 
@@ -21,7 +26,10 @@ def _pick_local_task(model_name: str) -> str:
         return "text2text-generation"
     return "text-generation"
 
-def _local_generate(prompt: str, temperature: float, max_new_tokens: int) -> str:
+_LOCAL_LOCK = threading.Lock()
+
+def _get_local_pipe():
+    """Carrega (uma vez) o pipeline local; chamado no warmup do startup ou no 1º uso."""
     global _LOCAL_PIPE, _LOCAL_TASK
     try:
         from transformers import pipeline
@@ -34,19 +42,33 @@ def _local_generate(prompt: str, temperature: float, max_new_tokens: int) -> str
     local_model = getattr(settings, "LOCAL_MODEL", None) or os.getenv("LOCAL_MODEL") or "google/flan-t5-small"
     task = _pick_local_task(local_model)
 
-    try:
-        if _LOCAL_PIPE is None or _LOCAL_TASK != task:
-            _LOCAL_PIPE = pipeline(task, model=local_model)
-            _LOCAL_TASK = task
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Falha ao carregar modelo local '{local_model}' (task={task}): {e}",
-        )
+    with _LOCAL_LOCK:
+        try:
+            if _LOCAL_PIPE is None or _LOCAL_TASK != task:
+                _LOCAL_PIPE = pipeline(task, model=local_model)
+                _LOCAL_TASK = task
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Falha ao carregar modelo local '{local_model}' (task={task}): {e}",
+            )
+    return _LOCAL_PIPE, task
+
+def uses_local_model() -> bool:
+    """True se as respostas vão (ou podem ir direto) para o modelo local."""
+    has_remote = bool((settings.HF_TOKEN or "").strip() and (settings.HF_MODEL or "").strip())
+    return _should_force_local() or not has_remote
+
+def warmup_local_model() -> None:
+    """Carrega o pipeline local e roda 1 geração curta (só faz sentido se uses_local_model())."""
+    _local_generate("ok", temperature=0.1, max_new_tokens=1)
+
+def _local_generate(prompt: str, temperature: float, max_new_tokens: int) -> str:
+    pipe, task = _get_local_pipe()
 
     try:
         if task == "text-generation":
-            out = _LOCAL_PIPE(
+            out = pipe(
                 prompt,
                 do_sample=True,
                 temperature=float(temperature),
@@ -58,7 +80,7 @@ def _local_generate(prompt: str, temperature: float, max_new_tokens: int) -> str
             return out.strip()
         else:
             # text2text-generation (Flan/T5) — já retorna só a resposta
-            out = _LOCAL_PIPE(
+            out = pipe(
                 prompt,
                 max_new_tokens=int(max_new_tokens),
             )[0]["generated_text"]
@@ -103,7 +125,7 @@ def call_hf_inference(
             "temperature": float(temperature),
             "return_full_text": False,
             # ajuda a evitar eco do prompt/contexto (nem todo modelo respeita)
-            "stop": ["### CONTEXTO", "### PERGUNTA", "### HISTÓRICO", "### RESPOSTA", "```"]
+            "stop": STOP_SEQUENCES
         },
         "options": {"wait_for_model": True},  # aguarda container "acordar"
     }
@@ -142,3 +164,105 @@ def call_hf_inference(
             raise HTTPException(status_code=502, detail=f"Falha de rede ao chamar a Inference API: {e}")
         # rede falhou → fallback local
         return _local_generate(prompt, temperature, max_new_tokens)
+
+# ------------------------------------------------------------
+# Streaming (SSE): gera pedaços de texto conforme o modelo produz
+# - quem consome pode parar a qualquer momento com gen.close():
+#   local → StoppingCriteria interrompe o generate; remoto → fecha a conexão
+# - stats["tokens"] = tokens gerados de fato (p/ medir o que o corte economizou)
+# ------------------------------------------------------------
+def _local_stream(
+    prompt: str, temperature: float, max_new_tokens: int, stats: Dict[str, Any]
+) -> Iterator[str]:
+    pipe, task = _get_local_pipe()
+    try:
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Streaming local indisponível: {e}")
+
+    stop = threading.Event()
+    errors: list = []
+
+    class _Cancel(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            stats["tokens"] = stats.get("tokens", 0) + 1
+            return stop.is_set()
+
+    tok, model = pipe.tokenizer, pipe.model
+    streamer = TextIteratorStreamer(tok, skip_prompt=True, skip_special_tokens=True, timeout=120)
+    gen_kwargs = dict(
+        **tok(prompt, return_tensors="pt").to(model.device),
+        streamer=streamer,
+        max_new_tokens=int(max_new_tokens),
+        stopping_criteria=StoppingCriteriaList([_Cancel()]),
+    )
+    if task == "text-generation":  # mesmos parâmetros do _local_generate
+        gen_kwargs.update(do_sample=True, temperature=float(temperature), pad_token_id=tok.eos_token_id)
+
+    def _run():
+        try:
+            model.generate(**gen_kwargs)
+        except Exception as e:
+            errors.append(e)
+            streamer.end()  # destrava o consumidor
+
+    threading.Thread(target=_run, name="llm-stream", daemon=True).start()
+    try:
+        for piece in streamer:
+            if piece:
+                yield piece
+    finally:
+        stop.set()  # GeneratorExit (resposta completa / cliente saiu) → para de gerar
+    if errors:
+        raise HTTPException(status_code=500, detail=f"Falha ao gerar localmente: {errors[0]}")
+
+def _remote_stream(
+    prompt: str, temperature: float, max_new_tokens: int, stats: Dict[str, Any], model_id: str, token: str
+) -> Iterator[str]:
+    """Inference API com "stream": true (eventos SSE com um token cada). Erro antes do 1º token → local."""
+    url = f"https://api-inference.huggingface.co/models/{model_id}"
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    payload = {
+        "inputs": prompt,
+        "parameters": {
+            "max_new_tokens": int(max_new_tokens),
+            "temperature": float(temperature),
+            "return_full_text": False,
+            "stop": STOP_SEQUENCES,
+        },
+        "options": {"wait_for_model": True},
+        "stream": True,
+    }
+    started = False
+    try:
+        with requests.post(url, headers=headers, data=json.dumps(payload), timeout=60, stream=True) as r:
+            if r.status_code == 200:
+                for line in r.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    ev = json.loads(line[5:])
+                    tk = ev.get("token") or {}
+                    if tk.get("special") or not tk.get("text"):
+                        continue
+                    stats["tokens"] = stats.get("tokens", 0) + 1
+                    started = True
+                    yield tk["text"]  # close() aqui sai do `with` → conexão fechada, servidor para
+    except requests.exceptions.RequestException:
+        if started:
+            return  # já mandou parte da resposta: termina com o que tem
+    if not started:
+        yield from _local_stream(prompt, temperature, max_new_tokens, stats)
+
+def stream_hf_inference(
+    prompt: str,
+    temperature: float = 0.7,
+    max_new_tokens: int = 256,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Iterator[str]:
+    """Versão em streaming do call_hf_inference (mesma escolha local × remoto e mesmo fallback)."""
+    stats = stats if stats is not None else {}
+    model_id = (getattr(settings, "HF_MODEL", "") or "").strip()
+    token = (getattr(settings, "HF_TOKEN", "") or "").strip()
+    if _should_force_local() or not token or not model_id:
+        return _local_stream(prompt, temperature, max_new_tokens, stats)
+    return _remote_stream(prompt, temperature, max_new_tokens, stats, model_id, token)
@@ -1,13 +1,17 @@
 # app/main.py
 import os
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse, PlainTextResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import RedirectResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routes import health, ingest, query, chat
-from app.services.bootstrap import load_or_seed
+from app.routes import health, ingest, query, chat, documents
+from app.services.bootstrap import load_index, seed_if_empty
 from app.services.index import vector_index
+from app.services.embeddings import embeddings_service
+from app.services.readiness import readiness
+from app.services.jobs import ingest_jobs
 from app.core.config import settings
+from app.core.llm import uses_local_model, warmup_local_model
 
 # -------------------------------------------------
 # FastAPI + OpenAPI UIs nativas (sem CDN)
@@ -42,6 +46,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# -------------------------------------------------
+# Readiness gate: enquanto os modelos/índice aquecem, só health/docs respondem
+# (o probe de liveness passa de imediato; o tráfego espera o /health/ready)
+# -------------------------------------------------
+_ALWAYS_OPEN = ("/health", "/docs", "/redoc", "/openapi.json", "/debug", "/favicon.ico")
+
+@app.middleware("http")
+async def _readiness_gate(request: Request, call_next):
+    path = request.url.path
+    if settings.READINESS_GATE and not readiness.ready and path != "/" and not path.startswith(_ALWAYS_OPEN):
+        snap = readiness.snapshot()
+        detail = (
+            "Serviço aquecendo (modelos/índice carregando)." if snap["status"] == "starting"
+            else "Falha na carga de componente obrigatório: "
+            + ", ".join(n for n in snap["degraded"] if snap["components"][n].get("required")) + "."
+        )
+        return JSONResponse(
+            status_code=503,
+            content={"detail": detail, **snap},
+            headers={"Retry-After": "5"},
+        )
+    return await call_next(request)
+
 # -------------------------------------------------
 # Rotas
 # -------------------------------------------------
@@ -49,6 +76,7 @@ app.include_router(health.router, tags=["health"])
 app.include_router(ingest.router, tags=["ingest"])
 app.include_router(query.router, tags=["query"])
 app.include_router(chat.router, tags=["chat"])
+app.include_router(documents.router, tags=["documents"])
 
 # Raiz → Swagger nativo
 @app.get("/", include_in_schema=False)
@@ -63,22 +91,58 @@ def favicon():
 # -------------------------------------------------
 # Ciclo de vida
 # -------------------------------------------------
+def _load_index():
+    total = load_index()
+    print(f"[startup] docs carregados: {total}")
+    if getattr(settings, "PERSIST_INDEX", False):
+        vector_index.start_checkpointer()
+
+def _seed_index():
+    total = seed_if_empty()
+    print(f"[startup] docs após o seed: {total}")
+
+def _warm_embeddings():
+    embeddings_service.load()
+    embeddings_service.warmup()
+
 @app.on_event("startup")
 def _on_startup():
-    # Não travar a UI se o seed falhar
-    try:
-        total = load_or_seed()
-        print(f"[startup] docs carregados: {total}")
-    except Exception as e:
-        print(f"[startup] load_or_seed falhou: {e}")
+    # Carga em background: o servidor sobe na hora (liveness) e só fica "ready" quando aquecer.
+    # O índice abre em paralelo com o modelo de embeddings (o seed, se houver, espera o modelo).
+    # Falha de um obrigatório mantém o 503 (com o erro no corpo); a de um opcional só marca "degraded".
+    tasks = [
+        ("embeddings", _warm_embeddings, True, None),
+        ("index", _load_index, True, None),
+    ]
+    if settings.AUTO_SEED:
+        # opcional: não travar a UI se o seed falhar
+        tasks.append(("seed", _seed_index, False, "index"))
+    if uses_local_model():
+        # opcional: se o fallback local falhar, ingestão/busca continuam disponíveis
+        tasks.append(("llm_local", warmup_local_model, False, None))
+    else:
+        readiness.skip("llm_local", "Inference API remota")
+    if embeddings_service.pool is not None:
+        # opcional: sem o pool a ingestão só fica mais lenta (encode no processo atual)
+        tasks.append(("embed_pool", embeddings_service.pool.start, False, None))
+    readiness.start(tasks)
 
 @app.on_event("shutdown")
 def _on_shutdown():
+    # jobs de ingestão na fila são descartados (o que já entrou está no WAL)
+    ingest_jobs.shutdown()
     # Persistência do índice, se habilitado em settings/.env
+    # (as ingestões já estão no WAL; aqui só consolidamos o que falta num snapshot)
     try:
-        if getattr(settings, "PERSIST_INDEX", False):
-            vector_index.save(settings.INDEX_DIR)
-            print(f"[shutdown] índice salvo em {settings.INDEX_DIR}")
+        if "index" in readiness.degraded:
+            # o snapshot em disco não abriu: não sobrescreve com o índice em memória
+            print(f"[shutdown] índice não carregou no startup; {settings.INDEX_DIR} mantido como está")
+        elif getattr(settings, "PERSIST_INDEX", False):
+            vector_index.stop_checkpointer()
+            if vector_index.checkpoint(settings.INDEX_DIR):
+                print(f"[shutdown] índice salvo em {settings.INDEX_DIR}")
     except Exception as e:
         print(f"[shutdown] falha ao salvar índice: {e}")
+    if embeddings_service.pool is not None:
+        embeddings_service.pool.shutdown()
 
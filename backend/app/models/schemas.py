@@ -7,12 +7,26 @@ class IngestTextBody(BaseModel):
     texts: List[str]
     metas: Optional[List[Dict[str, Any]]] = None
     chunk: bool = True
+    # upsert: antes de ingerir, remove os docs com o mesmo valor de meta[upsert_key] (ex.: "filename")
+    upsert_key: Optional[str] = None
+    dedup: bool = True        # não reindexa chunks já no índice (o meta novo é fundido no existente)
+    background: bool = False  # True: responde 202 com job_id na hora (acompanhe em /ingest/jobs/{id})
+
+class DeleteBody(BaseModel):
+    ids: Optional[List[int]] = None
+    # filtro por metadados, ex.: {"filename": "a.txt"} ou {"source": ["x", "y"]} (lista = qualquer um)
+    where: Optional[Dict[str, Any]] = None
 
 class QueryBody(BaseModel):
     question: str
     top_k: int = 3
     temperature: float = 0.7
     max_new_tokens: int = 256
+    # ajuste fino da busca ANN (None = padrão do índice)
+    nprobe: Optional[int] = None       # índices IVF
+    ef_search: Optional[int] = None    # índices HNSW
+    # filtro por metadados, ex.: {"source": "notas_aula"} ou {"topic": ["RAG", "hub"]} (lista = qualquer um)
+    filters: Optional[Dict[str, Any]] = None
 
     # ⬇ isto faz o Swagger já vir preenchido com um exemplo válido
     model_config = {
@@ -26,6 +40,16 @@ class QueryBody(BaseModel):
         }
     }
     
+class QueryBatchBody(BaseModel):
+    questions: List[str]
+    top_k: int = 3
+    temperature: float = 0.7
+    max_new_tokens: int = 256
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    filters: Optional[Dict[str, Any]] = None
+    generate: bool = True              # False → só recuperação (hits + scores), sem LLM
+
 class ChatMessage(BaseModel):
     role: str            # "user" | "assistant"
     content: str
@@ -37,4 +61,7 @@ class ChatBody(BaseModel):
     top_k: int = 3
     temperature: float = 0.7
     max_new_tokens: int = 256
-    system_prompt: Optional[str] = None    
+    system_prompt: Optional[str] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    filters: Optional[Dict[str, Any]] = None
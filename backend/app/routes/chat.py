@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 from app.models.schemas import ChatBody
 from app.services.chat_memory import chat_memory
-from app.services.rag import chat_answer
+from app.services.rag import chat_answer, stream_chat
+from app.utils.sse import sse_response
 
 router = APIRouter()
 
@@ -18,6 +19,9 @@ def chat(body: ChatBody):
         temperature=body.temperature,
         max_new_tokens=body.max_new_tokens,
         system_prompt=body.system_prompt,
+        nprobe=body.nprobe,
+        ef_search=body.ef_search,
+        filters=body.filters,
     )
 
     # atualiza memória do servidor
@@ -28,6 +32,33 @@ def chat(body: ChatBody):
     result["history_len"] = len(chat_memory.get(body.session_id))
     return result
 
+@router.post("/chat/stream")
+def chat_stream(body: ChatBody):
+    """Mesma resposta do /chat via SSE; a memória só é atualizada quando a resposta termina."""
+    history = body.history if body.history else chat_memory.get(body.session_id)
+    events = stream_chat(
+        message=body.message,
+        history=history,
+        top_k=body.top_k,
+        temperature=body.temperature,
+        max_new_tokens=body.max_new_tokens,
+        system_prompt=body.system_prompt,
+        nprobe=body.nprobe,
+        ef_search=body.ef_search,
+        filters=body.filters,
+    )
+
+    def _with_memory():
+        for event, data in events:
+            if event == "done":
+                chat_memory.append(body.session_id, "user", body.message)
+                chat_memory.append(body.session_id, "assistant", data["answer"])
+                data = {**data, "session_id": body.session_id,
+                        "history_len": len(chat_memory.get(body.session_id))}
+            yield event, data
+
+    return sse_response(_with_memory())
+
 @router.post("/chat/reset/{session_id}")
 def chat_reset(session_id: str):
     chat_memory.reset(session_id)
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException
+from app.services.index import vector_index
+from app.models.schemas import DeleteBody
+
+router = APIRouter()
+
+@router.delete("/documents/{doc_id}")
+def delete_document(doc_id: int):
+    if not vector_index.delete([doc_id]):
+        raise HTTPException(status_code=404, detail=f"Documento {doc_id} não encontrado.")
+    return {"deleted": 1, "total_docs": vector_index.count()}
+
+# remoção em lote: por ids e/ou por metadados (ex.: {"where": {"filename": "a.txt"}})
+@router.post("/documents/delete")
+def delete_documents(body: DeleteBody):
+    if not body.ids and not body.where:
+        raise HTTPException(status_code=400, detail="Informe 'ids' e/ou 'where'.")
+    deleted = 0
+    if body.ids:
+        deleted += vector_index.delete(body.ids)
+    if body.where:
+        deleted += vector_index.delete_where(body.where)
+    return {"deleted": deleted, "total_docs": vector_index.count()}
+
+# compacta já (normalmente roda sozinha quando a fração removida passa de COMPACT_THRESHOLD)
+@router.post("/documents/compact")
+def compact_documents():
+    return vector_index.compact()
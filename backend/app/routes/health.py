@@ -1,19 +1,73 @@
 # app/routes/health.py
+import sys
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from app.services.index import vector_index
+from app.services.bootstrap import startup_stats
+from app.services.embeddings import embeddings_service
+from app.services.answer_cache import answer_cache
+from app.services.retrieval_cache import retrieval_cache
+from app.services.jobs import ingest_jobs
+from app.services.readiness import readiness
+
+try:
+    import resource  # indisponível no Windows
+except ImportError:
+    resource = None
 from app.core.config import settings
 from app.core.llm import call_hf_inference
 
 router = APIRouter()
 
+def _memory_mb() -> dict:
+    """Memória residente atual (VmRSS, Linux) e pico (getrusage)."""
+    rss = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = round(int(line.split()[1]) / 1024, 1)
+                    break
+    except OSError:
+        pass
+    peak_mb = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_mb = round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)  # bytes no macOS, KiB no Linux
+    return {"rss_mb": rss, "peak_rss_mb": peak_mb}
+
 @router.get("/health")
 def health():
     return {
-        "status": "ok",
+        "status": "degraded" if readiness.degraded else "ok",
         "docs": vector_index.count(),
+        "deleted": vector_index.deleted_count(),   # removidos aguardando compactação
         "index_built": vector_index.index is not None,
+        "index_type": vector_index.current_type(),
+        "index_type_target": vector_index.index_type,
+        "startup": startup_stats,
+        "memory": _memory_mb(),
+        "embed_backend": embeddings_service.backend,
+        "embed_cache": embeddings_service.cache.stats(),
+        "embed_batcher": embeddings_service.batcher.stats() if embeddings_service.batcher else None,
+        "embed_pool": embeddings_service.pool.stats() if embeddings_service.pool else None,
+        "answer_cache": answer_cache.stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "ingest_jobs": ingest_jobs.stats(),
+        "readiness": readiness.snapshot(),
     }
 
+# ✅ liveness: o processo está de pé (não depende de modelo/índice)
+@router.get("/health/live")
+def health_live():
+    return {"status": "alive"}
+
+# ✅ readiness: 503 enquanto índice e embeddings carregam (ou se um deles falhou); depois 200 ("ready" ou "degraded")
+@router.get("/health/ready")
+def health_ready():
+    snap = readiness.snapshot()
+    return JSONResponse(status_code=200 if snap["ready"] else 503, content=snap)
+
 @router.get("/debug/config")
 def debug_config():
     return {
@@ -1,22 +1,166 @@
-from typing import List, Dict, Any
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from app.utils.chunk import chunk_text
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, BinaryIO
+import codecs
+import itertools
+import os
+import shutil
+import tempfile
+import time
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Response
+from app.core.config import settings
+from app.utils.chunk import chunk_text, iter_chunks
+from app.utils.text import content_hash
 from app.services.embeddings import embeddings_service
 from app.services.index import vector_index
+from app.services.jobs import Job, QueueFull, ingest_jobs
 from app.models.schemas import IngestTextBody  # ✅ usar schema p/ body JSON
 
 router = APIRouter()
 
-def _ingest_texts_impl(texts: List[str], metas: List[Dict[str, Any]], do_chunk: bool):
+def _split(text: str) -> List[str]:
+    # chunks no orçamento de tokens do modelo (ou por palavras, se não houver tokenizer fast)
+    chunker = embeddings_service.chunker()
+    if chunker is None:
+        return chunk_text(text)
+    return chunker.chunk(text) or [text]
+
+def _ingest_texts_impl(
+    texts: List[str],
+    metas: List[Dict[str, Any]],
+    do_chunk: bool,
+    replace: Optional[Dict[str, Any]] = None,
+    dedup: bool = True,
+):
     all_chunks, all_metas = [], []
     for i, t in enumerate(texts):
-        chunks = chunk_text(t) if do_chunk else [t]
+        chunks = _split(t) if do_chunk else [t]
         meta = metas[i] if i < len(metas) else {}
         for c in chunks:
             all_chunks.append(c)
             all_metas.append(meta)
-    vecs = embeddings_service.encode(all_chunks)
-    return vector_index.add_documents(all_chunks, all_metas, vecs)
+
+    # 🔽 deduplicação por hash do chunk normalizado, ANTES de gerar embeddings
+    # - deduplicated: já existia no índice → o meta novo (ex.: outro filename) é fundido no existente,
+    #   p/ que um upsert/delete da origem antiga não leve junto o conteúdo da nova
+    # - skipped: vazio ou repetido dentro da própria requisição
+    new_chunks, new_metas = [], []
+    deduplicated = skipped = 0
+    dup_ids, dup_metas = [], []
+    if dedup:
+        hashes = [content_hash(c) for c in all_chunks]
+        # no upsert, os docs que serão removidos não contam como "já existentes"
+        # (os compartilhados com outra origem ficam: só perdem a origem substituída)
+        exclude = set(vector_index.owned_ids_where(replace)) if replace else None
+        existing = vector_index.find_existing(hashes, exclude=exclude)
+        seen = set()
+        for c, m, h, did in zip(all_chunks, all_metas, hashes, existing):
+            if not c.strip() or h in seen:
+                skipped += 1
+            elif did is not None:
+                deduplicated += 1
+                dup_ids.append(did)
+                dup_metas.append(m)
+            else:
+                new_chunks.append(c)
+                new_metas.append(m)
+            seen.add(h)
+    else:
+        new_chunks, new_metas = all_chunks, all_metas
+
+    if new_chunks:
+        vecs = embeddings_service.encode(new_chunks, bulk=True)
+        out = vector_index.add_documents(new_chunks, new_metas, vecs, replace=replace)
+    else:
+        out = {"ingested": 0, "total_docs": vector_index.count()}
+        if replace:
+            out["replaced"] = vector_index.delete_where(replace)
+    # merge depois do upsert: os chunks fundidos passam a casar com o filtro do replace
+    out["merged"] = vector_index.merge_meta(dup_ids, dup_metas) if dup_ids else 0
+    out.update({"deduplicated": deduplicated, "skipped": skipped})
+    return out
+
+def _read_decoded(f: BinaryIO, read_bytes: int, progress: Dict[str, Any]) -> Iterator[str]:
+    """Lê o arquivo em blocos e decodifica UTF-8 incrementalmente (sem quebrar caracteres multibyte)."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    while True:
+        block = f.read(read_bytes)
+        if not block:
+            break
+        progress["bytes_read"] += len(block)
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+def _ingest_stream(
+    f: BinaryIO,
+    meta: Dict[str, Any],
+    do_chunk: bool,
+    replace: Optional[Dict[str, Any]] = None,
+    dedup: bool = True,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+):
+    """
+    Ingestão em fluxo: lê → decodifica → chunk (gerador) → encode + add a cada INGEST_BATCH_SIZE chunks.
+    A memória fica limitada a 1 bloco de leitura + 1 lote, qualquer que seja o tamanho do arquivo,
+    e cada lote já fica buscável (e no WAL) assim que entra.
+    Upsert: os docs antigos saem no 1º lote; os seguintes só acrescentam.
+    """
+    progress: Dict[str, Any] = {
+        "bytes_read": 0, "batches": 0, "ingested": 0, "deduplicated": 0, "skipped": 0, "merged": 0,
+    }
+    if replace:
+        progress["replaced"] = 0
+    t0 = time.perf_counter()
+    pieces = _read_decoded(f, settings.INGEST_READ_BYTES, progress)
+    # sem chunking o arquivo vira 1 doc só (precisa caber na memória)
+    chunker = embeddings_service.chunker() if do_chunk else None
+    if chunker is not None:
+        chunks: Iterable[str] = chunker.iter_chunks(pieces)
+    else:
+        chunks = iter_chunks(pieces) if do_chunk else ["".join(pieces)]
+    batch_size = max(1, settings.INGEST_BATCH_SIZE)
+    while True:
+        batch = list(itertools.islice(chunks, batch_size))
+        if not batch:
+            break
+        out = _ingest_texts_impl(
+            batch, [meta] * len(batch), do_chunk=False,
+            replace=replace if progress["batches"] == 0 else None, dedup=dedup,
+        )
+        progress["batches"] += 1
+        for key in ("ingested", "deduplicated", "skipped", "replaced", "merged"):
+            if key in progress:
+                progress[key] += out.get(key, 0)
+        progress["total_docs"] = out["total_docs"]
+        progress["seconds"] = round(time.perf_counter() - t0, 3)
+        print(
+            f"[ingest] {meta.get('filename', '?')}: lote {progress['batches']}, "
+            f"{progress['bytes_read']} bytes lidos, {progress['ingested']} chunks novos"
+        )
+        if on_progress is not None:
+            on_progress(dict(progress))
+    if progress["batches"] == 0:
+        # arquivo vazio: mesmo formato de resposta (e o upsert ainda remove a versão antiga)
+        progress.update(_ingest_texts_impl([], [], do_chunk=False, replace=replace))
+    progress.setdefault("total_docs", vector_index.count())
+    progress["seconds"] = round(time.perf_counter() - t0, 3)
+    return progress
+
+# 🔽 jobs: toda ingestão roda no executor dedicado (INGEST_WORKERS), nunca no event loop
+def _submit(kind: str, fn: Callable[[Job], Dict[str, Any]], info: Dict[str, Any]) -> Job:
+    try:
+        return ingest_jobs.submit(kind, fn, info)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+
+def _accepted(job: Job) -> Dict[str, Any]:
+    return {"job_id": job.id, "status": job.status, "status_url": f"/ingest/jobs/{job.id}"}
+
+def _wait(job: Job) -> Dict[str, Any]:
+    try:
+        return job.future.result()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Falha na ingestão: {e}")
 
 # ✅ opção: aceitar GET e POST para facilitar teste no navegador
 @router.api_route("/ingest/sample", methods=["GET", "POST"])
@@ -31,17 +175,85 @@ def ingest_sample():
         {"source": "huggingface", "topic": "hub"},
         {"source": "notas_aula", "topic": "prompt_engineering"},
     ]
-    return _ingest_texts_impl(samples, metas, do_chunk=False)
+    job = _submit("sample", lambda job: _ingest_texts_impl(samples, metas, do_chunk=False), {"texts": len(samples)})
+    return _wait(job)
 
 # ✅ agora recebe body JSON conforme o schema (fica bonito no Swagger)
 @router.post("/ingest/texts")
-def ingest_texts(body: IngestTextBody):
+def ingest_texts(body: IngestTextBody, response: Response):
     metas = body.metas or [{} for _ in body.texts]
-    return _ingest_texts_impl(body.texts, metas, do_chunk=body.chunk)
+    replace = None
+    if body.upsert_key:
+        # upsert: substitui os docs que têm o mesmo valor nessa chave de meta
+        values = [m.get(body.upsert_key) for m in metas if m.get(body.upsert_key) is not None]
+        if not values:
+            raise HTTPException(status_code=400, detail=f"Nenhum meta traz a chave '{body.upsert_key}' para o upsert.")
+        replace = {body.upsert_key: values}
+    job = _submit(
+        "texts",
+        lambda job: _ingest_texts_impl(
+            body.texts, metas, do_chunk=body.chunk, replace=replace, dedup=body.dedup
+        ),
+        {"texts": len(body.texts)},
+    )
+    if body.background:
+        response.status_code = 202
+        return _accepted(job)
+    return _wait(job)
 
-@router.post("/ingest/file")
-async def ingest_file(file: UploadFile = File(...), chunk: bool = Form(True)):
+# ✅ responde 202 + job_id na hora; o arquivo é indexado em background (wait=true espera o resultado)
+@router.post("/ingest/file", status_code=202)
+def ingest_file(
+    response: Response,
+    file: UploadFile = File(...),
+    chunk: bool = Form(True),
+    upsert: bool = Form(True),
+    dedup: bool = Form(True),
+    wait: bool = Form(False),
+):
     if not file.filename.lower().endswith(".txt"):
         raise HTTPException(status_code=400, detail="Somente .txt neste exemplo.")  # ✅ 400 em vez de JSON solto
-    content = (await file.read()).decode("utf-8", errors="ignore")
-    return _ingest_texts_impl([content], [{"filename": file.filename}], do_chunk=chunk)
+    meta = {"filename": file.filename}
+
+    # o UploadFile é fechado no fim da requisição: copia p/ um temp próprio que o job lê em blocos
+    if settings.INGEST_SPOOL_DIR:
+        os.makedirs(settings.INGEST_SPOOL_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        prefix="ingest-", suffix=".txt", dir=settings.INGEST_SPOOL_DIR or None, delete=False
+    ) as tmp:
+        shutil.copyfileobj(file.file, tmp, settings.INGEST_READ_BYTES)
+        size = tmp.tell()
+
+    def run(job: Job) -> Dict[str, Any]:
+        def on_progress(p: Dict[str, Any]) -> None:
+            job.update({**p, "bytes_total": size, "percent": round(100 * p["bytes_read"] / size, 1) if size else 100.0})
+        try:
+            with open(tmp.name, "rb") as f:
+                # reenviar o mesmo arquivo substitui os chunks antigos em vez de duplicar
+                return _ingest_stream(
+                    f, meta, do_chunk=chunk, replace=meta if upsert else None,
+                    dedup=dedup, on_progress=on_progress,
+                )
+        finally:
+            os.remove(tmp.name)
+
+    try:
+        job = _submit("file", run, {"filename": file.filename, "bytes": size})
+    except HTTPException:
+        os.remove(tmp.name)
+        raise
+    if wait:
+        response.status_code = 200
+        return _wait(job)
+    return _accepted(job)
+
+@router.get("/ingest/jobs")
+def list_jobs(limit: int = 20):
+    return {"jobs": ingest_jobs.list(limit), **ingest_jobs.stats()}
+
+@router.get("/ingest/jobs/{job_id}")
+def get_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} não encontrado (ou já expirado).")
+    return job.to_dict()
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
-from app.models.schemas import QueryBody
-from app.services.rag import answer_with_rag
+from app.models.schemas import QueryBody, QueryBatchBody
+from app.services.rag import answer_with_rag, answer_many_with_rag, stream_rag
+from app.utils.sse import sse_response
 
 router = APIRouter()
 
@@ -11,4 +12,34 @@ def query_rag(body: QueryBody):
         k=body.top_k,
         temperature=body.temperature,
         max_new_tokens=body.max_new_tokens,
+        nprobe=body.nprobe,
+        ef_search=body.ef_search,
+        filters=body.filters,
     )
+
+@router.post("/query/stream")
+def query_rag_stream(body: QueryBody):
+    """Mesma resposta do /query via SSE: eventos context → token* → done (ou error)."""
+    return sse_response(stream_rag(
+        question=body.question,
+        k=body.top_k,
+        temperature=body.temperature,
+        max_new_tokens=body.max_new_tokens,
+        nprobe=body.nprobe,
+        ef_search=body.ef_search,
+        filters=body.filters,
+    ))
+
+@router.post("/query/batch")
+def query_rag_batch(body: QueryBatchBody):
+    results = answer_many_with_rag(
+        questions=body.questions,
+        k=body.top_k,
+        temperature=body.temperature,
+        max_new_tokens=body.max_new_tokens,
+        nprobe=body.nprobe,
+        ef_search=body.ef_search,
+        filters=body.filters,
+        generate=body.generate,
+    )
+    return {"count": len(results), "results": results}
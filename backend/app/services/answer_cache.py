@@ -0,0 +1,146 @@
+# app/services/answer_cache.py
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def answer_scope(kind: str, **params: Any) -> int:
+    """Chave do escopo: só perguntas com os mesmos parâmetros (top_k, temperatura, prompt...) se reaproveitam."""
+    if "temperature" in params:
+        step = settings.ANSWER_CACHE_TEMP_STEP or 1.0
+        params["temperature"] = round(float(params["temperature"]) / step)
+    raw = json.dumps([kind, params], sort_keys=True, ensure_ascii=False, default=str)
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class AnswerCache:
+    """
+    Cache semântico de respostas: a chave é o embedding da pergunta (normalizado), não o texto.
+    - get(): maior cosine entre as perguntas do mesmo escopo; hit se ≥ threshold
+      (uma matmul sobre a matriz (capacity, dim) de slots — capacidade na casa dos milhares)
+    - generation: geração do índice vista pelo chamador; mudou → tudo é descartado
+    - LRU (capacity) + TTL (ttl_s; 0 = sem expiração); contadores em stats()
+    """
+
+    def __init__(self, capacity: int, threshold: float, ttl_s: float = 0.0):
+        self.capacity = max(0, capacity)
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._vecs: Optional[np.ndarray] = None                 # (capacity, dim), alocado no 1º put
+        self._scope = np.zeros(self.capacity, dtype=np.int64)
+        self._used = np.zeros(self.capacity, dtype=bool)
+        self._born = np.zeros(self.capacity, dtype=np.float64)
+        self._values: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self._lru: "OrderedDict[int, None]" = OrderedDict()     # slots ocupados, do mais antigo ao mais novo
+        self._generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _sync(self, generation: int) -> bool:
+        """Descarta tudo se o índice mudou. False = geração do chamador já é velha (não grava)."""
+        if self._generation is not None and generation < self._generation:
+            return False
+        if generation != self._generation:
+            if self._lru:
+                self.invalidations += 1
+            self._used[:] = False
+            self._values = [None] * self.capacity
+            self._lru.clear()
+            self._generation = generation
+        return True
+
+    def _free(self, slot: int) -> None:
+        self._used[slot] = False
+        self._values[slot] = None
+        self._lru.pop(slot, None)
+
+    def _best(self, vec: np.ndarray, scope: int) -> Tuple[int, float]:
+        """(slot, cosine) da pergunta mais próxima no escopo; expira o que passou do TTL."""
+        mask = self._used & (self._scope == scope)
+        if self.ttl_s > 0 and mask.any():
+            old = mask & (self._born < time.time() - self.ttl_s)
+            for slot in np.flatnonzero(old):
+                self._free(int(slot))
+                self.expired += 1
+            mask &= ~old
+        slots = np.flatnonzero(mask)
+        if self._vecs is None or len(slots) == 0 or vec.shape[0] != self._vecs.shape[1]:
+            return -1, -1.0
+        sims = self._vecs[slots] @ vec
+        i = int(np.argmax(sims))
+        return int(slots[i]), float(sims[i])
+
+    def get(self, vec, scope: int, generation: int) -> Optional[Tuple[Dict[str, Any], float]]:
+        """(resposta guardada, cosine) ou None."""
+        if not self.enabled:
+            return None
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._sync(generation)
+            slot, sim = self._best(vec, scope)
+            if slot < 0 or sim < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._lru.move_to_end(slot)
+            return dict(self._values[slot]), sim
+
+    def put(self, vec, scope: int, generation: int, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if not self._sync(generation):
+                return  # o índice mudou durante a geração → resposta pode estar velha
+            if self._vecs is None or self._vecs.shape[1] != vec.shape[0]:
+                self._vecs = np.zeros((self.capacity, vec.shape[0]), dtype=np.float32)
+                self._used[:] = False
+                self._lru.clear()
+            slot, sim = self._best(vec, scope)
+            if slot < 0 or sim < 0.999:  # quase a mesma pergunta → sobrescreve o slot
+                free = np.flatnonzero(~self._used)
+                slot = int(free[0]) if len(free) else next(iter(self._lru))  # sem espaço → o menos recente
+            self._vecs[slot] = vec
+            self._scope[slot] = scope
+            self._used[slot] = True
+            self._born[slot] = time.time()
+            self._values[slot] = dict(value)
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._used[:] = False
+            self._values = [None] * self.capacity
+            self._lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+            "expired": self.expired,
+        }
+
+
+# singleton exportado
+answer_cache = AnswerCache(settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_SIM, settings.ANSWER_CACHE_TTL_S)
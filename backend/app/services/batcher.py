@@ -0,0 +1,84 @@
+# app/services/batcher.py
+from __future__ import annotations
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Junta chamadas concorrentes de fn(textos) → matriz (n, dim) numa única chamada.
+    - a 1ª requisição abre a janela; ela fecha após max_wait_ms ou quando há max_batch textos
+    - uma thread daemon roda fn no lote e devolve a fatia de cada chamador via Future
+    Útil p/ CPU: 1 forward com 16 frases custa bem menos que 16 forwards com 1 frase.
+    """
+
+    def __init__(self, fn: Callable[[List[str]], np.ndarray], max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # estatísticas (expostas em /health)
+        self.batches = 0
+        self.requests = 0
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, texts: List[str]) -> np.ndarray:
+        """Bloqueia até o lote que contém estes textos ser processado."""
+        self._ensure_worker()
+        fut: Future = Future()
+        self._queue.put((texts, fut))
+        return fut.result()
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [t for item, _ in batch for t in item]
+            try:
+                vecs = self.fn(texts)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            start = 0
+            for item, fut in batch:
+                fut.set_result(vecs[start:start + len(item)])
+                start += len(item)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
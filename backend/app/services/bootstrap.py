@@ -1,4 +1,5 @@
 # app/services/bootstrap.py
+import time
 from typing import List, Dict, Any
 from app.services.index import vector_index
 from app.services.embeddings import embeddings_service
@@ -23,12 +24,25 @@ def seed_with_samples() -> int:
     _add(samples, metas, chunk=False)
     return vector_index.count()
 
-def load_or_seed() -> int:
-    # 1) tenta carregar de disco
-    vector_index.load(settings.INDEX_DIR)
-    if vector_index.count() > 0:
+# tempos do startup (expostos em /health)
+startup_stats: Dict[str, Any] = {}
+
+def load_index() -> int:
+    """Abre o índice salvo (snapshot + WAL). Obrigatório no startup."""
+    t0 = time.perf_counter()
+    try:
+        vector_index.load(settings.INDEX_DIR)
+        return vector_index.count()
+    finally:
+        startup_stats["load_index_seconds"] = round(time.perf_counter() - t0, 3)
+        startup_stats["index_load"] = dict(vector_index.load_stats)
+
+def seed_if_empty() -> int:
+    """Semeia os exemplos se o índice está vazio e AUTO_SEED=1. Opcional: se falhar, a API segue sem eles."""
+    if vector_index.count() > 0 or not settings.AUTO_SEED:
         return vector_index.count()
-    # 2) se vazio e flag ligada, semeia
-    if settings.AUTO_SEED:
+    t0 = time.perf_counter()
+    try:
         return seed_with_samples()
-    return 0
+    finally:
+        startup_stats["seed_seconds"] = round(time.perf_counter() - t0, 3)
@@ -0,0 +1,393 @@
+# app/services/docstore.py
+from __future__ import annotations
+from typing import List, Dict, Any, Optional
+from array import array
+import os
+import json
+import mmap
+
+import numpy as np
+
+TEXTS_FILE = "texts.bin"        # blob UTF-8 contíguo com todos os chunks
+OFFSETS_FILE = "offsets.bin"    # int64 (n+1): texto i = blob[off[i]:off[i+1]]
+META_IDS_FILE = "meta_ids.bin"  # int32 (n): índice do metadado de cada doc em metas.jsonl
+METAS_FILE = "metas.jsonl"      # metadados únicos (internados)
+IDS_FILE = "ids.bin"            # int64 (n): id externo estável de cada doc (crescente)
+VECTORS_FILE = "vectors.bin"    # float32 (n, dim): vetores L2-normalizados
+LEGACY_DOCS_FILE = "docs.jsonl"
+
+
+class DocStore:
+    """
+    Armazenamento colunar dos chunks, endereçado por posição (row).
+    - Parte "base": arquivos do INDEX_DIR mapeados em memória (mmap); nada é parseado no load.
+    - Parte "tail": o que foi adicionado depois do último save(), em buffers compactos.
+    Metadados são internados: dicts iguais (ex.: mesmo filename) compartilham uma entrada.
+    Os ids externos são crescentes na ordem das linhas → id → row por busca binária.
+    """
+
+    def __init__(self):
+        self._path: Optional[str] = None
+        self._blob: Optional[mmap.mmap] = None
+        self._base_offsets = np.zeros(1, dtype=np.int64)
+        self._tail_blob = bytearray()
+        self._tail_offsets = array("q", [0])
+        self._meta_ids = array("i")
+        self._metas: List[Dict[str, Any]] = []
+        self._meta_keys: Dict[str, int] = {}
+        self._saved_metas = 0
+        self._base_ids = np.zeros(0, dtype=np.int64)
+        self._tail_ids = array("q")
+        self.dim: Optional[int] = None
+        self._base_vecs: Optional[np.ndarray] = None
+        self._tail_vecs = np.zeros((0, 0), dtype=np.float32)
+        self._pending: Optional[str] = None  # load preguiçoso: diretório ainda não aberto
+
+    # ---------- util ----------
+    @property
+    def _n_base(self) -> int:
+        return len(self._base_offsets) - 1
+
+    @property
+    def _n_tail(self) -> int:
+        return len(self._tail_offsets) - 1
+
+    def _intern(self, meta: Dict[str, Any]) -> int:
+        key = json.dumps(meta or {}, ensure_ascii=False, sort_keys=True, default=str)
+        mid = self._meta_keys.get(key)
+        if mid is None:
+            mid = len(self._metas)
+            self._metas.append(dict(meta or {}))
+            self._meta_keys[key] = mid
+        return mid
+
+    def _materialize(self) -> None:
+        """Abre metadados e blob de texto no 1º acesso (load com lazy=True)."""
+        if self._pending is None:
+            return
+        path, self._pending = self._pending, None
+        meta_ids_p = _check_meta_ids(path, self._n_base)
+        with open(meta_ids_p, "rb") as f:
+            self._meta_ids.frombytes(f.read(self._n_base * 4))
+        with open(os.path.join(path, METAS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._intern(json.loads(line))
+        self._saved_metas = len(self._metas)
+        texts_p = os.path.join(path, TEXTS_FILE)
+        if os.path.getsize(texts_p) > 0:
+            with open(texts_p, "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_blob(self) -> None:
+        if self._blob is not None:
+            try:
+                self._blob.close()
+            except BufferError:
+                pass  # ainda há memoryviews vivas; o GC fecha depois
+            self._blob = None
+
+    def _append_vectors(self, vecs: np.ndarray) -> None:
+        if self.dim is None:
+            self.dim = int(vecs.shape[1])
+        n_tail = self._n_tail
+        need = n_tail + len(vecs)
+        if self._tail_vecs.shape[0] < need or self._tail_vecs.shape[1] != self.dim:
+            grown = np.zeros((max(need, 2 * self._tail_vecs.shape[0], 64), self.dim), dtype=np.float32)
+            if self._tail_vecs.shape[1] == self.dim:
+                grown[:n_tail] = self._tail_vecs[:n_tail]
+            self._tail_vecs = grown
+        self._tail_vecs[n_tail:need] = vecs
+
+    # ---------- API ----------
+    def __len__(self) -> int:
+        return self._n_base + self._n_tail
+
+    @property
+    def has_vectors(self) -> bool:
+        return self._n_base == 0 or self._base_vecs is not None
+
+    def append(
+        self,
+        texts: List[str],
+        metas: List[Dict[str, Any]],
+        ids,
+        vectors: Optional[np.ndarray] = None,
+    ) -> int:
+        """Adiciona chunks ao tail; retorna a posição do primeiro. ids devem ser crescentes."""
+        self._materialize()
+        start = len(self)
+        if vectors is not None:
+            self._append_vectors(vectors)
+        for i, t in enumerate(texts):
+            self._tail_blob += (t or "").encode("utf-8")
+            self._tail_offsets.append(len(self._tail_blob))
+            self._meta_ids.append(self._intern(metas[i] if i < len(metas) else {}))
+            self._tail_ids.append(int(ids[i]))
+        return start
+
+    def text_bytes(self, i: int) -> memoryview:
+        """Fatia zero-copy (UTF-8) do texto do doc i."""
+        self._materialize()
+        nb = self._n_base
+        if i < nb:
+            a, b = int(self._base_offsets[i]), int(self._base_offsets[i + 1])
+            return memoryview(self._blob)[a:b] if self._blob is not None else memoryview(b"")
+        j = i - nb
+        return memoryview(self._tail_blob)[self._tail_offsets[j]:self._tail_offsets[j + 1]]
+
+    def text(self, i: int) -> str:
+        with self.text_bytes(i) as mv:
+            return str(mv, "utf-8")
+
+    def meta(self, i: int) -> Dict[str, Any]:
+        self._materialize()
+        return dict(self._metas[self._meta_ids[i]])
+
+    def set_meta(self, i: int, meta: Dict[str, Any]) -> None:
+        """Troca o metadado do doc i (meta_ids.bin é regravado inteiro no próximo save)."""
+        self._materialize()
+        self._meta_ids[i] = self._intern(meta)
+
+    def id_of(self, i: int) -> int:
+        nb = self._n_base
+        return int(self._base_ids[i]) if i < nb else self._tail_ids[i - nb]
+
+    def ids(self) -> np.ndarray:
+        """Todos os ids externos, na ordem das linhas."""
+        return np.concatenate([np.asarray(self._base_ids), np.frombuffer(self._tail_ids, dtype=np.int64)])
+
+    def rows_of(self, ids) -> np.ndarray:
+        """Posições dos ids (busca binária; -1 para ids inexistentes)."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        for arr, offset in ((np.asarray(self._base_ids), 0),
+                            (np.frombuffer(self._tail_ids, dtype=np.int64), self._n_base)):
+            if len(arr) == 0:
+                continue
+            pos = np.searchsorted(arr, ids)
+            ok = (pos < len(arr)) & (arr[np.minimum(pos, len(arr) - 1)] == ids)
+            rows[ok] = pos[ok] + offset
+        return rows
+
+    def vectors(self, rows) -> np.ndarray:
+        """Vetores (float32, normalizados) das posições pedidas."""
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        out = np.empty((len(rows), self.dim or 0), dtype=np.float32)
+        nb = self._n_base
+        in_base = rows < nb
+        if in_base.any():
+            if self._base_vecs is None:
+                raise RuntimeError("Doc store sem coluna de vetores (snapshot antigo).")
+            out[in_base] = self._base_vecs[rows[in_base]]
+        if (~in_base).any():
+            out[~in_base] = self._tail_vecs[rows[~in_base] - nb]
+        return out
+
+    def meta_id_array(self) -> np.ndarray:
+        """Coluna de metadados (índice na tabela de metas únicas) de cada linha."""
+        self._materialize()
+        return np.frombuffer(self._meta_ids, dtype=np.int32)
+
+    @property
+    def metas_table(self) -> List[Dict[str, Any]]:
+        self._materialize()
+        return self._metas
+
+    def subset(self, rows, vectors: Optional[np.ndarray] = None) -> "DocStore":
+        """Nova store (em memória) só com as linhas pedidas — usada na compactação."""
+        rows = np.asarray(rows, dtype=np.int64)
+        out = DocStore()
+        vecs = vectors if vectors is not None else (self.vectors(rows) if self.has_vectors else None)
+        step = 4096
+        for a in range(0, len(rows), step):
+            chunk = rows[a:a + step]
+            out.append(
+                [self.text(int(r)) for r in chunk],
+                [self.meta(int(r)) for r in chunk],
+                [self.id_of(int(r)) for r in chunk],
+                vecs[a:a + step] if vecs is not None else None,
+            )
+        return out
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        return {"id": self.id_of(i), "text": self.text(i), "meta": self.meta(i)}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    # ---------- persistência ----------
+    def frozen(self) -> "DocStore":
+        """
+        Cópia para gravar fora do lock dos escritores: divide a base mapeada (imutável) e copia
+        só o tail e a coluna de metas. Os vetores do tail entram por view (linhas já escritas não mudam).
+        """
+        self._materialize()
+        out = DocStore()
+        out._path, out._blob, out.dim = self._path, self._blob, self.dim
+        out._base_offsets, out._base_ids, out._base_vecs = self._base_offsets, self._base_ids, self._base_vecs
+        out._tail_blob = bytearray(self._tail_blob)
+        out._tail_offsets = self._tail_offsets[:]
+        out._tail_ids = self._tail_ids[:]
+        out._tail_vecs = self._tail_vecs[:self._n_tail]
+        out._meta_ids = self._meta_ids[:]
+        out._metas, out._meta_keys, out._saved_metas = list(self._metas), dict(self._meta_keys), self._saved_metas
+        return out
+
+    def catch_up(self, live: "DocStore", n: int) -> None:
+        """
+        Esta store (recém-gravada com as n primeiras linhas de `live`) passa a refletir `live` inteira:
+        reaplica os metas trocados e anexa as linhas que entraram durante a gravação.
+        """
+        # metas.jsonl foi gravado na ordem de live._metas: os índices coincidem nas n linhas
+        changed = np.nonzero(np.frombuffer(self._meta_ids, dtype=np.int32)[:n] != live.meta_id_array()[:n])[0]
+        for row in changed.tolist():
+            self.set_meta(row, live.meta(row))
+        step = 4096
+        for a in range(n, len(live), step):
+            rows = np.arange(a, min(a + step, len(live)))
+            self.append(
+                [live.text(int(r)) for r in rows],
+                [live.meta(int(r)) for r in rows],
+                [live.id_of(int(r)) for r in rows],
+                live.vectors(rows) if live.has_vectors else None,
+            )
+
+    def save(self, path: str) -> "DocStore":
+        """
+        Incremental quando path é o diretório carregado: só anexa o tail aos arquivos.
+        A escrita de offsets.bin vem por último — é ela que "confirma" os novos docs.
+        Retorna uma store NOVA, já mapeada sobre os arquivos gravados; esta continua intacta
+        (buscas em andamento seguem lendo dela até o chamador trocar a referência).
+        """
+        self._materialize()
+        os.makedirs(path, exist_ok=True)
+        names = (TEXTS_FILE, OFFSETS_FILE, META_IDS_FILE, METAS_FILE, IDS_FILE, VECTORS_FILE)
+        files = [os.path.join(path, f) for f in names]
+        texts_p, offsets_p, meta_ids_p, metas_p, ids_p, vecs_p = files
+        incremental = (
+            self._path == os.path.abspath(path)
+            and self.has_vectors
+            and all(os.path.exists(f) for f in files)
+        )
+
+        if incremental:
+            # só anexa após o fim do que esta store mapeia: os mmaps atuais continuam válidos
+            nb = self._n_base
+            base_end = int(self._base_offsets[-1])
+            _append_at(texts_p, base_end, self._tail_blob)
+            with open(metas_p, "a", encoding="utf-8") as f:
+                for m in self._metas[self._saved_metas:]:
+                    f.write(json.dumps(m, ensure_ascii=False) + "\n")
+            # meta_ids muda também nos docs antigos (set_meta): regravado inteiro, mas via tmp + replace
+            with open(meta_ids_p + ".tmp", "wb") as f:
+                f.write(self._meta_ids.tobytes())
+            os.replace(meta_ids_p + ".tmp", meta_ids_p)
+            _append_at(ids_p, nb * 8, self._tail_ids.tobytes())
+            tail_vecs = self._tail_vecs[:self._n_tail] if self.dim else np.zeros((0, 0), np.float32)
+            _append_at(vecs_p, nb * (self.dim or 0) * 4, np.ascontiguousarray(tail_vecs).tobytes())
+            new_offsets = np.asarray(self._tail_offsets[1:], dtype=np.int64) + base_end
+            _append_at(offsets_p, (nb + 1) * 8, new_offsets.tobytes())
+        else:
+            # snapshot completo em arquivos temporários (o blob atual ainda é lido via mmap)
+            with open(texts_p + ".tmp", "wb") as f:
+                for i in range(len(self)):
+                    with self.text_bytes(i) as mv:
+                        f.write(mv)
+            with open(metas_p + ".tmp", "w", encoding="utf-8") as f:
+                for m in self._metas:
+                    f.write(json.dumps(m, ensure_ascii=False) + "\n")
+            with open(meta_ids_p + ".tmp", "wb") as f:
+                f.write(self._meta_ids.tobytes())
+            with open(ids_p + ".tmp", "wb") as f:
+                f.write(self.ids().tobytes())
+            with open(vecs_p + ".tmp", "wb") as f:
+                if self.has_vectors and self.dim:
+                    step = 65536
+                    for a in range(0, len(self), step):
+                        f.write(self.vectors(np.arange(a, min(a + step, len(self)))).tobytes())
+            offsets = np.concatenate([
+                np.asarray(self._base_offsets),
+                np.asarray(self._tail_offsets[1:], dtype=np.int64) + int(self._base_offsets[-1]),
+            ])
+            offsets -= offsets[0]
+            with open(offsets_p + ".tmp", "wb") as f:
+                f.write(offsets.tobytes())
+            # os.replace troca o inode: os mmaps desta store seguem apontando p/ os arquivos antigos
+            for fp in files:
+                os.replace(fp + ".tmp", fp)
+
+        # store nova: tudo como base mapeada, tail vazio
+        fresh = DocStore()
+        fresh.load(path, dim=self.dim)
+        return fresh
+
+    def load(self, path: str, n: Optional[int] = None, lazy: bool = False, dim: Optional[int] = None) -> bool:
+        """
+        Mapeia os arquivos do diretório (ou importa o docs.jsonl legado). Retorna False se não houver nada.
+        - n: considera só os n primeiros docs (o que o snapshot confirmou; o resto vem do WAL)
+        - lazy: só mapeia as colunas numéricas agora; metadados e textos abrem no 1º acesso
+        - dim: dimensão dos vetores (para mapear vectors.bin)
+        """
+        texts_p = os.path.join(path, TEXTS_FILE)
+        offsets_p = os.path.join(path, OFFSETS_FILE)
+        if os.path.exists(texts_p) and os.path.exists(offsets_p):
+            self._close_blob()
+            self.__init__()
+            if os.path.getsize(offsets_p) >= 8:
+                self._base_offsets = np.memmap(offsets_p, dtype=np.int64, mode="r")
+                if n is not None:
+                    self._base_offsets = self._base_offsets[: n + 1]
+            nb = self._n_base
+            ids_p = os.path.join(path, IDS_FILE)
+            if nb and os.path.exists(ids_p) and os.path.getsize(ids_p) >= nb * 8:
+                self._base_ids = np.memmap(ids_p, dtype=np.int64, mode="r")[:nb]
+            else:
+                self._base_ids = np.arange(nb, dtype=np.int64)  # ids posicionais (formato antigo)
+            vecs_p = os.path.join(path, VECTORS_FILE)
+            self.dim = dim
+            if dim and nb and os.path.exists(vecs_p) and os.path.getsize(vecs_p) >= nb * dim * 4:
+                self._base_vecs = np.memmap(vecs_p, dtype=np.float32, mode="r", shape=(nb, dim))
+            _check_meta_ids(path, nb)  # mesmo lazy: falha no load, não na 1ª busca
+            self._path = os.path.abspath(path)
+            self._pending = path
+            if not lazy:
+                self._materialize()
+            return True
+
+        legacy_p = os.path.join(path, LEGACY_DOCS_FILE)
+        if os.path.exists(legacy_p):
+            # formato antigo (1 JSON por linha): importa para o tail; o próximo save() grava colunar
+            self._close_blob()
+            self.__init__()
+            with open(legacy_p, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        d = json.loads(line)
+                        self.append([d.get("text", "")], [d.get("meta", {})], [len(self)])
+            return True
+
+        self._close_blob()
+        self.__init__()
+        return False
+
+
+def _check_meta_ids(path: str, n: int) -> str:
+    """Caminho de meta_ids.bin; erro se tiver menos de n entradas (senão os metas sairiam trocados em silêncio)."""
+    p = os.path.join(path, META_IDS_FILE)
+    size = os.path.getsize(p) if os.path.exists(p) else 0
+    if size < n * 4:
+        raise ValueError(f"{p} corrompido: {size} bytes para {n} docs (esperado ≥ {n * 4})")
+    return p
+
+
+def _append_at(path: str, offset: int, data) -> None:
+    """Grava data a partir de offset (descartando restos de um save interrompido)."""
+    with open(path, "r+b") as f:
+        if os.path.getsize(path) != offset:
+            f.truncate(offset)
+        f.seek(offset)
+        f.write(data)
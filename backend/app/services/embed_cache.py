@@ -0,0 +1,226 @@
+# app/services/embed_cache.py
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+KEY_BYTES = 16
+KEYS_FILE = "keys.bin"        # chaves de 16 bytes (blake2b), na ordem de gravação
+VECTORS_FILE = "vectors.bin"  # float32 (n, dim), mesma ordem das chaves
+PREFIX_FILE = "sorted_prefix.bin"  # uint64: 8 primeiros bytes das chaves, ordenados (busca binária)
+ROWS_FILE = "sorted_rows.bin"      # int64: linha (em keys/vectors) de cada prefixo acima
+TAIL_MIN = 1024               # chaves novas fora do índice ordenado antes de fundir (ou 1/8 dele)
+
+
+def cache_key(model_name: str, normalized_text: str) -> bytes:
+    return hashlib.blake2b(
+        f"{model_name}\0{normalized_text}".encode("utf-8"), digest_size=KEY_BYTES
+    ).digest()
+
+
+def _prefix(key: bytes) -> int:
+    return int.from_bytes(key[:8], "little")  # mesma leitura do view("<u8") de keys.bin
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings em 2 níveis, chave = (modelo, hash do texto normalizado).
+    - memória: LRU limitado a `capacity` vetores
+    - disco (opcional): append-only em <directory>/keys.bin + vectors.bin, lido via mmap;
+      lookup por busca binária num índice ordenado (prefixo uint64 → linha), também mapeado,
+      + um dict só com as chaves gravadas desde a última fusão (nada ∝ ao total em objetos Python)
+    Contadores de hit/miss em stats().
+    """
+
+    def __init__(self, model_name: str, capacity: int, directory: Optional[str] = None, disk_max: int = 0):
+        self.model_name = model_name
+        self.capacity = max(0, capacity)
+        self.disk_max = disk_max
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        # disco
+        self._dir = None
+        if directory:
+            slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            self._dir = os.path.join(directory, slug)
+        self._dim: Optional[int] = None
+        self._n = 0                                    # linhas válidas em keys.bin / vectors.bin
+        self._sorted_prefix: Optional[np.ndarray] = None
+        self._sorted_rows: Optional[np.ndarray] = None
+        self._keys: Optional[np.ndarray] = None        # (linhas cobertas pelo índice, 16) uint8
+        self._tail: Dict[bytes, int] = {}              # chaves gravadas depois da última fusão
+        self._mm: Optional[np.ndarray] = None
+        self._disk_opened = False
+
+    # ---------- disco ----------
+    def _path(self, name: str) -> str:
+        return os.path.join(self._dir, name)
+
+    def _open_disk(self, dim: int) -> None:
+        """Mapeia chaves, vetores e o índice ordenado na 1ª vez que a dimensão é conhecida."""
+        self._disk_opened = True
+        self._dim = dim
+        if not self._dir:
+            return
+        os.makedirs(self._dir, exist_ok=True)
+        keys_p, vecs_p = self._path(KEYS_FILE), self._path(VECTORS_FILE)
+        if not (os.path.exists(keys_p) and os.path.exists(vecs_p)):
+            return
+        # crash no meio de um append: vale o menor dos dois arquivos
+        n = min(os.path.getsize(keys_p) // KEY_BYTES, os.path.getsize(vecs_p) // (4 * dim))
+        for p, size in ((keys_p, n * KEY_BYTES), (vecs_p, n * dim * 4)):
+            if os.path.getsize(p) != size:
+                with open(p, "r+b") as f:
+                    f.truncate(size)
+        self._n = n
+        if not n:
+            return
+        keys = np.memmap(keys_p, dtype=np.uint8, mode="r", shape=(n, KEY_BYTES))
+        prefix_p, rows_p = self._path(PREFIX_FILE), self._path(ROWS_FILE)
+        m = os.path.getsize(prefix_p) // 8 if os.path.exists(prefix_p) else 0
+        if not m or m > n or not os.path.exists(rows_p) or os.path.getsize(rows_p) != m * 8:
+            # índice ausente/inconsistente (ex.: crash entre as 2 trocas): remonta a partir de keys.bin
+            prefix = np.ascontiguousarray(keys[:, :8]).view("<u8").ravel()
+            order = np.argsort(prefix, kind="stable")
+            self._write_sorted(prefix[order], order.astype(np.int64))
+            m = n
+        self._tail = {keys[r].tobytes(): r for r in range(m, n)}
+        self._map_sorted(m)
+        self._maybe_merge()
+        self._remap()
+
+    def _write_sorted(self, prefix: np.ndarray, rows: np.ndarray) -> None:
+        for name, arr in ((PREFIX_FILE, prefix), (ROWS_FILE, rows)):
+            tmp = self._path(name + ".tmp")
+            arr.tofile(tmp)
+            os.replace(tmp, self._path(name))
+
+    def _map_sorted(self, m: int) -> None:
+        self._keys = np.memmap(self._path(KEYS_FILE), dtype=np.uint8, mode="r", shape=(m, KEY_BYTES))
+        self._sorted_prefix = np.memmap(self._path(PREFIX_FILE), dtype="<u8", mode="r", shape=(m,))
+        self._sorted_rows = np.memmap(self._path(ROWS_FILE), dtype=np.int64, mode="r", shape=(m,))
+
+    def _maybe_merge(self) -> None:
+        """Funde as chaves novas no índice ordenado quando passam de TAIL_MIN (ou 1/8 dele): O(n + novas)."""
+        m = len(self._sorted_prefix) if self._sorted_prefix is not None else 0
+        if len(self._tail) <= max(TAIL_MIN, m // 8):
+            return
+        new_rows = np.fromiter(self._tail.values(), dtype=np.int64, count=len(self._tail))
+        new_prefix = np.fromiter((_prefix(k) for k in self._tail), dtype="<u8", count=len(self._tail))
+        order = np.argsort(new_prefix, kind="stable")
+        new_prefix, new_rows = new_prefix[order], new_rows[order]
+        if m:
+            pos = np.searchsorted(self._sorted_prefix, new_prefix, side="right")
+            prefix = np.insert(np.asarray(self._sorted_prefix), pos, new_prefix)
+            rows = np.insert(np.asarray(self._sorted_rows), pos, new_rows)
+        else:
+            prefix, rows = new_prefix, new_rows
+        self._write_sorted(prefix, rows)
+        self._tail = {}
+        self._map_sorted(self._n)
+
+    def _disk_row(self, key: bytes) -> Optional[int]:
+        row = self._tail.get(key)
+        if row is not None or self._sorted_prefix is None:
+            return row
+        p = np.uint64(_prefix(key))
+        i = int(np.searchsorted(self._sorted_prefix, p, side="left"))
+        # prefixos de 64 bits quase nunca colidem; na dúvida, confere a chave inteira
+        while i < len(self._sorted_prefix) and self._sorted_prefix[i] == p:
+            row = int(self._sorted_rows[i])
+            if self._keys[row].tobytes() == key:
+                return row
+            i += 1
+        return None
+
+    def _remap(self) -> None:
+        n = self._n
+        self._mm = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(n, self._dim)) if n else None
+
+    def _disk_get(self, key: bytes) -> Optional[np.ndarray]:
+        row = self._disk_row(key)
+        if row is None:
+            return None
+        if self._mm is None or row >= self._mm.shape[0]:
+            self._remap()
+        return np.array(self._mm[row])
+
+    def _disk_put(self, keys: List[bytes], vecs: np.ndarray) -> None:
+        if not self._dir:
+            return
+        new, seen = [], set()
+        for k, v in zip(keys, vecs):
+            if k not in seen and self._disk_row(k) is None:
+                seen.add(k)
+                new.append((k, v))
+        if self.disk_max:
+            new = new[: max(0, self.disk_max - self._n)]
+        if not new:
+            return
+        # vetores antes das chaves: uma chave gravada sempre tem o vetor completo
+        with open(self._path(VECTORS_FILE), "ab") as f:
+            f.write(np.asarray([v for _, v in new], dtype=np.float32).tobytes())
+        with open(self._path(KEYS_FILE), "ab") as f:
+            f.write(b"".join(k for k, _ in new))
+        for i, (k, _) in enumerate(new):
+            self._tail[k] = self._n + i
+        self._n += len(new)
+        self._maybe_merge()
+
+    # ---------- memória ----------
+    def _remember(self, key: bytes, vec: np.ndarray) -> None:
+        if not self.capacity:
+            return
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    # ---------- API ----------
+    def get_many(self, keys: List[bytes], dim: int) -> List[Optional[np.ndarray]]:
+        """Vetor de cada chave (ou None = miss). Hits de disco sobem para o LRU."""
+        out: List[Optional[np.ndarray]] = []
+        with self._lock:
+            if not self._disk_opened:
+                self._open_disk(dim)
+            for key in keys:
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    self.hits_memory += 1
+                else:
+                    vec = self._disk_get(key)
+                    if vec is not None:
+                        self.hits_disk += 1
+                        self._remember(key, vec)
+                    else:
+                        self.misses += 1
+                out.append(vec)
+        return out
+
+    def put_many(self, keys: List[bytes], vecs: np.ndarray) -> None:
+        with self._lock:
+            if not self._disk_opened:
+                self._open_disk(int(vecs.shape[1]))
+            for key, vec in zip(keys, vecs):
+                self._remember(key, np.array(vec))  # cópia: não prende o batch inteiro na memória
+            self._disk_put(keys, vecs)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_memory + self.hits_disk) / total, 4) if total else 0.0,
+            "memory_entries": len(self._lru),
+            "disk_entries": self._n,
+        }
@@ -0,0 +1,115 @@
+# app/services/embed_pool.py
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+import multiprocessing as mp
+import os
+import threading
+import time
+
+import numpy as np
+
+# ------------------------------------------------------------
+# Lado do worker (processo filho): um modelo por processo, carregado no initializer
+# ------------------------------------------------------------
+_worker_model = None
+
+
+def _init_worker(backend: str, model_name: str, threads: int) -> None:
+    global _worker_model
+    # divide os núcleos entre os workers (sem isso cada processo abre 1 thread por núcleo)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from app.services.embeddings import BACKENDS
+    _worker_model = BACKENDS[backend](model_name)
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    from app.core.config import settings
+    from app.services.embeddings import encode_bucketed
+    return encode_bucketed(_worker_model, texts, settings.EMBED_TOKEN_BUDGET, settings.EMBED_MAX_BATCH)
+
+
+class EmbeddingPool:
+    """
+    Pool de processos p/ encode em massa (ingestão): cada worker tem sua cópia do modelo.
+    - os textos são fatiados em blocos de `chunk_size` e espalhados entre os workers
+    - o resultado volta na ordem original (executor.map)
+    - entradas com menos de `min_texts` ficam no processo atual (não compensa o IPC)
+    Os processos sobem sob demanda (ou em start(), no warmup) com spawn: nada de fork com torch/FAISS.
+    """
+
+    def __init__(self, backend: str, model_name: str, workers: int, min_texts: int = 512, chunk_size: int = 128):
+        self.backend = backend
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.min_texts = max(1, min_texts)
+        self.chunk_size = max(1, chunk_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # estatísticas (expostas em /health)
+        self.calls = 0
+        self.texts = 0
+        self.seconds = 0.0
+        self.failures = 0
+
+    def accepts(self, n: int) -> bool:
+        return n >= self.min_texts
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=mp.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.backend, self.model_name, threads),
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Sobe todos os workers e carrega o modelo em cada um (1 encode por worker)."""
+        ex = self._ensure_executor()
+        futs = [ex.submit(_encode_in_worker, ["aquecimento"]) for _ in range(self.workers)]
+        for f in futs:
+            f.result()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Textos já normalizados → matriz (n, dim) L2-normalizada, na mesma ordem."""
+        t0 = time.perf_counter()
+        ex = self._ensure_executor()
+        blocks = [texts[a:a + self.chunk_size] for a in range(0, len(texts), self.chunk_size)]
+        try:
+            vecs = np.concatenate(list(ex.map(_encode_in_worker, blocks)))
+        except BrokenProcessPool:
+            # worker morreu (ex.: OOM): descarta o pool; o próximo encode recria
+            self.failures += 1
+            self.shutdown()
+            raise
+        self.calls += 1
+        self.texts += len(texts)
+        self.seconds += time.perf_counter() - t0
+        return vecs
+
+    def shutdown(self) -> None:
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self._executor is not None,
+            "calls": self.calls,
+            "texts": self.texts,
+            "texts_per_s": round(self.texts / self.seconds, 1) if self.seconds else 0.0,
+            "failures": self.failures,
+        }
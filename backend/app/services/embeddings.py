@@ -1,28 +1,219 @@
-# app/services/embeddings.py
-import unicodedata
+import os
+import threading
+import time
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from app.core.config import settings
+from app.services.batcher import MicroBatcher
+from app.services.embed_cache import EmbeddingCache, cache_key
+from app.services.embed_pool import EmbeddingPool
+from app.utils.chunk import TokenChunker
+from app.utils.text import normalize_text
+
+# ------------------------------------------------------------
+# Backends de inferência (EMBED_BACKEND)
+# - torch: SentenceTransformer padrão (PyTorch)
+# - onnx: mesmo modelo exportado p/ ONNX Runtime (CPU mais rápida, vetores ~idênticos)
+# - onnx_int8: ONNX com quantização dinâmica int8 (mais rápido ainda; pequena perda de precisão)
+# ------------------------------------------------------------
+def _load_torch(model_name: str):
+    from sentence_transformers import SentenceTransformer  # import pesado (torch)
+    return SentenceTransformer(model_name)
+
+def _load_onnx(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    # usa o .onnx publicado no repo do modelo; se não houver, o sentence-transformers exporta na hora
+    return SentenceTransformer(model_name, backend="onnx")
+
+def _load_onnx_int8(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    qconfig = settings.EMBED_ONNX_QCONFIG
+    file_name = f"onnx/model_qint8_{qconfig}.onnx"
+    try:
+        # vários modelos (ex.: all-MiniLM-L6-v2) já publicam as variantes int8
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": file_name})
+    except Exception:
+        pass
+    # senão: exporta + quantiza uma vez em INDEX_DIR/onnx/<modelo> e reaproveita nas próximas subidas
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    local_dir = os.path.join(settings.INDEX_DIR, "onnx", model_name.replace("/", "__"))
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        base = _load_onnx(model_name)
+        base.save_pretrained(local_dir)
+        export_dynamic_quantized_onnx_model(base, qconfig, local_dir)
+    return SentenceTransformer(local_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+BACKENDS = {
+    "torch": _load_torch,
+    "onnx": _load_onnx,
+    "onnx_int8": _load_onnx_int8,
+}
+
+# ------------------------------------------------------------
+# Lotes por orçamento de tokens
+# - custo real de um batch ≈ nº de itens × maior sequência (o resto é padding)
+# - ordenar por tamanho e fechar o batch quando itens × maior_len passa do orçamento
+#   junta perguntas curtas em lotes grandes e chunks longos em lotes pequenos
+# ------------------------------------------------------------
+def token_lengths(model, texts):
+    """Nº de tokens (com especiais, truncado no max_seq_length) de cada texto."""
+    max_len = getattr(model, "max_seq_length", None) or 512
+    tok = getattr(model, "tokenizer", None)
+    if tok is not None:
+        ids = tok(list(texts), add_special_tokens=True, truncation=True, max_length=max_len)["input_ids"]
+        return np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(texts))
+    # sem tokenizer exposto: ~1.3 subword por palavra + [CLS]/[SEP]
+    return np.fromiter((min(max_len, int(len(t.split()) * 1.3) + 2) for t in texts), dtype=np.int64, count=len(texts))
+
+def token_batches(lengths, budget: int, max_items: int):
+    """Índices agrupados em lotes (ordem crescente de tamanho) com itens × maior_len <= budget."""
+    order = np.argsort(lengths, kind="stable")
+    batches, cur, cur_max = [], [], 0
+    for i in order:
+        n_max = max(cur_max, int(lengths[i]))
+        if cur and ((len(cur) + 1) * n_max > budget or len(cur) >= max_items):
+            batches.append(np.asarray(cur))
+            cur, n_max = [], int(lengths[i])
+        cur.append(i)
+        cur_max = n_max
+    if cur:
+        batches.append(np.asarray(cur))
+    return batches
+
+def encode_bucketed(model, texts, budget: int, max_items: int):
+    """model.encode por lotes de tamanho parecido; devolve na ordem original."""
+    if budget <= 0 or len(texts) <= 1:
+        return np.asarray(model.encode(texts, normalize_embeddings=True), dtype="float32")
+    out = None
+    for idx in token_batches(token_lengths(model, texts), budget, max_items):
+        vecs = np.asarray(
+            model.encode([texts[i] for i in idx], batch_size=len(idx), normalize_embeddings=True), dtype="float32"
+        )
+        if out is None:
+            out = np.empty((len(texts), vecs.shape[1]), dtype="float32")
+        out[idx] = vecs
+    return out
 
 class EmbeddingsService:
-    def __init__(self):
-        # carrega o modelo multilíngue
-        self.model = SentenceTransformer(settings.EMBED_MODEL)
+    def __init__(self, backend: str | None = None, cache: bool = True):
+        self.backend = (backend or settings.EMBED_BACKEND or "torch").lower()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"EMBED_BACKEND inválido: {self.backend!r} (use um de {tuple(BACKENDS)})")
+        # o modelo (e o torch) só carrega em load(): no warmup do startup ou no 1º encode
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.load_seconds = None
+        self._chunker = None
+        # vetores de backends diferentes não são bit-a-bit iguais → cada backend tem seu cache
+        self.cache_name = settings.EMBED_MODEL if self.backend == "torch" else f"{settings.EMBED_MODEL}@{self.backend}"
+        # cache (modelo, texto normalizado) → vetor: LRU em memória + disco opcional em INDEX_DIR
+        cache_dir = os.path.join(settings.INDEX_DIR, "embed_cache") if settings.EMBED_CACHE_DISK and cache else None
+        self.cache = EmbeddingCache(
+            self.cache_name,
+            capacity=settings.EMBED_CACHE_SIZE if cache else 0,
+            directory=cache_dir,
+            disk_max=settings.EMBED_CACHE_DISK_MAX,
+        )
+        # micro-batching: encodes pequenos e concorrentes (ex.: /query) viram 1 forward só
+        self.batcher = None
+        if settings.EMBED_MICROBATCH:
+            self.batcher = MicroBatcher(
+                self._encode_model,
+                max_batch=settings.EMBED_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+            )
+        # ingestão em massa: os misses são espalhados entre processos (encode(..., bulk=True))
+        self.pool = None
+        if settings.EMBED_POOL_WORKERS > 0 and cache:
+            self.pool = EmbeddingPool(
+                self.backend,
+                settings.EMBED_MODEL,
+                workers=settings.EMBED_POOL_WORKERS,
+                min_texts=settings.EMBED_POOL_MIN_TEXTS,
+                chunk_size=settings.EMBED_POOL_CHUNK,
+            )
     
+    @property
+    def model(self):
+        return self._model if self._model is not None else self.load()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """Carrega o modelo no backend configurado, uma única vez (thread-safe)."""
+        with self._load_lock:
+            if self._model is None:
+                t0 = time.perf_counter()
+                # carrega o modelo multilíngue
+                self._model = BACKENDS[self.backend](settings.EMBED_MODEL)
+                self.load_seconds = round(time.perf_counter() - t0, 3)
+        return self._model
+
+    def warmup(self) -> None:
+        """1 forward fora do cache: aloca buffers/kernels antes do 1º request real."""
+        self._encode_model([self._normalize_text("aquecimento do modelo de embeddings")])
+
+    def chunker(self):
+        """
+        TokenChunker com o tokenizer do próprio modelo (CHUNK_MODE=tokens), criado uma vez.
+        None se o backend não expõe um tokenizer fast (aí a ingestão usa o split por palavras).
+        """
+        if settings.CHUNK_MODE != "tokens":
+            return None
+        if self._chunker is None:
+            tok = getattr(self.model, "tokenizer", None)
+            if tok is None or not getattr(tok, "is_fast", False):
+                self._chunker = False
+            else:
+                # [CLS]/[SEP] também contam no max_seq_length
+                max_tokens = settings.CHUNK_MAX_TOKENS or (self.model.max_seq_length - 2)
+                self._chunker = TokenChunker(tok, max_tokens, settings.CHUNK_OVERLAP_TOKENS)
+        return self._chunker or None
+
     @staticmethod
     def _normalize_text(s: str) -> str:
-        # NFKC + casefold + colapsa espaços => robusto p/ maiúsculas/minúsculas/acentos
-        if not isinstance(s, str):
-            return ""
-        s = unicodedata.normalize("NFKC", s).casefold()
-        s = " ".join(s.split())
-        return s
-
-    def encode(self, texts):
+        return normalize_text(s)
+
+    def _encode_model(self, normed):
+        # L2-normaliza para busca por dot-product; lotes montados por orçamento de tokens
+        return encode_bucketed(self.model, normed, settings.EMBED_TOKEN_BUDGET, settings.EMBED_MAX_BATCH)
+
+    def _encode_bulk(self, normed):
+        try:
+            return self.pool.encode(normed)
+        except Exception as e:
+            # pool indisponível (spawn falhou, worker morreu...): a ingestão segue no processo atual
+            print(f"[embeddings] pool de processos falhou ({e}); encode no processo atual")
+            return self._encode_model(normed)
+
+    def encode(self, texts, bulk: bool = False):
+        """bulk=True (ingestão): lotes grandes vão ao pool de processos, se configurado."""
         if not texts:
             return np.zeros((0, 384), dtype="float32")  # tamanho padrão p/ MiniLM; o lib ajusta conforme o modelo
         normed = [self._normalize_text(t) for t in texts]
-        vecs = self.model.encode(normed, normalize_embeddings=True)  # L2-normaliza para busca por dot-product
-        return np.asarray(vecs, dtype="float32")
+        dim = self.model.get_sentence_embedding_dimension()
+        keys = [cache_key(self.cache_name, t) for t in normed]
+        cached = self.cache.get_many(keys, dim)
+
+        # só os misses (sem repetição) vão para o modelo, num único batch
+        miss = {}
+        for i, vec in enumerate(cached):
+            if vec is None:
+                miss.setdefault(keys[i], normed[i])
+        if miss:
+            miss_keys = list(miss)
+            miss_texts = [miss[k] for k in miss_keys]
+            # lotes grandes (ingestão) já são eficientes: vão direto ao modelo, sem esperar a janela
+            if self.batcher is not None and len(miss_texts) < self.batcher.max_batch:
+                miss_vecs = self.batcher.submit(miss_texts)
+            elif bulk and self.pool is not None and self.pool.accepts(len(miss_texts)):
+                miss_vecs = self._encode_bulk(miss_texts)
+            else:
+                miss_vecs = self._encode_model(miss_texts)
+            self.cache.put_many(miss_keys, miss_vecs)
+            fresh = dict(zip(miss_keys, miss_vecs))
+            cached = [vec if vec is not None else fresh[keys[i]] for i, vec in enumerate(cached)]
+        return np.asarray(np.stack(cached), dtype="float32")
 
 embeddings_service = EmbeddingsService()
@@ -1,10 +1,21 @@
 # app/services/index.py
 from __future__ import annotations
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from contextlib import contextmanager
 import os
 import json
+import math
+import threading
+import time
 import numpy as np
 
+from app.core.config import settings
+from app.services.docstore import DocStore
+from app.services.meta_index import MetaIndex
+from app.services.lexical import LEXICAL_FILE, MAX_SEGMENTS, LexicalIndex, segment_file
+from app.utils.text import content_hash
+from app.services.wal import WriteAheadLog
+
 try:
     import faiss  # pip install faiss-cpu
 except Exception as e:
@@ -13,11 +24,107 @@ except Exception as e:
         f"Erro original: {e}"
     )
 
-class VectorIndex:
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq8", "fp16")
+LOSSY_TYPES = ("ivf_pq", "sq8", "fp16")  # guardam códigos aproximados → candidatos a rescore exato
+SNAPSHOT_FILE = "snapshot.json"     # {"lsn", "docs", "index_file", "lexical_*"}: o que o último checkpoint consolidou
+LEGACY_INDEX_FILE = "faiss.index"
+WAL_DIR = "wal"
+TOMBSTONES_FILE = "tombstones.bin"  # int64 ordenado: ids removidos ainda não compactados
+# IO_FLAG_MMAP_IFC mapeia os códigos (Flat/IVF/SQ...) direto do arquivo, sem copiar p/ RAM
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+class _RWLock:
+    """
+    Leitores em paralelo (buscas) × escritor exclusivo (mutação in-place do FAISS/doc store e troca de referências).
+    - o escritor é reentrante na mesma thread; leitura dentro de uma escrita da mesma thread não bloqueia
+    - escritor esperando barra leitores novos (checkpoint/add não ficam famintos sob carga de consultas)
+    """
+
     def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._depth = 0
+        self._waiting = 0
+
+    @contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            yield
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                self._waiting += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting -= 1
+                self._writer, self._depth = me, 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+class VectorIndex:
+    def __init__(self, index_type: str | None = None, shard: int = 0, n_shards: int = 1):
         self.index: faiss.Index | None = None
-        self.docs: List[Dict[str, Any]] = []
+        self.docs = DocStore()
         self.dim: int | None = None
+        self.index_type = (index_type or settings.INDEX_TYPE or "flat").lower()
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"INDEX_TYPE inválido: {self.index_type!r} (use um de {INDEX_TYPES})")
+        # persistência incremental (WAL + checkpoints)
+        self._lock = threading.RLock()   # serializa escritores (add/delete/save/compactação)
+        self._rw = _RWLock()             # buscas (leitura) × mutação in-place / troca de índice e doc store
+        self._save_lock = threading.RLock()  # serializa os saves (a gravação em disco corre fora do _lock)
+        self._path: Optional[str] = None
+        self._wal: Optional[WriteAheadLog] = None
+        self._snapshot_lsn = 0
+        self._index_file: Optional[str] = None
+        self._mmapped = False          # índice atual é uma view read-only do arquivo
+        self.load_stats: Dict[str, Any] = {}
+        # ids estáveis + remoção lógica (tombstones) e compactação
+        # com shards, o id é seq * n_shards + shard → o shard dono sai de id % n_shards
+        self._id_offset = shard
+        self._id_stride = n_shards
+        self._next_id = shard
+        self._tombstones: set = set()
+        self._tomb_params: Optional[tuple] = None   # (IDSelectorNot, IDSelectorBatch) em cache
+        self._compact_thread: Optional[threading.Thread] = None
+        self._promote_thread: Optional[threading.Thread] = None   # build do ANN em background
+        # índice invertido de metadados (montado no 1º filtro e mantido nos adds)
+        self._meta_index: Optional[MetaIndex] = None
+        # hash do texto normalizado → id (deduplicação na ingestão; montado sob demanda)
+        self._hash_index: Optional[Dict[bytes, int]] = None
+        # BM25 (busca lexical): mantido nos adds e salvo junto com o snapshot
+        self._lexical: Optional[LexicalIndex] = None
+        self._lexical_lsn: Optional[int] = None   # lsn do snapshot em que lexical.npz foi gravado
+        self._lexical_segments: List[int] = []    # segmentos de append gravados depois dele (lsns)
+        # muda a cada alteração visível do conteúdo (add/delete/meta/load): invalida caches de respostas
+        self.generation = 0
+        self._ckpt_thread: Optional[threading.Thread] = None
+        self._ckpt_wakeup = threading.Event()
+        self._ckpt_stop = threading.Event()
 
     # ---------- util ----------
     @staticmethod
@@ -36,22 +143,178 @@ class VectorIndex:
         norms = np.linalg.norm(mat, axis=1, keepdims=True) + 1e-12
         return mat / norms
 
+    # ---------- ANN (IVF / HNSW / PQ) ----------
+    def _inner(self) -> faiss.Index | None:
+        """Índice "de verdade" sob o IndexIDMap2 (que só traduz posições em ids externos)."""
+        if isinstance(self.index, faiss.IndexIDMap2):
+            return faiss.downcast_index(self.index.index)
+        return self.index
+
+    def current_type(self) -> str:
+        """Tipo efetivo do índice FAISS em uso (pode ser 'flat' antes da promoção)."""
+        inner = self._inner()
+        if inner is None:
+            return "flat"
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(inner, faiss.IndexIVFPQ):
+            return "ivf_pq"
+        if isinstance(inner, faiss.IndexIVF):
+            return "ivf_flat"
+        if isinstance(inner, faiss.IndexScalarQuantizer):
+            return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+        return "flat"
+
+    def _factory_string(self, n: int) -> str:
+        if self.index_type == "hnsw":
+            return f"HNSW{settings.HNSW_M},Flat"
+        # quantização escalar: busca exaustiva, 1 byte (SQ8) ou 2 bytes (fp16) por dimensão
+        if self.index_type == "sq8":
+            return "SQ8"
+        if self.index_type == "fp16":
+            return "SQfp16"
+        # IVF: ~4*sqrt(n) listas, mas com pelo menos ~39 pontos de treino por centróide
+        nlist = settings.IVF_NLIST or int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n // 39 or 1, 65536))
+        if self.index_type == "ivf_pq":
+            # m precisa dividir a dimensão: pega o maior divisor <= PQ_M
+            m = max(d for d in range(1, min(settings.PQ_M, self.dim) + 1) if self.dim % d == 0)
+            return f"IVF{nlist},PQ{m}x{settings.PQ_NBITS}"
+        return f"IVF{nlist},Flat"
+
+    def _apply_search_defaults(self) -> None:
+        """Aplica nprobe/efSearch padrão (settings) ao índice atual."""
+        inner = self._inner()
+        if inner is None:
+            return
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = settings.HNSW_EF_SEARCH
+        elif isinstance(inner, faiss.IndexIVF):
+            inner.nprobe = settings.IVF_NPROBE
+
+    def _build_ann(self, vecs: np.ndarray) -> faiss.Index:
+        """Cria e treina (vazio) um índice ANN a partir dos vetores (já normalizados)."""
+        desc = self._factory_string(len(vecs))
+        index = faiss.index_factory(self.dim, desc, faiss.METRIC_INNER_PRODUCT)
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        if not index.is_trained:
+            # amostra de treino limitada (k-means não precisa do corpus inteiro)
+            max_train = max(256 * getattr(index, "nlist", 1), 100_000)
+            if len(vecs) > max_train:
+                sel = np.random.default_rng(0).choice(len(vecs), max_train, replace=False)
+                index.train(vecs[np.sort(sel)])
+            else:
+                index.train(vecs)
+        return index
+
+    def _build_index(self, vecs: np.ndarray, ids: np.ndarray) -> faiss.Index:
+        """IndexIDMap2 (ids estáveis) sobre Flat ou sobre o ANN, conforme tipo e tamanho."""
+        if self.index_type != "flat" and len(vecs) >= settings.INDEX_PROMOTE_AT:
+            inner = self._build_ann(vecs)
+        else:
+            # usaremos Inner Product com vetores L2-normalizados (equivale a cosine)
+            inner = faiss.IndexFlatIP(self.dim)
+        index = faiss.IndexIDMap2(inner)
+        if len(vecs):
+            index.add_with_ids(vecs, np.ascontiguousarray(ids, dtype=np.int64))
+        return index
+
+    def _maybe_promote(self) -> None:
+        """
+        Troca o IndexFlatIP pelo ANN configurado quando o índice cruza INDEX_PROMOTE_AT.
+        Treino e build correm numa thread, fora do _lock (as ingestões seguem no Flat); no fim,
+        os docs que entraram nesse meio-tempo são adicionados ao ANN e a troca sai sob o lock de escrita.
+        """
+        if self.index_type == "flat" or self.current_type() != "flat":
+            return
+        if self.index is None or self.index.ntotal < settings.INDEX_PROMOTE_AT:
+            return
+        if self._promote_thread is not None and self._promote_thread.is_alive():
+            return
+        # chamado sob o _lock: fotografa índice, doc store e ids (linhas < n não mudam mais)
+        flat, docs, ids = self.index, self.docs, self.docs.ids()
+
+        def _run():
+            try:
+                # vetores exatos vêm do doc store (não dependem de reconstruct do FAISS)
+                index = self._build_index(docs.vectors(np.arange(len(ids))), ids)
+                with self._lock:
+                    if self.index is not flat:
+                        return  # compactação/load trocou o índice no meio: descarta (o próximo add tenta de novo)
+                    start = int(self.docs.rows_of([ids[-1]])[0]) + 1
+                    rows = np.arange(start, len(self.docs))
+                    if len(rows):
+                        new_ids = np.fromiter((self.docs.id_of(int(r)) for r in rows), dtype=np.int64, count=len(rows))
+                        index.add_with_ids(self.docs.vectors(rows), new_ids)
+                    with self._rw.write():
+                        self.index = index
+                        self._mmapped = False
+                        self._apply_search_defaults()
+                print(
+                    f"[index] promovido para {self.index_type} ({self._factory_string(len(ids))}) "
+                    f"com {len(ids) + len(rows)} vetores ({len(rows)} durante o build)"
+                )
+            except Exception as e:
+                print(f"[index] promoção falhou: {e}")
+
+        # não-daemon: sair do processo no meio do treino (código nativo do FAISS) aborta o interpretador
+        self._promote_thread = threading.Thread(target=_run, name="index-promote", daemon=False)
+        self._promote_thread.start()
+
+    def _tombstone_selector(self):
+        """IDSelector que exclui os ids removidos (reconstruído só quando os tombstones mudam)."""
+        if not self._tombstones:
+            return None
+        if self._tomb_params is None:
+            batch = faiss.IDSelectorBatch(np.fromiter(self._tombstones, dtype=np.int64))
+            self._tomb_params = (faiss.IDSelectorNot(batch), batch)
+        return self._tomb_params
+
+    def _search_params(self, nprobe: int | None = None, ef_search: int | None = None, sel=None):
+        """
+        Parâmetros de busca por requisição (None = usa o padrão do índice).
+        - sel: (IDSelector, *objetos a manter vivos) já filtrado; senão exclui só os tombstones
+        """
+        inner = self._inner()
+        params = None
+        if isinstance(inner, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = int(ef_search or inner.hnsw.efSearch)
+        elif isinstance(inner, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF()
+            params.nprobe = int(nprobe or inner.nprobe)
+        if sel is None:
+            sel = self._tombstone_selector()
+        if sel is not None:
+            params = params or faiss.SearchParameters()
+            params.sel = sel[0]
+            params.referenced_objects = sel  # mantém os seletores vivos durante a busca
+        return params
+
     # ---------- API ----------
     def count(self) -> int:
-        """Total de documentos carregados no índice."""
-        return len(self.docs)
+        """Total de documentos ativos no índice (sem os removidos)."""
+        return len(self.docs) - len(self._tombstones)
+
+    def deleted_count(self) -> int:
+        return len(self._tombstones)
 
     def add_documents(
         self,
         texts: List[str],
         metas: List[Dict[str, Any]],
         vectors,
+        *,
+        replace: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         """
         Adiciona documentos e vetores ao índice.
         - texts: lista de strings
         - metas: lista de metadados (mesmo comprimento de texts, ou será preenchido com {})
         - vectors: array (n, dim) em float32
+        - replace: upsert — antes de adicionar, remove os docs cujo meta casa com o filtro
+          (ex.: {"filename": "a.txt"}); tudo sob o mesmo lock
         """
         if not texts:
             return {"ingested": 0, "total_docs": self.count()}
@@ -63,102 +326,771 @@ class VectorIndex:
         vecs = self._as_ndarray(vectors)
         if vecs.ndim != 2:
             raise ValueError(f"Esperado shape (n, dim) para vectors, obtido {vecs.shape}")
-
-        # cria índice se necessário
-        if self.index is None:
-            self.dim = int(vecs.shape[1])
-            # usaremos Inner Product com vetores L2-normalizados (equivale a cosine)
-            self.index = faiss.IndexFlatIP(self.dim)
-
         # valida dimensão
-        if self.dim is None or self.dim != vecs.shape[1]:
+        if self.dim is not None and self.dim != vecs.shape[1]:
             raise ValueError(f"Dimensão dos vetores ({vecs.shape[1]}) difere do índice ({self.dim}).")
-
-        # normaliza e adiciona
         vecs = self._l2_normalize(vecs)
-        self.index.add(vecs)
 
-        start_id = self.count()
-        for i, t in enumerate(texts):
-            self.docs.append({
-                "id": start_id + i,
-                "text": t,
-                "meta": metas[i] if i < len(metas) else {},
-            })
+        with self._lock:
+            replaced = self.delete_where(replace) if replace else 0
+            ids = self._alloc_ids(len(texts))
+            # log antes de aplicar: um crash após o append é recuperado no próximo load()
+            if self._wal is not None:
+                self._wal.append("add", {"texts": texts, "metas": metas, "ids": ids}, vecs)
+            self._apply_add(texts, metas, vecs, ids)
+            self._maybe_wake_checkpointer()
+
+        out = {"ingested": len(texts), "total_docs": self.count()}
+        if replace:
+            out["replaced"] = replaced
+        return out
 
-        return {"ingested": len(texts), "total_docs": self.count()}
+    def delete(self, ids) -> int:
+        """Remoção lógica por id (tombstone). Retorna quantos docs foram de fato removidos."""
+        with self._lock:
+            ids = self._live_ids(ids)
+            if not ids:
+                return 0
+            if self._wal is not None:
+                self._wal.append("delete", {"ids": ids})
+            self._apply_delete(ids)
+            self._maybe_wake_checkpointer()
+        self._maybe_schedule_compaction()
+        return len(ids)
 
-    def search(self, query_vectors, k: int = 3) -> List[Dict[str, Any]]:
+    def delete_where(self, where: Dict[str, Any]) -> int:
         """
-        Busca os top-k documentos mais similares ao primeiro vetor de consulta.
-        Retorna lista de dicts: {"id", "text", "meta"}.
+        Tira a origem `where` dos docs cujo meta casa com todos os pares (valor lista = qualquer um).
+        Chunk compartilhado com outra origem (meta com lista, ver merge_metas) só perde esses valores
+        e continua no índice; os demais são removidos. Retorna quantos docs foram removidos.
         """
-        if self.index is None or self.count() == 0:
+        with self._lock:
+            drop, shared, metas = self._release_plan(where)
+            if shared:
+                self._set_metas(shared, metas)
+            return self.delete(drop)
+
+    def owned_ids_where(self, where: Dict[str, Any]) -> List[int]:
+        """Ids que o delete_where(where) removeria (sem os chunks compartilhados com outra origem)."""
+        with self._lock:
+            return self._release_plan(where)[0]
+
+    def _release_plan(self, where: Dict[str, Any]) -> Tuple[List[int], List[int], List[Dict[str, Any]]]:
+        """(ids a remover, ids compartilhados, metas deles já sem a origem `where`)."""
+        drop, shared, metas = [], [], []
+        ids = self.ids_where(where)
+        for did, row in zip(ids, self.docs.rows_of(ids)):
+            meta = strip_metas(self.docs.meta(int(row)), where)
+            if meta is None:
+                drop.append(did)
+            else:
+                shared.append(did)
+                metas.append(meta)
+        return drop, shared, metas
+
+    def ids_where(self, where: Dict[str, Any]) -> List[int]:
+        """Ids ativos cujo meta casa com o filtro (valor lista = qualquer um)."""
+        if not where or len(self.docs) == 0:
             return []
+        return self._filtered_ids(where).tolist()
+
+    def _meta(self) -> MetaIndex:
+        with self._lock:
+            if self._meta_index is None:
+                self._meta_index = MetaIndex.build(
+                    self.docs.ids(), self.docs.meta_id_array(), self.docs.metas_table
+                )
+            return self._meta_index
+
+    def _lex(self) -> LexicalIndex:
+        """BM25 do doc store (montado aqui só p/ snapshots sem lexical.npz; depois é mantido nos adds)."""
+        with self._lock:
+            if self._lexical is None:
+                self._lexical = LexicalIndex.build(
+                    (self.docs.id_of(r) for r in range(len(self.docs))),
+                    (self.docs.text(r) for r in range(len(self.docs))),
+                )
+            return self._lexical
+
+    def _filtered_ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Ids ativos (ordenados) que passam no filtro de metadados, já sem os tombstones."""
+        ids = self._meta().ids(filters)
+        if self._tombstones and len(ids):
+            ids = ids[~np.isin(ids, np.fromiter(self._tombstones, dtype=np.int64))]
+        return ids
+
+    def _filter_selector(self, ids: np.ndarray):
+        """IDSelectorBitmap sobre o espaço de ids (1 bit por id; checagem O(1) dentro do FAISS)."""
+        mask = np.zeros(self._next_id, dtype=bool)
+        mask[ids] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        return (faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap)
+
+    def _alloc_ids(self, n: int) -> List[int]:
+        return list(range(self._next_id, self._next_id + n * self._id_stride, self._id_stride))
+
+    def _live_ids(self, ids) -> List[int]:
+        ids = np.unique(np.asarray(list(ids), dtype=np.int64))
+        ids = ids[self.docs.rows_of(ids) >= 0]
+        return [int(i) for i in ids if int(i) not in self._tombstones]
+
+    def _ensure_writable(self) -> None:
+        """Índice mapeado via mmap é read-only: antes de mutar, relê o arquivo para a RAM."""
+        if self._mmapped and self._index_file:
+            index = faiss.read_index(self._index_file)
+            with self._rw.write():
+                self.index = index
+                self._apply_search_defaults()
+                self._mmapped = False
+
+    def _apply_add(self, texts: List[str], metas: List[Dict[str, Any]], vecs: np.ndarray, ids: List[int]) -> None:
+        self._ensure_writable()
+        with self._rw.write():  # add no FAISS/doc store é in-place: nenhuma busca no meio
+            # cria índice se necessário
+            if self.index is None:
+                self.dim = int(vecs.shape[1])
+                self.index = self._build_index(np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int64))
+            if self._lexical is None and len(self.docs) == 0:
+                self._lexical = LexicalIndex()
+            self.index.add_with_ids(vecs, np.asarray(ids, dtype=np.int64))
+            self.docs.append(texts, metas, ids, vecs)
+            if self._lexical is not None:
+                self._lexical.add(ids, texts)  # tokeniza uma vez, aqui; a busca só lê as postings
+            if self._meta_index is not None:
+                self._meta_index.add(ids, metas)
+            if self._hash_index is not None:
+                for did, t in zip(ids, texts):
+                    self._hash_index[content_hash(t)] = int(did)
+            self._next_id = max(self._next_id, int(ids[-1]) + self._id_stride)
+            self.generation += 1
+        self._maybe_promote()
+
+    def find_existing(self, hashes: List[bytes], exclude: Optional[set] = None) -> List[Optional[int]]:
+        """Id do doc ativo com o mesmo content_hash (ou None), para cada hash."""
+        with self._lock:
+            if self._hash_index is None:
+                self._hash_index = {
+                    content_hash(self.docs.text(r)): self.docs.id_of(r) for r in range(len(self.docs))
+                }
+            out = []
+            for h in hashes:
+                did = self._hash_index.get(h)
+                if did is None or did in self._tombstones or (exclude and did in exclude):
+                    did = None
+                out.append(did)
+            return out
+
+    def merge_meta(self, ids: List[int], metas: List[Dict[str, Any]]) -> int:
+        """Funde metadados novos nos docs existentes (ver merge_metas). Retorna quantos mudaram."""
+        with self._lock:
+            rows = self.docs.rows_of(ids)
+            changed_ids, changed_metas = [], []
+            for did, row, meta in zip(ids, rows, metas):
+                if row < 0 or did in self._tombstones:
+                    continue
+                old = self.docs.meta(int(row))
+                new = merge_metas(old, meta)
+                if new != old:
+                    changed_ids.append(int(did))
+                    changed_metas.append(new)
+            if not changed_ids:
+                return 0
+            self._set_metas(changed_ids, changed_metas)
+            return len(changed_ids)
 
+    def _set_metas(self, ids: List[int], metas: List[Dict[str, Any]]) -> None:
+        """Troca o meta dos docs (WAL + aplica); chamado sob o _lock."""
+        if self._wal is not None:
+            self._wal.append("meta", {"ids": ids, "metas": metas})
+        self._apply_meta(ids, metas)
+        self._maybe_wake_checkpointer()
+
+    def _apply_meta(self, ids: List[int], metas: List[Dict[str, Any]]) -> None:
+        with self._rw.write():
+            for row, meta in zip(self.docs.rows_of(ids), metas):
+                if row >= 0:
+                    self.docs.set_meta(int(row), meta)
+            self._meta_index = None  # postings antigas ficaram obsoletas → remonta no próximo filtro
+            self.generation += 1
+
+    def _apply_delete(self, ids: List[int]) -> None:
+        with self._rw.write():
+            self._tombstones.update(int(i) for i in ids)
+            self._tomb_params = None
+            self.generation += 1
+
+    def _apply_record(self, payload: Dict[str, Any], vecs: Optional[np.ndarray]) -> None:
+        """Reaplica um registro do WAL (sem logar de novo)."""
+        op = payload.get("op")
+        if op == "add":
+            texts = payload["texts"]
+            ids = payload.get("ids") or self._alloc_ids(len(texts))
+            self._apply_add(texts, payload["metas"], np.ascontiguousarray(vecs), ids)
+        elif op == "delete":
+            self._apply_delete(self._live_ids(payload["ids"]))
+        elif op == "meta":
+            self._apply_meta(payload["ids"], payload["metas"])
+        else:
+            raise ValueError(f"Operação desconhecida no WAL: {op!r}")
+
+    # ---------- compactação ----------
+    def compact(self) -> Dict[str, Any]:
+        """
+        Reconstrói índice e doc store só com os docs ativos (descarta tombstones).
+        Tudo é montado à parte (as buscas seguem no índice/doc store antigos) e publicado numa
+        única troca sob o lock de escrita. Com persistência ligada, grava um snapshot em seguida.
+        """
+        with self._lock:
+            removed = len(self._tombstones)
+            if not removed:
+                return {"compacted": False, "removed": 0, "total_docs": self.count()}
+            dead = np.fromiter(self._tombstones, dtype=np.int64)
+            ids = self.docs.ids()
+            keep = np.nonzero(~np.isin(ids, dead))[0]
+            docs = self.docs.subset(keep)
+            vecs = docs.vectors(np.arange(len(docs)))
+            index = self._build_index(vecs, ids[keep]) if self.dim else None
+            lexical = self._lexical.without(dead) if self._lexical is not None else None
+            with self._rw.write():
+                self.index = index
+                self.docs = docs
+                self._lexical = lexical
+                self._lexical_lsn = None   # BM25 novo: o próximo save regrava lexical.npz inteiro
+                self._tombstones = set()
+                self._tomb_params = None
+                self._meta_index = None
+                self._hash_index = None
+                self._mmapped = False
+                self._apply_search_defaults()
+        if self._wal is not None and self._path:
+            self.save(self._path)
+        print(f"[index] compactação: {removed} doc(s) removido(s) fisicamente")
+        return {"compacted": True, "removed": removed, "total_docs": self.count()}
+
+    def _maybe_schedule_compaction(self) -> None:
+        """Dispara a compactação em background quando a fração removida passa do limiar."""
+        total = len(self.docs)
+        if not total or len(self._tombstones) / total < settings.COMPACT_THRESHOLD:
+            return
+        if self._compact_thread is not None and self._compact_thread.is_alive():
+            return
+
+        def _run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"[index] compactação falhou: {e}")
+
+        self._compact_thread = threading.Thread(target=_run, name="index-compact", daemon=True)
+        self._compact_thread.start()
+
+    def _prepare_queries(self, query_vectors) -> np.ndarray:
         q = self._as_ndarray(query_vectors)
         if q.ndim == 1:
             q = q.reshape(1, -1)
         if q.shape[1] != self.dim:
             raise ValueError(f"Dimensão do vetor de consulta ({q.shape[1]}) difere do índice ({self.dim}).")
+        return self._l2_normalize(q)
+
+    def _hits(self, ids, scores) -> List[Dict[str, Any]]:
+        """Monta os hits a partir de ids externos (posição no doc store via busca binária)."""
+        docs = self.docs
+        rows = docs.rows_of(ids)
+        return [
+            {"id": int(i), "text": docs.text(int(r)), "meta": docs.meta(int(r)), "score": float(d)}
+            for i, r, d in zip(ids, rows, scores)
+            if r >= 0
+        ]
+
+    def vectors_of(self, ids) -> Optional[np.ndarray]:
+        """
+        Vetores (normalizados) dos ids, na mesma ordem: coluna do doc store ou, sem ela,
+        reconstruct do FAISS. None se algum id não existe ou o índice não reconstrói (ex.: IVF).
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if self.dim is None or len(ids) == 0:
+            return None
+        with self._rw.read():
+            if self.docs.has_vectors:
+                rows = self.docs.rows_of(ids)
+                return self.docs.vectors(rows) if (rows >= 0).all() else None
+            try:
+                return np.vstack([self.index.reconstruct(int(i)) for i in ids]).astype(np.float32)
+            except RuntimeError:
+                return None
 
-        q = self._l2_normalize(q)
+    def search_many(
+        self,
+        query_vectors,
+        k: int = 3,
+        *,
+        min_sim: float | None = None,
+        use_range: bool | None = None,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        filters: Optional[Dict[str, Any]] = None,
+        rescore: bool | None = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Busca em lote: uma única chamada FAISS para a matriz (n, dim) inteira.
+        - min_sim: descarta hits com cosine < min_sim (no máximo k por consulta)
+        - use_range: usa faiss range_search com raio = min_sim (padrão: settings.RANGE_SEARCH)
+        - filters: restringe por metadados, ex.: {"source": "notas_aula"} (valor lista = qualquer um);
+          aplicado dentro do FAISS via IDSelector, ou por força bruta se o subconjunto for pequeno
+        - rescore: em índices quantizados (sq8/fp16/ivf_pq), busca k*RESCORE_FACTOR candidatos e
+          reordena pelo cosine exato dos vetores float32 do doc store (padrão: RESCORE_FACTOR > 0)
+        Retorna uma lista por consulta com dicts {"id", "text", "meta", "score"}.
+        """
+        q = self._as_ndarray(query_vectors)
+        n_queries = 1 if q.ndim == 1 else int(q.shape[0])
+        if self.index is None or self.count() == 0:
+            return [[] for _ in range(n_queries)]
+        # o filtro usa o _lock (índice de metadados): resolvido antes da leitura, nunca dentro dela
+        allowed = self._filtered_ids(filters) if filters else None
+        if allowed is not None and len(allowed) == 0:
+            return [[] for _ in range(n_queries)]
+        with self._rw.read():
+            return self._search_many_locked(q, n_queries, k, allowed, min_sim, use_range, nprobe, ef_search, rescore)
+
+    def _search_many_locked(
+        self, q, n_queries: int, k: int, allowed, min_sim, use_range, nprobe, ef_search, rescore
+    ) -> List[List[Dict[str, Any]]]:
+        if self.index is None or self.count() == 0:
+            return [[] for _ in range(n_queries)]
+        q = self._prepare_queries(q)
+        sel = None
+        if allowed is not None:
+            if len(allowed) <= settings.FILTER_BRUTE_FORCE_MAX:
+                return self._search_subset(q, allowed, k, min_sim)
+            sel = self._filter_selector(allowed)
+            k = min(k, len(allowed))
         k = max(1, min(k, self.count()))
-        distances, indices = self.index.search(q, k)
-        top_ids = [int(i) for i in indices[0] if i != -1]
-
-        # monta resposta
-        results: List[Dict[str, Any]] = []
-        for did in top_ids:
-            d = self.docs[did]
-            results.append({"id": d["id"], "text": d["text"], "meta": d.get("meta", {})})
+        params = self._search_params(nprobe, ef_search, sel=sel)
+        if use_range is None:
+            use_range = settings.RANGE_SEARCH
+        if rescore is None:
+            rescore = settings.RESCORE_FACTOR > 1
+        rescore = rescore and self.current_type() in LOSSY_TYPES and self.docs.has_vectors
+
+        # com rescore, o raio valeria sobre o score quantizado (pode passar de 1 ou cortar um doc
+        # que o cosine exato aceitaria): top-k + rescore + corte pelo min_sim no score exato
+        if min_sim is not None and use_range and not rescore:
+            try:
+                return self._range_search(q, k, float(min_sim), params)
+            except RuntimeError:
+                pass  # índice sem suporte a range_search → cai no top-k + corte
+
+        k_fetch = min(k * max(settings.RESCORE_FACTOR, 2), self.count()) if rescore else k
+
+        distances, indices = self.index.search(q, k_fetch, params=params)  # IP em vetores normalizados ≈ cos
+        if rescore:
+            distances, indices = self._rescore(q, distances, indices, k)
+        results: List[List[Dict[str, Any]]] = []
+        for row_d, row_i in zip(distances, indices):
+            ok = row_i != -1
+            if min_sim is not None:
+                ok &= row_d >= min_sim
+            results.append(self._hits(row_i[ok], row_d[ok]))
+        return results
+
+    def _rescore(self, q: np.ndarray, distances: np.ndarray, indices: np.ndarray, k: int):
+        """Reordena os candidatos do índice quantizado pelo produto interno exato (float32)."""
+        exact = np.full(indices.shape, -np.inf, dtype=np.float32)
+        valid = indices != -1
+        rows = self.docs.rows_of(indices[valid])
+        vecs = self.docs.vectors(np.maximum(rows, 0))
+        qi = np.nonzero(valid)[0]
+        exact[valid] = np.einsum("ij,ij->i", vecs, q[qi])
+        exact[valid] = np.where(rows >= 0, exact[valid], -np.inf)
+        order = np.argsort(-exact, axis=1)[:, :k]
+        out_i = np.take_along_axis(indices, order, axis=1)
+        out_d = np.take_along_axis(exact, order, axis=1)
+        out_i[~np.isfinite(out_d)] = -1
+        return out_d, out_i
+
+    def _search_subset(
+        self, q: np.ndarray, ids: np.ndarray, k: int, min_sim: float | None
+    ) -> List[List[Dict[str, Any]]]:
+        """Busca exata só nos ids filtrados (vetores do doc store): custo ∝ tamanho do subconjunto."""
+        vecs = self.docs.vectors(self.docs.rows_of(ids))
+        sims = q @ vecs.T
+        k = min(k, len(ids))
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        results: List[List[Dict[str, Any]]] = []
+        for row_s, row_top in zip(sims, top):
+            order = row_top[np.argsort(-row_s[row_top])]
+            row_d = row_s[order]
+            if min_sim is not None:
+                order, row_d = order[row_d >= min_sim], row_d[row_d >= min_sim]
+            results.append(self._hits(ids[order], row_d))
+        return results
+
+    def _range_search(self, q: np.ndarray, k: int, min_sim: float, params) -> List[List[Dict[str, Any]]]:
+        lims, distances, indices = self.index.range_search(q, min_sim, params=params)
+        results: List[List[Dict[str, Any]]] = []
+        for qi in range(q.shape[0]):
+            row_d = distances[lims[qi]:lims[qi + 1]]
+            row_i = indices[lims[qi]:lims[qi + 1]]
+            # range_search não ordena: pega os k melhores
+            if len(row_d) > k:
+                top = np.argpartition(-row_d, k - 1)[:k]
+                row_d, row_i = row_d[top], row_i[top]
+            order = np.argsort(-row_d)
+            results.append(self._hits(row_i[order], row_d[order]))
         return results
 
+    def search_lexical_many(
+        self,
+        queries: List[str],
+        k: int = 3,
+        *,
+        filters: Optional[Dict[str, Any]] = None,
+        query_vectors=None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Busca lexical (BM25) em lote, independente da busca densa.
+        - score = BM25; com query_vectors, cada hit ganha também "cosine" (vetor exato do doc store)
+        - filters / tombstones: mesmos critérios do search_many
+        """
+        if len(self.docs) == 0 or not queries:
+            return [[] for _ in queries]
+        self._lex()  # monta o BM25 (sob o _lock) antes da leitura, se ainda não existe
+        allowed = None
+        if filters:
+            allowed = self._filtered_ids(filters)
+            if len(allowed) == 0:
+                return [[] for _ in queries]
+        with self._rw.read():
+            lex = self._lexical
+            exclude = np.fromiter(self._tombstones, dtype=np.int64) if self._tombstones else None
+            q = None
+            if query_vectors is not None and self.dim is not None and self.docs.has_vectors:
+                q = self._prepare_queries(query_vectors)
+            results: List[List[Dict[str, Any]]] = []
+            for qi, text in enumerate(queries):
+                ids, scores = lex.search(text, k, exclude=exclude, allowed=allowed) if lex is not None else ([], [])
+                hits = self._hits(ids, scores)
+                if q is not None and hits:
+                    rows = self.docs.rows_of([h["id"] for h in hits])
+                    for h, cos in zip(hits, self.docs.vectors(rows) @ q[qi]):
+                        h["cosine"] = float(cos)
+                results.append(hits)
+            return results
+
+    def search_with_scores(
+        self,
+        query_vectors,
+        k: int = 3,
+        *,
+        min_sim: float | None = None,
+        use_range: bool | None = None,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Top-k do primeiro vetor de consulta com score (cosine), opcionalmente acima de min_sim."""
+        q = self._as_ndarray(query_vectors)
+        if q.ndim == 2:
+            q = q[:1]
+        return self.search_many(
+            q, k, min_sim=min_sim, use_range=use_range, nprobe=nprobe, ef_search=ef_search,
+            filters=filters,
+        )[0]
+
+    def search(
+        self,
+        query_vectors,
+        k: int = 3,
+        *,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca os top-k documentos mais similares ao primeiro vetor de consulta.
+        - nprobe / ef_search: ajuste fino por requisição para índices IVF / HNSW
+        - filters: restringe por metadados (ver search_many)
+        Retorna lista de dicts: {"id", "text", "meta", "score"}.
+        """
+        return self.search_with_scores(query_vectors, k, nprobe=nprobe, ef_search=ef_search, filters=filters)
+
     # ---------- persistência ----------
     def save(self, path: str = "data") -> None:
-        os.makedirs(path, exist_ok=True)
-        # índice
-        if self.index is not None:
-            faiss.write_index(self.index, os.path.join(path, "faiss.index"))
-        # docs
-        with open(os.path.join(path, "docs.jsonl"), "w", encoding="utf-8") as f:
-            for d in self.docs:
-                f.write(json.dumps(d, ensure_ascii=False) + "\n")
-
-    def load(self, path: str = "data") -> None:
-        idx_path = os.path.join(path, "faiss.index")
-        docs_path = os.path.join(path, "docs.jsonl")
-        if os.path.exists(idx_path) and os.path.exists(docs_path):
-            self.index = faiss.read_index(idx_path)
-            self.dim = int(self.index.d)
-            with open(docs_path, "r", encoding="utf-8") as f:
-                self.docs = [json.loads(line) for line in f]
-        else:
-            # mantém vazio
+        """
+        Snapshot completo: faiss-<lsn>.index + doc store + BM25 + snapshot.json (gravado por último).
+        Sob o _lock só se captura um estado consistente (índice serializado em memória, tail do doc
+        store, postings novas do BM25, tombstones, lsn); a escrita em disco corre fora dele, com as
+        ingestões liberadas. Com WAL ativo, os segmentos já consolidados são descartados em seguida.
+        """
+        path_abs = os.path.abspath(path)
+        with self._save_lock:
+            os.makedirs(path, exist_ok=True)
+            with self._lock:
+                home = self._path == path_abs
+                lsn = self._wal.last_lsn if self._wal is not None else self._snapshot_lsn
+                index_file, index_bytes = None, None
+                if self.index is not None:
+                    if self._mmapped and self._index_file and os.path.dirname(os.path.abspath(self._index_file)) == path_abs:
+                        index_file = os.path.basename(self._index_file)  # mapeado = intocado desde o load
+                    else:
+                        index_file = f"faiss-{lsn:016d}.index"
+                        index_bytes = faiss.serialize_index(self.index)
+                live_docs, n_docs = self.docs, len(self.docs)
+                docs = live_docs.frozen()
+                tombstones = np.array(sorted(self._tombstones), dtype=np.int64)
+                next_id = self._next_id
+                # BM25: só o que entrou desde o último checkpoint vira um segmento de append;
+                # lexical.npz inteiro só num diretório novo, após compactação ou com segmentos demais
+                lex, lex_full, lex_seg = self._lexical, None, None
+                lex_lsn, lex_segments = self._lexical_lsn, list(self._lexical_segments)
+                if lex is not None:
+                    if not home or lex_lsn is None or len(lex_segments) >= MAX_SEGMENTS:
+                        lex_full = lex.snapshot()
+                        if home:
+                            lex.mark_saved()
+                        lex_lsn, lex_segments = lsn, []
+                    else:
+                        lex_seg = lex.segment()
+                        if lex_seg is not None:
+                            lex_segments.append(lsn)
+                else:
+                    lex_lsn, lex_segments = None, []
+
+            # ---- disco (fora do _lock) ----
+            try:
+                if index_bytes is not None:
+                    tmp = os.path.join(path, index_file + ".tmp")
+                    index_bytes.tofile(tmp)
+                    os.replace(tmp, os.path.join(path, index_file))
+                    del index_bytes
+                # docs (colunar; só anexa o que entrou desde o último save/load) → store nova, já mapeada
+                fresh = docs.save(path)
+                if lex_full is not None:
+                    lex_full.save(path, lsn)
+                elif lex_seg is not None:
+                    LexicalIndex.save_segment(path, lsn, lex_seg)
+                elif lex is None and os.path.exists(os.path.join(path, LEXICAL_FILE)):
+                    os.remove(os.path.join(path, LEXICAL_FILE))
+                tmp = os.path.join(path, TOMBSTONES_FILE + ".tmp")
+                tombstones.tofile(tmp)
+                os.replace(tmp, os.path.join(path, TOMBSTONES_FILE))
+                _write_json_atomic(
+                    os.path.join(path, SNAPSHOT_FILE),
+                    {
+                        "lsn": lsn, "docs": n_docs, "next_id": next_id, "index_file": index_file,
+                        "lexical_lsn": lex_lsn, "lexical_segments": lex_segments,
+                    },
+                )
+            except BaseException:
+                if home:
+                    with self._lock:
+                        self._lexical_lsn = None  # postings já marcadas como gravadas: regrava tudo da próxima vez
+                raise
+            keep_segments = {segment_file(x) for x in lex_segments}
+            for name in os.listdir(path):
+                stale_index = name != index_file and name.startswith("faiss-") and name.endswith(".index")
+                stale_seg = name.startswith("lexical-") and name.endswith(".seg.npz") and name not in keep_segments
+                if stale_index or stale_seg:
+                    os.remove(os.path.join(path, name))
+
+            # ---- publica (sob o _lock): o que entrou durante a escrita vai para a store nova ----
+            with self._lock:
+                if self.docs is live_docs:  # (uma compactação no meio já trocou tudo: fica a dela)
+                    fresh.catch_up(live_docs, n_docs)
+                    with self._rw.write():
+                        self.docs = fresh
+                if home and self._lexical is lex:
+                    self._lexical_lsn, self._lexical_segments = lex_lsn, lex_segments
+                self._snapshot_lsn = lsn
+                if self._wal is not None and home:
+                    self._wal.rotate()
+                    self._wal.drop_until(lsn)
+
+    def load(self, path: str = "data", wal: Optional[bool] = None) -> None:
+        """
+        Carrega o último snapshot e reaplica o WAL (registros com lsn > snapshot).
+        - wal: mantém o log aberto para as próximas ingestões (padrão: settings.PERSIST_INDEX)
+        """
+        t0 = time.perf_counter()
+        with self._save_lock, self._lock, self._rw.write():
+            self._close_wal()
+            snap = _read_json(os.path.join(path, SNAPSHOT_FILE))
+            if snap is not None:
+                idx_path = os.path.join(path, snap["index_file"]) if snap.get("index_file") else None
+                n_docs, lsn = int(snap.get("docs", 0)), int(snap.get("lsn", 0))
+            else:
+                idx_path, n_docs, lsn = os.path.join(path, LEGACY_INDEX_FILE), None, 0
+
+            mmap_ok = settings.INDEX_MMAP
             self.index = None
-            self.docs = []
-            self.dim = None
-            
-def search_with_scores(self, query_vectors, k: int = 3):
-    if self.index is None or self.count() == 0:
-        return []
-    q = self._as_ndarray(query_vectors)
-    if q.ndim == 1:
-        q = q.reshape(1, -1)
-    if q.shape[1] != self.dim:
-        raise ValueError(f"Dimensão do vetor de consulta ({q.shape[1]}) difere do índice ({self.dim}).")
-    q = self._l2_normalize(q)
-    k = max(1, min(k, self.count()))
-    distances, indices = self.index.search(q, k)  # IP em vetores normalizados ≈ cos
-    out = []
-    for rank, idx in enumerate(indices[0]):
-        if idx == -1:
+            if idx_path and os.path.exists(idx_path):
+                # read_index devolve a classe concreta (IDMap2 sobre Flat/IVF/HNSW/PQ) → o tipo faz round-trip
+                self.index = faiss.read_index(idx_path, _MMAP_FLAGS if mmap_ok else 0)
+            docs = DocStore()
+            if self.index is not None and docs.load(path, n=n_docs, lazy=mmap_ok, dim=int(self.index.d)):
+                self.docs = docs
+                self.dim = int(self.index.d)
+                self._index_file = idx_path
+                self._mmapped = mmap_ok
+                if not isinstance(self.index, faiss.IndexIDMap2):
+                    self._migrate_legacy_index()
+                self._apply_search_defaults()
+            else:
+                # mantém vazio
+                self.index = None
+                self.docs = DocStore()
+                self.dim = None
+                self._index_file = None
+                self._mmapped = False
+
+            tomb_p = os.path.join(path, TOMBSTONES_FILE)
+            self._tombstones = set()
+            if self.index is not None and os.path.exists(tomb_p):
+                self._tombstones = set(np.fromfile(tomb_p, dtype=np.int64).tolist())
+            self._tomb_params = None
+            self._meta_index = None
+            self._hash_index = None
+            # BM25 salvo com este snapshot (senão é remontado do doc store na 1ª busca lexical)
+            lex_lsn, lex_segments = (snap or {}).get("lexical_lsn"), (snap or {}).get("lexical_segments", [])
+            self._lexical = None
+            if self.index is not None and lex_lsn is not None:
+                self._lexical = LexicalIndex.load(path, int(lex_lsn), len(self.docs), lex_segments)
+            self._lexical_lsn = lex_lsn if self._lexical is not None else None
+            self._lexical_segments = list(lex_segments) if self._lexical is not None else []
+            self.generation += 1
+            n = len(self.docs)
+            last_free = self.docs.id_of(n - 1) + self._id_stride if n else self._id_offset
+            self._next_id = int((snap or {}).get("next_id", last_free))
+
+            self._path = os.path.abspath(path)
+            self._snapshot_lsn = lsn
+            replayed = 0
+            if settings.PERSIST_INDEX if wal is None else wal:
+                self._wal = WriteAheadLog(os.path.join(path, WAL_DIR), fsync=settings.WAL_FSYNC)
+                for _, payload, vecs in self._wal.replay(after_lsn=lsn):
+                    self._apply_record(payload, vecs)
+                    replayed += 1
+                if replayed:
+                    print(f"[index] WAL: {replayed} registro(s) reaplicado(s) sobre o snapshot")
+
+            self.load_stats = {
+                "seconds": round(time.perf_counter() - t0, 3),
+                "mmap": self._mmapped,
+                "wal_replayed": replayed,
+            }
+            # snapshot gravado antes de uma promoção terminar (ainda Flat): retoma o build em background
+            self._maybe_promote()
+
+    def _migrate_legacy_index(self) -> None:
+        """
+        Snapshot anterior aos ids estáveis (índice sem IDMap, ids = posição):
+        recupera os vetores do próprio FAISS e reconstrói como IndexIDMap2 + coluna de vetores.
+        """
+        index = faiss.read_index(self._index_file) if self._mmapped else self.index
+        if isinstance(index, faiss.IndexIVF):
+            index.make_direct_map()
+        vecs = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, self.dim), dtype=np.float32)
+        self.docs = self.docs.subset(np.arange(len(self.docs)), vectors=vecs)
+        self.index = self._build_index(vecs, self.docs.ids())
+        self._mmapped = False
+        print(f"[index] snapshot antigo migrado para ids estáveis ({index.ntotal} vetores)")
+
+    def _close_wal(self) -> None:
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    # ---------- checkpoints em background ----------
+    def checkpoint(self, path: Optional[str] = None) -> bool:
+        """Consolida o WAL num snapshot, se houver algo novo. Retorna True se gravou."""
+        with self._save_lock:
+            if self._wal is not None and self._wal.last_lsn <= self._snapshot_lsn:
+                return False
+            self.save(path or self._path or settings.INDEX_DIR)
+            return True
+
+    def _maybe_wake_checkpointer(self) -> None:
+        if self._ckpt_thread is not None and self._wal is not None:
+            if self._wal.size() >= settings.WAL_CHECKPOINT_BYTES:
+                self._ckpt_wakeup.set()
+
+    def start_checkpointer(self, interval_s: Optional[float] = None) -> None:
+        """Thread daemon que faz checkpoint a cada interval_s (ou antes, se o WAL crescer demais)."""
+        if self._ckpt_thread is not None:
+            return
+        interval = float(interval_s or settings.WAL_CHECKPOINT_SECS)
+        self._ckpt_stop.clear()
+
+        def _run():
+            while not self._ckpt_stop.is_set():
+                self._ckpt_wakeup.wait(interval)
+                self._ckpt_wakeup.clear()
+                if self._ckpt_stop.is_set():
+                    break
+                try:
+                    if self.checkpoint():
+                        print(f"[index] checkpoint em {self._path} (lsn={self._snapshot_lsn})")
+                except Exception as e:
+                    print(f"[index] checkpoint falhou: {e}")
+
+        self._ckpt_thread = threading.Thread(target=_run, name="index-checkpoint", daemon=True)
+        self._ckpt_thread.start()
+
+    def stop_checkpointer(self) -> None:
+        if self._ckpt_thread is None:
+            return
+        self._ckpt_stop.set()
+        self._ckpt_wakeup.set()
+        self._ckpt_thread.join(timeout=30)
+        self._ckpt_thread = None
+
+
+def merge_metas(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Une metadados: chave nova entra; valor divergente vira lista (ex.: 2 filenames p/ o mesmo chunk)."""
+    out = dict(old)
+    for k, v in (new or {}).items():
+        if k not in out or out[k] == v:
+            out[k] = v
             continue
-        d = self.docs[int(idx)]
-        score = float(distances[0][rank])  # ∈ [-1, 1]
-        out.append({"id": d["id"], "text": d["text"], "meta": d.get("meta", {}), "score": score})
+        cur = out[k] if isinstance(out[k], list) else [out[k]]
+        out[k] = cur + [x for x in (v if isinstance(v, list) else [v]) if x not in cur]
     return out
-           
+
+
+def strip_metas(meta: Dict[str, Any], where: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Inverso do merge_metas: tira do meta os valores de `where`. None = não sobra outra origem (o doc sai)."""
+    out = dict(meta)
+    for k, v in where.items():
+        gone = v if isinstance(v, (list, tuple)) else [v]
+        cur = out.get(k)
+        rest = [x for x in cur if x not in gone] if isinstance(cur, list) else []
+        if not rest:
+            return None
+        out[k] = rest[0] if len(rest) == 1 else rest
+    return out
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _make_index():
+    if settings.INDEX_SHARDS > 1:
+        from app.services.sharding import ShardedVectorIndex  # import tardio (sharding importa VectorIndex)
+        return ShardedVectorIndex(settings.INDEX_SHARDS)
+    return VectorIndex()
+
 
 # singleton exportado
-vector_index = VectorIndex()
+vector_index = _make_index()
@@ -0,0 +1,122 @@
+# app/services/jobs.py
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+
+
+class QueueFull(Exception):
+    """Fila de jobs cheia (o chamador devolve 429)."""
+
+
+class Job:
+    """Estado de um job de ingestão (o que o /ingest/jobs/{id} mostra)."""
+
+    def __init__(self, kind: str, info: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.info = info or {}
+        self.status = "queued"   # queued | running | done | failed
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+
+    def update(self, progress: Dict[str, Any]) -> None:
+        self.progress = progress
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            **self.info,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "queued_s": round((self.started_at or end) - self.created_at, 3),
+            "running_s": round(end - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class JobManager:
+    """
+    Executor dedicado p/ ingestão: no máx. `max_workers` jobs rodando ao mesmo tempo
+    (o resto espera na fila), assim ingestões grandes não tomam os threads das consultas.
+    - submit(fn) → Job na hora; fn(job) roda em background e pode chamar job.update(progress)
+    - mais de `max_pending` jobs na fila/rodando → QueueFull
+    - guarda os últimos `keep` jobs terminados p/ consulta
+    """
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 16, keep: int = 100):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self.keep = max(1, keep)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _active(self) -> int:
+        return sum(1 for j in self._jobs.values() if j.status in ("queued", "running"))
+
+    def submit(self, kind: str, fn: Callable[[Job], Dict[str, Any]], info: Optional[Dict[str, Any]] = None) -> Job:
+        job = Job(kind, info)
+        with self._lock:
+            if self._active() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs de ingestão pendentes; tente mais tarde.")
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Dict[str, Any]]) -> Dict[str, Any]:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job)
+            job.status = "done"
+            return job.result
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+            print(f"[jobs] {job.kind} {job.id} falhou: {e}")
+            raise
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j.status in ("done", "failed")]
+        for jid in finished[: max(0, len(self._jobs) - self.keep)]:
+            del self._jobs[jid]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+        return [j.to_dict() for j in reversed(jobs)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            for j in self._jobs.values():
+                by_status[j.status] = by_status.get(j.status, 0) + 1
+        return {"workers": self.max_workers, "max_pending": self.max_pending, **by_status}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# singleton exportado
+ingest_jobs = JobManager(settings.INGEST_WORKERS, settings.INGEST_MAX_PENDING, settings.INGEST_JOBS_KEEP)
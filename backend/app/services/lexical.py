@@ -0,0 +1,301 @@
+# app/services/lexical.py
+from __future__ import annotations
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import math
+import os
+
+import numpy as np
+
+from app.utils.text import tokenize
+
+LEXICAL_FILE = "lexical.npz"
+MAX_SEGMENTS = 32   # segmentos de append sobre o lexical.npz antes de regravá-lo inteiro
+
+
+def segment_file(lsn: int) -> str:
+    """Segmento de append gravado no checkpoint `lsn` (postings que entraram desde o anterior)."""
+    return f"lexical-{lsn:016d}.seg.npz"
+
+
+class LexicalIndex:
+    """
+    Índice invertido BM25: termo → (ids, tf, tamanho do doc) dos chunks.
+    - add(): tokeniza cada chunk uma única vez (na ingestão); nada é re-tokenizado na busca
+    - search(): custo ∝ tamanho das posting lists dos termos da pergunta, não do texto dos hits
+      (o tamanho do doc vai junto na posting: a busca não toca em nenhum array por doc)
+    - base (CSR em numpy, vindo do disco) + cauda (array('q') por termo, o que entrou depois)
+    - persistência: lexical.npz (CSR inteiro) + segmentos de append com o que entrou em cada checkpoint
+    Ids removidos ficam aqui até a compactação; quem consulta passa os tombstones em `exclude`.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self._terms: List[str] = []   # termo de cada tid (só cresce: o save fatia sem copiar o vocab)
+        # base (imutável): postings do termo t em [offsets[t], offsets[t+1])
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._base_ids = np.zeros(0, dtype=np.int64)
+        self._base_tf = np.zeros(0, dtype=np.int32)
+        self._base_dl = np.zeros(0, dtype=np.int32)
+        # cauda (adds depois do load): termo → ids / tf / tamanho do doc
+        self._tail_ids: Dict[int, array] = {}
+        self._tail_tf: Dict[int, array] = {}
+        self._tail_dl: Dict[int, array] = {}
+        # estatísticas por doc (nº de docs e tamanho médio do BM25; usadas na compactação)
+        self._doc_ids = array("q")
+        self._doc_len = array("i")
+        self._total_len = 0
+        # o que já está em disco (lexical.npz + segmentos): o próximo segmento leva só o resto
+        self._saved_docs = 0
+        self._saved_terms = 0
+        self._saved_tail: Dict[int, int] = {}
+        self._touched: set = set()   # termos com postings ainda não gravadas
+
+    def __len__(self) -> int:
+        return len(self._doc_ids)
+
+    # ---------- escrita ----------
+    def add(self, ids: Iterable[int], texts: Iterable[str]) -> None:
+        for did, text in zip(ids, texts):
+            counts = Counter(tokenize(text))
+            n = sum(counts.values())
+            for term, tf in counts.items():
+                tid = self.vocab.get(term)
+                if tid is None:
+                    tid = self.vocab[term] = len(self._terms)
+                    self._terms.append(term)
+                self._tail_ids.setdefault(tid, array("q")).append(int(did))
+                self._tail_tf.setdefault(tid, array("i")).append(tf)
+                self._tail_dl.setdefault(tid, array("i")).append(n)
+                self._touched.add(tid)
+            self._doc_ids.append(int(did))
+            self._doc_len.append(n)
+            self._total_len += n
+
+    @classmethod
+    def build(cls, ids: Iterable[int], texts: Iterable[str]) -> "LexicalIndex":
+        out = cls()
+        out.add(ids, texts)
+        return out
+
+    # ---------- leitura ----------
+    def _posting(self, tid: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(ids, tf, dl) do termo: base + cauda."""
+        parts = []
+        if tid + 1 < len(self._offsets):
+            a, b = self._offsets[tid], self._offsets[tid + 1]
+            parts.append((self._base_ids[a:b], self._base_tf[a:b], self._base_dl[a:b]))
+        tail = self._tail_ids.get(tid)
+        if tail is not None:
+            # tobytes() copia sem exportar o buffer: um add() concorrente pode crescer o array();
+            # corta no menor dos 3 (o add pode estar entre um append e outro)
+            cols = (
+                np.frombuffer(tail.tobytes(), dtype=np.int64),
+                np.frombuffer(self._tail_tf[tid].tobytes(), dtype=np.int32),
+                np.frombuffer(self._tail_dl[tid].tobytes(), dtype=np.int32),
+            )
+            n = min(len(c) for c in cols)
+            parts.append(tuple(c[:n] for c in cols))
+        if not parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        if len(parts) == 1:
+            return parts[0]
+        return tuple(np.concatenate(cols) for cols in zip(*parts))
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        exclude: Optional[np.ndarray] = None,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (ids, scores BM25) da consulta; exclude = tombstones, allowed = ids do filtro (ordenados)."""
+        n_docs = len(self._doc_ids)
+        terms = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if not n_docs or not terms or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        avgdl = self._total_len / n_docs or 1.0
+        all_ids, all_scores = [], []
+        for tid in terms:
+            ids, tf, dl = self._posting(tid)
+            if not len(ids):
+                continue
+            idf = math.log(1.0 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            tf = tf.astype(np.float32)
+            all_ids.append(ids)
+            all_scores.append(idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avgdl)))
+        if not all_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        uniq, inv = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inv, weights=np.concatenate(all_scores)).astype(np.float32)
+        keep = np.ones(len(uniq), dtype=bool)
+        if exclude is not None and len(exclude):
+            keep &= ~np.isin(uniq, exclude)
+        if allowed is not None:
+            keep &= np.isin(uniq, allowed)
+        uniq, scores = uniq[keep], scores[keep]
+        if len(uniq) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            uniq, scores = uniq[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return uniq[order], scores[order]
+
+    # ---------- compactação / persistência ----------
+    def _csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Base + cauda num único CSR (ids crescentes dentro de cada termo)."""
+        n_terms = len(self._terms)
+        parts = [self._posting(t) for t in range(n_terms)]
+        counts = np.fromiter((len(p[0]) for p in parts), dtype=np.int64, count=n_terms)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        if not parts:
+            return offsets, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return (offsets, *(np.concatenate(cols) for cols in zip(*parts)))
+
+    def without(self, drop: np.ndarray) -> "LexicalIndex":
+        """Cópia sem os ids removidos (compactação): filtra as postings, sem re-tokenizar."""
+        offsets, ids, tf, dl = self._csr()
+        keep = ~np.isin(ids, drop)
+        term_of = np.repeat(np.arange(len(self.vocab)), np.diff(offsets))
+        counts = np.bincount(term_of[keep], minlength=len(self.vocab))
+        out = LexicalIndex(self.k1, self.b)
+        out.vocab, out._terms = dict(self.vocab), list(self._terms)
+        out._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        out._base_ids, out._base_tf, out._base_dl = ids[keep], tf[keep], dl[keep]
+        doc_ids = np.frombuffer(self._doc_ids, dtype=np.int64)
+        doc_keep = ~np.isin(doc_ids, drop)
+        out._doc_ids = array("q", doc_ids[doc_keep].tobytes())
+        out._doc_len = array("i", np.frombuffer(self._doc_len, dtype=np.int32)[doc_keep].tobytes())
+        out._total_len = int(np.frombuffer(out._doc_len, dtype=np.int32).sum())
+        return out
+
+    def snapshot(self) -> "LexicalIndex":
+        """
+        Cópia p/ gravar fora do lock dos escritores: divide a base (imutável) e copia a cauda,
+        as colunas por doc e o vocab (cópias de buffer; nada é re-tokenizado nem reordenado aqui).
+        """
+        out = LexicalIndex(self.k1, self.b)
+        out.vocab, out._terms = dict(self.vocab), list(self._terms)
+        out._offsets, out._base_ids, out._base_tf, out._base_dl = (
+            self._offsets, self._base_ids, self._base_tf, self._base_dl
+        )
+        out._tail_ids = {t: a[:] for t, a in self._tail_ids.items()}
+        out._tail_tf = {t: a[:] for t, a in self._tail_tf.items()}
+        out._tail_dl = {t: a[:] for t, a in self._tail_dl.items()}
+        out._doc_ids, out._doc_len, out._total_len = self._doc_ids[:], self._doc_len[:], self._total_len
+        return out
+
+    def mark_saved(self) -> None:
+        """Tudo o que está aqui já foi gravado (lexical.npz novo): o próximo segmento parte daqui."""
+        self._saved_docs, self._saved_terms = len(self._doc_ids), len(self._terms)
+        self._saved_tail = {t: len(a) for t, a in self._tail_ids.items()}
+        self._touched = set()
+
+    def segment(self) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Postings que entraram desde a última gravação (None se nada), já marcadas como gravadas.
+        Custo ∝ ao que entrou, não ao índice: é o que roda sob o lock no checkpoint.
+        """
+        if len(self._doc_ids) == self._saved_docs:
+            return None
+        tids = sorted(self._touched)
+        counts = np.zeros(len(tids), dtype=np.int64)
+        ids, tf, dl = array("q"), array("i"), array("i")
+        for j, t in enumerate(tids):
+            a = self._saved_tail.get(t, 0)
+            ids += self._tail_ids[t][a:]
+            tf += self._tail_tf[t][a:]
+            dl += self._tail_dl[t][a:]
+            counts[j] = len(self._tail_ids[t]) - a
+            self._saved_tail[t] = len(self._tail_ids[t])
+        seg = {
+            "meta": np.frombuffer(json.dumps({
+                "start": self._saved_docs, "terms_start": self._saved_terms,
+            }).encode("utf-8"), dtype=np.uint8),
+            "terms": np.frombuffer("\n".join(self._terms[self._saved_terms:]).encode("utf-8"), dtype=np.uint8),
+            "tids": np.asarray(tids, dtype=np.int64), "counts": counts,
+            "ids": np.frombuffer(ids, dtype=np.int64), "tf": np.frombuffer(tf, dtype=np.int32),
+            "dl": np.frombuffer(dl, dtype=np.int32),
+            "doc_ids": np.frombuffer(self._doc_ids[self._saved_docs:], dtype=np.int64),
+            "doc_len": np.frombuffer(self._doc_len[self._saved_docs:], dtype=np.int32),
+        }
+        self._saved_docs, self._saved_terms = len(self._doc_ids), len(self._terms)
+        self._touched = set()
+        return seg
+
+    @staticmethod
+    def save_segment(path: str, lsn: int, seg: Dict[str, np.ndarray]) -> None:
+        """Grava um segmento de segment() (atômico)."""
+        name = segment_file(lsn)
+        tmp = os.path.join(path, name + ".tmp.npz")
+        np.savez(tmp, **seg)
+        os.replace(tmp, os.path.join(path, name))
+
+    def _extend(self, z) -> None:
+        """Aplica um segmento lido do disco (vai para a cauda, como um add sem tokenizar)."""
+        raw = z["terms"].tobytes().decode("utf-8")
+        for term in raw.split("\n") if raw else ():
+            self.vocab[term] = len(self._terms)
+            self._terms.append(term)
+        bounds = np.concatenate([[0], np.cumsum(z["counts"])])
+        ids, tf, dl = z["ids"], z["tf"], z["dl"]
+        for j, t in enumerate(z["tids"].tolist()):
+            a, b = bounds[j], bounds[j + 1]
+            self._tail_ids.setdefault(t, array("q")).frombytes(ids[a:b].tobytes())
+            self._tail_tf.setdefault(t, array("i")).frombytes(tf[a:b].tobytes())
+            self._tail_dl.setdefault(t, array("i")).frombytes(dl[a:b].tobytes())
+        self._doc_ids.frombytes(z["doc_ids"].tobytes())
+        self._doc_len.frombytes(z["doc_len"].tobytes())
+
+    def save(self, path: str, lsn: int) -> None:
+        """Grava o CSR inteiro (atômico); lsn amarra o arquivo ao snapshot correspondente."""
+        offsets, ids, tf, dl = self._csr()
+        tmp = os.path.join(path, LEXICAL_FILE + ".tmp.npz")
+        np.savez(
+            tmp,
+            meta=np.frombuffer(json.dumps({"lsn": lsn, "k1": self.k1, "b": self.b}).encode("utf-8"), dtype=np.uint8),
+            terms=np.frombuffer("\n".join(self._terms).encode("utf-8"), dtype=np.uint8),
+            offsets=offsets, ids=ids, tf=tf, dl=dl,
+            doc_ids=np.frombuffer(self._doc_ids, dtype=np.int64),
+            doc_len=np.frombuffer(self._doc_len, dtype=np.int32),
+        )
+        os.replace(tmp, os.path.join(path, LEXICAL_FILE))
+        self.mark_saved()
+
+    @classmethod
+    def load(cls, path: str, lsn: int, n_docs: int, segments: Sequence[int] = ()) -> Optional["LexicalIndex"]:
+        """
+        Índice salvo junto com o snapshot: lexical.npz do checkpoint `lsn` + os segmentos listados,
+        em ordem (None se faltar algo ou não bater com o snapshot → remontar do doc store).
+        """
+        p = os.path.join(path, LEXICAL_FILE)
+        if not os.path.exists(p):
+            return None
+        with np.load(p) as z:
+            meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+            if int(meta["lsn"]) != lsn:
+                return None
+            out = cls(meta["k1"], meta["b"])
+            raw = z["terms"].tobytes().decode("utf-8")
+            out._terms = raw.split("\n") if raw else []
+            out.vocab = {t: i for i, t in enumerate(out._terms)}
+            out._offsets, out._base_ids, out._base_tf, out._base_dl = z["offsets"], z["ids"], z["tf"], z["dl"]
+            out._doc_ids = array("q", z["doc_ids"].tobytes())
+            out._doc_len = array("i", z["doc_len"].tobytes())
+        for seg_lsn in segments:
+            seg_p = os.path.join(path, segment_file(int(seg_lsn)))
+            if not os.path.exists(seg_p):
+                return None
+            with np.load(seg_p) as z:
+                meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+                if meta["start"] != len(out._doc_ids) or meta["terms_start"] != len(out._terms):
+                    return None
+                out._extend(z)
+        if len(out._doc_ids) != n_docs:
+            return None
+        out._total_len = int(np.frombuffer(out._doc_len, dtype=np.int32).sum())
+        out.mark_saved()
+        return out
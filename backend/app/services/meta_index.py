@@ -0,0 +1,82 @@
+# app/services/meta_index.py
+from __future__ import annotations
+from array import array
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def _key(value: Any) -> Optional[Hashable]:
+    """Normaliza o valor de meta para a chave da posting list (só escalares são indexados)."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return None
+
+
+class MetaIndex:
+    """
+    Índice invertido (chave, valor) de metadado → ids dos chunks.
+    - cada posting list é um array('q') crescente (ids novos são sempre maiores)
+    - add(): O(chunks × campos), chamado junto com o add no FAISS
+    - ids(filters): interseção entre chaves, união dentro de uma lista de valores
+    Ids removidos continuam aqui até a compactação; quem consulta desconta os tombstones.
+    """
+
+    def __init__(self):
+        self._postings: Dict[Tuple[str, Hashable], array] = {}
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, ids: Iterable[int], metas: Iterable[Dict[str, Any]]) -> None:
+        for did, meta in zip(ids, metas):
+            for k, v in (meta or {}).items():
+                values = v if isinstance(v, (list, tuple)) else [v]  # meta com lista: indexa cada item
+                for item in values:
+                    hk = _key(item)
+                    if hk is None and item is not None:
+                        continue
+                    self._postings.setdefault((k, hk), array("q")).append(int(did))
+
+    @classmethod
+    def build(cls, ids: np.ndarray, meta_ids: np.ndarray, metas_table: List[Dict[str, Any]]) -> "MetaIndex":
+        """Reconstrói a partir das colunas do doc store (agrupa as linhas por meta internado)."""
+        out = cls()
+        if len(ids) == 0:
+            return out
+        order = np.argsort(meta_ids, kind="stable")  # estável → ids continuam crescentes em cada grupo
+        sorted_mids = meta_ids[order]
+        bounds = np.flatnonzero(np.diff(sorted_mids)) + 1
+        for group in np.split(order, bounds):
+            meta = metas_table[int(meta_ids[group[0]])]
+            group_ids = ids[group]
+            for k, v in meta.items():
+                for item in (v if isinstance(v, (list, tuple)) else [v]):
+                    hk = _key(item)
+                    if hk is None and item is not None:
+                        continue
+                    out._postings.setdefault((k, hk), array("q")).extend(group_ids.tolist())
+        # grupos diferentes intercalam ids: ordena cada posting uma vez
+        for k, post in out._postings.items():
+            out._postings[k] = array("q", np.sort(np.frombuffer(post, dtype=np.int64)).tobytes())
+        return out
+
+    def _posting(self, key: str, value: Any) -> np.ndarray:
+        post = self._postings.get((key, _key(value)))
+        # cópia: uma view viva impediria o array('q') de crescer no próximo add()
+        return np.frombuffer(post, dtype=np.int64).copy() if post else np.zeros(0, dtype=np.int64)
+
+    def ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Ids (ordenados) que casam com todos os pares do filtro; valor lista = qualquer um."""
+        result: Optional[np.ndarray] = None
+        # começa pela chave mais seletiva para encolher as interseções
+        parts = []
+        for k, v in filters.items():
+            values = v if isinstance(v, (list, tuple, set)) else [v]
+            posts = [self._posting(k, item) for item in values]
+            parts.append(posts[0] if len(posts) == 1 else np.unique(np.concatenate(posts)))
+        for ids in sorted(parts, key=len):
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result if result is not None else np.zeros(0, dtype=np.int64)
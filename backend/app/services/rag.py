@@ -1,9 +1,18 @@
-from typing import List, Dict, Any, Optional
-import re, difflib, unicodedata
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+import re, difflib, time
+
+import numpy as np
 
 from app.services.embeddings import embeddings_service
 from app.services.index import vector_index
-from app.core.llm import call_hf_inference
+from app.core.llm import STOP_SEQUENCES, call_hf_inference, stream_hf_inference
+from app.core.config import settings
+from app.services.answer_cache import answer_cache, answer_scope
+from app.services.retrieval_cache import retrieval_cache, retrieval_key
+from app.utils.text import strip_accents, tokenize as _tokenize
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[\.\!\?])\s+")
+_MAX_ANSWER_CHARS = 300  # _cleanup_answer corta a 1ª frase aqui
 
 # Limiar mínimo de similaridade (cosine) para aceitar um contexto
 MIN_SIM = 0.18
@@ -11,33 +20,6 @@ MIN_SIM = 0.18
 # ---------------------------
 # utils
 # ---------------------------
-_STOPWORDS_PT = {
-    "a","o","as","os","um","uma","uns","umas","de","do","da","dos","das","em","no","na","nos","nas",
-    "para","por","e","ou","que","com","se","ao","aos","à","às","é","são","como","sobre","até","mais",
-    "menos","sem","sua","seu","suas","seus","minha","meu","nossa","nosso","nossas","nossos","isto",
-    "isso","aquilo","este","esta","esse","essa","aquele","aquela","ele","ela","eles","elas","você",
-    "vocês","eu","me","te","se","lhe","nos","vos","del","das","dos"
-}
-
-def _normalize(s: str) -> str:
-    s = unicodedata.normalize("NFKD", s or "")
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    return s.lower().strip()
-
-def _tokenize(text: str) -> List[str]:
-    t = _normalize(text)
-    toks = re.findall(r"[a-z0-9]+", t)
-    toks = [w for w in toks if len(w) >= 3 and w not in _STOPWORDS_PT]
-    # sinônimos simples
-    if "h2o" in toks and "agua" not in toks:
-        toks.append("agua")
-    return toks
-
-def _keyword_overlap_count(question_tokens: List[str], text: str) -> int:
-    doc_tokens = set(_tokenize(text))
-    qset = set(question_tokens)
-    return len(doc_tokens & qset)
-
 def _filter_by_threshold(hits: List[Dict[str, Any]], min_sim: float = MIN_SIM) -> List[Dict[str, Any]]:
     """Aceita itens com 'orig_score' ou 'score' >= limiar."""
     if not hits:
@@ -47,19 +29,23 @@ def _filter_by_threshold(hits: List[Dict[str, Any]], min_sim: float = MIN_SIM) -
         return hits
     return [h for h in hits if float(h.get(key, 0.0)) >= min_sim]
 
-def _cleanup_answer(txt: str) -> str:
-    """Remove ecos do prompt/contexto, bullets e mantém só a 1ª frase razoável."""
-    if not isinstance(txt, str):
-        return ""
+def _strip_echo(txt: str) -> str:
+    """Remove ecos do prompt/contexto e bullets/aspas do início; normaliza espaços."""
     txt = re.sub(r"\[?Doc\s*\d+\]?:?.*\n?", "", txt)
     txt = re.sub(r"(HISTÓRICO:|CONTEXTO:|PERGUNTA|RESPOSTA:|###|\`\`\`)", "", txt, flags=re.I)
     txt = re.sub(r"^\s*[-•*>\u2022]+\s*", "", txt)       # bullets no início
     txt = re.sub(r"^\s*[\(\[\{\“\"'`]+", "", txt)        # abre parêntese/aspas no início
-    txt = re.sub(r"\s+", " ", txt).strip()
-    parts = re.split(r"(?<=[\.\!\?])\s+", txt)
+    return re.sub(r"\s+", " ", txt).strip()
+
+def _cleanup_answer(txt: str) -> str:
+    """Remove ecos do prompt/contexto, bullets e mantém só a 1ª frase razoável."""
+    if not isinstance(txt, str):
+        return ""
+    txt = _strip_echo(txt)
+    parts = _SENTENCE_SPLIT.split(txt)
     first = (parts[0] if parts and parts[0] else txt).strip()
-    if len(first) > 300:
-        first = first[:300].rstrip() + "…"
+    if len(first) > _MAX_ANSWER_CHARS:
+        first = first[:_MAX_ANSWER_CHARS].rstrip() + "…"
     first = re.sub(r"^[-•*>\u2022]+\s*", "", first).lstrip("([{\"'` ").strip()
     return first
 
@@ -77,11 +63,20 @@ def _looks_bad(txt: str) -> bool:
 
 def _too_similar_to_question(answer: str, question: str) -> bool:
     """Detecta eco da pergunta na resposta."""
-    a = _normalize(answer)
-    q = _normalize(question)
+    a = strip_accents(answer)
+    q = strip_accents(question)
     ratio = difflib.SequenceMatcher(None, a, q).ratio()
     return a.startswith(q[:20]) or ratio >= 0.80
 
+def _finalize_answer(clean: str, question: str, ctx: List[Dict[str, Any]]) -> str:
+    """Anti-eco / qualidade ruim → sintetiza a partir do contexto; senão garante as (Fontes: ...)."""
+    if _looks_bad(clean) or _too_similar_to_question(clean, question):
+        return _synthesize_from_context_general(ctx)
+    if "(Fontes:" not in clean:
+        fontes = ", ".join([f"Doc {c['id']}" for c in ctx])
+        clean = f"{clean} (Fontes: {fontes})"
+    return clean
+
 def _synthesize_from_context_general(contexts: List[Dict[str, Any]]) -> str:
     """
     Fallback determinístico: pega a 1ª frase do 1º doc (ou um recorte curto)
@@ -99,10 +94,16 @@ def _synthesize_from_context_general(contexts: List[Dict[str, Any]]) -> str:
     fontes = ", ".join([f"Doc {c['id']}" for c in contexts])
     return f"{sent} (Fontes: {fontes})"
 
+def _keyword_overlap_count(question_tokens: List[str], text: str) -> int:
+    doc_tokens = set(_tokenize(text))
+    qset = set(question_tokens)
+    return len(doc_tokens & qset)
+
 def _hybrid_rerank(hits: List[Dict[str, Any]], question: str) -> List[Dict[str, Any]]:
     """
     Re-ranqueia combinando score do embedding + sobreposição de palavras da pergunta.
     Dá bônus de até +0.35 para docs que contêm termos da pergunta.
+    (sinal de palavras quando HYBRID_SEARCH=0; com a busca híbrida, o BM25 + _fuse fazem esse papel)
     """
     q_tokens = _tokenize(question)
     if not hits:
@@ -128,21 +129,191 @@ def _hybrid_rerank(hits: List[Dict[str, Any]], question: str) -> List[Dict[str,
 
     return updated
 
-def _retrieve_contexts(question: str, k: int) -> List[Dict[str, Any]]:
-    q_vec = embeddings_service.encode([question])
-    if hasattr(vector_index, "search_with_scores"):
-        hits = vector_index.search_with_scores(q_vec, k=k)
-    else:
-        hits = vector_index.search(q_vec, k=k)
-        # garante campo score mesmo sem faiss score exposto
-        hits = [{**h, "score": 1.0} for h in hits]
+def _fuse(dense: List[Dict[str, Any]], lexical: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """
+    Reciprocal Rank Fusion: score = Σ 1 / (RRF_K + posição) nas duas listas (densa e BM25).
+    - orig_score = cosine (denso ou calculado p/ os hits só lexicais) → limiar MIN_SIM p/ todos
+    - se algum hit aceito contém termos da pergunta (veio do BM25), os que não contêm são descartados
+    """
+    fused: Dict[int, Dict[str, Any]] = {}
+    for rank, h in enumerate(dense):
+        fused[h["id"]] = {**h, "orig_score": float(h["score"]), "score": 1.0 / (settings.RRF_K + rank + 1)}
+    for rank, h in enumerate(lexical):
+        cur = fused.get(h["id"])
+        if cur is None:
+            cur = fused[h["id"]] = {
+                **{key: v for key, v in h.items() if key != "cosine"},
+                "orig_score": float(h.get("cosine", 0.0)), "score": 0.0,
+            }
+        cur["score"] += 1.0 / (settings.RRF_K + rank + 1)
+        cur["bm25"] = float(h["score"])
 
-    hits = _hybrid_rerank(hits, question)
-    return _filter_by_threshold(hits, MIN_SIM)
+    updated = sorted(fused.values(), key=lambda x: (x["score"], x["orig_score"]), reverse=True)
+    updated = _filter_by_threshold(updated, MIN_SIM)
+    if any("bm25" in h for h in updated):
+        updated = [h for h in updated if "bm25" in h]
+    return updated[:k]
+
+def _mmr(hits: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """
+    Maximal Marginal Relevance sobre o pool de candidatos (vetores exatos do índice):
+    escolhe, a cada passo, argmax λ·cos(pergunta, d) − (1−λ)·max cos(d, já escolhidos).
+    - similaridades par a par numa única matmul (n × n); o laço guloso só atualiza um vetor de máximos
+    - candidatos com cos ≥ MMR_DUP_SIM de um já escolhido são descartados (pode sobrar < k contextos)
+    """
+    if len(hits) <= 1:
+        return hits[:k]
+    vecs = vector_index.vectors_of([h["id"] for h in hits])
+    if vecs is None:
+        return hits[:k]
+    lam = settings.MMR_LAMBDA
+    rel = np.array([h.get("orig_score", h["score"]) for h in hits], dtype=np.float32)
+    sim = vecs @ vecs.T
+    redundancy = np.zeros(len(hits), dtype=np.float32)
+    available = np.ones(len(hits), dtype=bool)
+    picked: List[int] = []
+    while len(picked) < k and available.any():
+        gain = np.where(available, lam * rel - (1.0 - lam) * redundancy, -np.inf)
+        j = int(np.argmax(gain))
+        picked.append(j)
+        available &= sim[j] < settings.MMR_DUP_SIM
+        available[j] = False
+        np.maximum(redundancy, sim[j], out=redundancy)
+    return [hits[j] for j in picked]
+
+def _retrieve_contexts(
+    question: str,
+    k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    query_vector=None,
+) -> List[Dict[str, Any]]:
+    q_vecs = None if query_vector is None else np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+    return _retrieve_contexts_many(
+        [question], k, nprobe=nprobe, ef_search=ef_search, filters=filters, query_vectors=q_vecs
+    )[0]
+
+def _retrieval_params(
+    nprobe: Optional[int], ef_search: Optional[int], filters: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Tudo que muda os contextos recuperados: entra na chave do retrieval_cache e no escopo do answer_cache."""
+    return {
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        "filters": filters,
+        "hybrid": [settings.HYBRID_CANDIDATES, settings.RRF_K] if settings.HYBRID_SEARCH else None,
+        "mmr": [settings.MMR_LAMBDA, settings.MMR_CANDIDATES, settings.MMR_DUP_SIM] if settings.MMR_ENABLED else None,
+    }
+
+def _retrieve_contexts_many(
+    questions: List[str],
+    k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    query_vectors=None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Versão em lote: 1 encode + 1 busca FAISS para todas as perguntas.
+    Com HYBRID_SEARCH, denso e BM25 buscam candidatos de forma independente e são fundidos (RRF).
+    Com MMR_ENABLED, os k finais saem de um pool de MMR_CANDIDATES por diversidade (_mmr).
+    Hits de perguntas repetidas (texto normalizado) vêm do retrieval_cache enquanto o índice não muda.
+    """
+    if not questions:
+        return []
+    if not retrieval_cache.enabled:
+        return _search_contexts(questions, k, nprobe, ef_search, filters, query_vectors)
+    generation = vector_index.generation  # lida antes da busca (ver RetrievalCache.put)
+    params = _retrieval_params(nprobe, ef_search, filters)
+    keys = [retrieval_key(q, k, **params) for q in questions]
+    out = retrieval_cache.get_many(keys, generation)
+    miss = [i for i, hits in enumerate(out) if hits is None]
+    if miss:
+        vecs = None if query_vectors is None else np.asarray(query_vectors, dtype=np.float32)[miss]
+        fresh = _search_contexts([questions[i] for i in miss], k, nprobe, ef_search, filters, vecs)
+        for i, hits in zip(miss, fresh):
+            retrieval_cache.put(keys[i], generation, hits)
+            out[i] = hits
+    return out
+
+def _search_contexts(
+    questions: List[str],
+    k: int,
+    nprobe: Optional[int],
+    ef_search: Optional[int],
+    filters: Optional[Dict[str, Any]],
+    query_vectors=None,
+) -> List[List[Dict[str, Any]]]:
+    q_vecs = embeddings_service.encode(questions) if query_vectors is None else query_vectors
+    n_pool = max(k, settings.MMR_CANDIDATES) if settings.MMR_ENABLED else k
+    n_cand = max(n_pool, settings.HYBRID_CANDIDATES) if settings.HYBRID_SEARCH else n_pool
+    # só volta o que passa do limiar (cosine real, sem score fixo)
+    dense = vector_index.search_many(
+        q_vecs, k=n_cand, min_sim=MIN_SIM, nprobe=nprobe, ef_search=ef_search, filters=filters
+    )
+    if settings.HYBRID_SEARCH:
+        lexical = vector_index.search_lexical_many(questions, k=n_cand, filters=filters, query_vectors=q_vecs)
+        pools = [_fuse(d, lx, n_pool) for d, lx in zip(dense, lexical)]
+    else:
+        # sem BM25: bônus por palavras da pergunta sobre os hits densos (comportamento anterior à busca híbrida)
+        pools = [_filter_by_threshold(_hybrid_rerank(hits[:n_pool], q), MIN_SIM) for hits, q in zip(dense, questions)]
+    if settings.MMR_ENABLED:
+        return [_mmr(pool, k) for pool in pools]
+    return pools
 
 # ---------------------------
 # RAG "clássico"
 # ---------------------------
+def _cache_lookup(question: str, scope: int) -> Tuple[Optional[Dict[str, Any]], Any, int]:
+    """
+    (resposta em cache ou None, vetor da pergunta, geração do índice).
+    A geração é lida ANTES da busca: se o índice mudar no meio, o put da resposta é ignorado.
+    """
+    if not answer_cache.enabled:
+        return None, None, 0
+    generation = vector_index.generation
+    q_vec = embeddings_service.encode([question])[0]
+    hit = answer_cache.get(q_vec, scope, generation)
+    if hit is None:
+        return None, q_vec, generation
+    out, sim = hit
+    out["debug"] = {**out.get("debug", {}), "cache": {"hit": True, "similarity": round(sim, 4)}}
+    return out, q_vec, generation
+
+def _cache_store(q_vec, scope: int, generation: int, out: Dict[str, Any]) -> None:
+    if q_vec is not None:
+        answer_cache.put(q_vec, scope, generation, {k: v for k, v in out.items() if k != "stream"})
+
+def _query_scope(
+    k: int,
+    temperature: float,
+    max_new_tokens: int,
+    nprobe: Optional[int],
+    ef_search: Optional[int],
+    filters: Optional[Dict[str, Any]],
+) -> int:
+    return answer_scope(
+        "query", k=k, temperature=temperature, max_new_tokens=max_new_tokens,
+        **_retrieval_params(nprobe, ef_search, filters),
+    )
+
+def _chat_scope(
+    history: List[Dict[str, str]],
+    top_k: int,
+    temperature: float,
+    max_new_tokens: int,
+    system_prompt: Optional[str],
+    nprobe: Optional[int],
+    ef_search: Optional[int],
+    filters: Optional[Dict[str, Any]],
+) -> int:
+    # o prompt do chat usa as 4 últimas mensagens: a resposta só vale para o mesmo histórico recente
+    return answer_scope(
+        "chat", k=top_k, temperature=temperature, max_new_tokens=max_new_tokens,
+        system_prompt=system_prompt or "", history=history[-4:], **_retrieval_params(nprobe, ef_search, filters),
+    )
+
 def make_prompt(question: str, contexts: List[Dict[str, Any]]) -> str:
     context_block = "\n\n".join([f"[Doc {c['id']}] {c['text']}" for c in contexts]) if contexts else "(sem contexto)"
     # lista de palavras da pergunta para orientar o modelo
@@ -158,16 +329,39 @@ def make_prompt(question: str, contexts: List[Dict[str, Any]]) -> str:
     user = f"CONTEXTO:\n{context_block}\n\nPERGUNTA: {question}\nRESPOSTA:"
     return f"{sys}\n{user}"
 
-def top_k_contexts(question: str, k: int = 3) -> List[Dict[str, Any]]:
-    return _retrieve_contexts(question, k)
+def top_k_contexts(
+    question: str,
+    k: int = 3,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    return _retrieve_contexts(question, k, nprobe=nprobe, ef_search=ef_search, filters=filters)
 
 def answer_with_rag(
     question: str,
     k: int = 3,
     temperature: float = 0.7,
-    max_new_tokens: int = 256
+    max_new_tokens: int = 256,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
 ):
-    ctx = top_k_contexts(question, k=k)
+    scope = _query_scope(k, temperature, max_new_tokens, nprobe, ef_search, filters)
+    cached, q_vec, generation = _cache_lookup(question, scope)
+    if cached is not None:  # ✅ pergunta igual/parecida já respondida com este índice → sem busca nem LLM
+        return cached
+    ctx = _retrieve_contexts(question, k, nprobe=nprobe, ef_search=ef_search, filters=filters, query_vector=q_vec)
+    out = _answer_from_contexts(question, ctx, temperature, max_new_tokens)
+    _cache_store(q_vec, scope, generation, out)
+    return out
+
+def _answer_from_contexts(
+    question: str,
+    ctx: List[Dict[str, Any]],
+    temperature: float,
+    max_new_tokens: int,
+) -> Dict[str, Any]:
     if not ctx:  # ⚠️ sem contexto relevante → não chama LLM
         return {
             "answer": "Não sei com base nos documentos disponíveis.",
@@ -180,13 +374,7 @@ def answer_with_rag(
     llm_answer = call_hf_inference(prompt, temperature=temperature, max_new_tokens=max_new_tokens)
     clean = _cleanup_answer(llm_answer)
 
-    # Anti-eco / qualidade ruim → sintetiza a partir do contexto
-    if _looks_bad(clean) or _too_similar_to_question(clean, question):
-        clean = _synthesize_from_context_general(ctx)
-    else:
-        if "(Fontes:" not in clean:
-            fontes = ", ".join([f"Doc {c['id']}" for c in ctx])
-            clean = f"{clean} (Fontes: {fontes})"
+    clean = _finalize_answer(clean, question, ctx)
 
     return {
         "answer": clean,
@@ -195,6 +383,34 @@ def answer_with_rag(
         "debug": {"prompt": prompt[:1000]},
     }
 
+def answer_many_with_rag(
+    questions: List[str],
+    k: int = 3,
+    temperature: float = 0.7,
+    max_new_tokens: int = 256,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    generate: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    RAG em lote: embeddings e busca vetorizados; só a geração é por pergunta.
+    Com generate=False devolve apenas os hits (útil p/ avaliação offline).
+    """
+    all_ctx = _retrieve_contexts_many(questions, k, nprobe=nprobe, ef_search=ef_search, filters=filters)
+    results = []
+    for question, ctx in zip(questions, all_ctx):
+        hits = [
+            {"id": c["id"], "score": float(c.get("orig_score", c.get("score", 0.0))), "meta": c.get("meta", {})}
+            for c in ctx
+        ]
+        if generate:
+            out = _answer_from_contexts(question, ctx, temperature, max_new_tokens)
+        else:
+            out = {"sources": [c["id"] for c in ctx], "meta": [c.get("meta", {}) for c in ctx]}
+        results.append({"question": question, **out, "hits": hits})
+    return results
+
 # ---------------------------
 # CHAT (histórico)
 # ---------------------------
@@ -238,9 +454,27 @@ def chat_answer(
     temperature: float = 0.7,
     max_new_tokens: int = 256,
     system_prompt: Optional[str] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
-    ctx = _retrieve_contexts(message, top_k)
+    scope = _chat_scope(history, top_k, temperature, max_new_tokens, system_prompt, nprobe, ef_search, filters)
+    cached, q_vec, generation = _cache_lookup(message, scope)
+    if cached is not None:
+        return cached
+    ctx = _retrieve_contexts(message, top_k, nprobe=nprobe, ef_search=ef_search, filters=filters, query_vector=q_vec)
+    out = _chat_from_contexts(message, ctx, history, temperature, max_new_tokens, system_prompt)
+    _cache_store(q_vec, scope, generation, out)
+    return out
 
+def _chat_from_contexts(
+    message: str,
+    ctx: List[Dict[str, Any]],
+    history: List[Dict[str, str]],
+    temperature: float,
+    max_new_tokens: int,
+    system_prompt: Optional[str],
+) -> Dict[str, Any]:
     if not ctx:
         return {
             "answer": "Não sei com base nos documentos disponíveis.",
@@ -253,13 +487,7 @@ def chat_answer(
     llm_answer = call_hf_inference(prompt, temperature=temperature, max_new_tokens=max_new_tokens)
     clean = _cleanup_answer(llm_answer)
 
-    # Anti-eco / qualidade ruim
-    if _looks_bad(clean) or _too_similar_to_question(clean, message):
-        clean = _synthesize_from_context_general(ctx)
-    else:
-        if "(Fontes:" not in clean:
-            fontes = ", ".join([f"Doc {c['id']}" for c in ctx])
-            clean = f"{clean} (Fontes: {fontes})"
+    clean = _finalize_answer(clean, message, ctx)
 
     return {
         "answer": clean,
@@ -267,3 +495,138 @@ def chat_answer(
         "meta": [c.get("meta", {}) for c in ctx],
         "debug": {"prompt": prompt[:1000]},
     }
+
+# ---------------------------
+# Streaming (SSE)
+# ---------------------------
+class _AnswerStream:
+    """
+    Limpeza incremental da saída do LLM (mesmas regras do _cleanup_answer):
+    - feed(pedaço) → texto novo, já limpo, a enviar ao cliente
+    - done = 1ª frase completa, STOP_SEQUENCES ou > _MAX_ANSWER_CHARS → o resto nem precisa ser gerado
+    Só envia texto que não muda mais: a última palavra (talvez incompleta) e um "Doc" solto esperam o próximo pedaço.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.sent = ""
+        self.done = False
+
+    def feed(self, piece: str) -> str:
+        self.raw += piece
+        cut = min((i for i in (self.raw.find(s) for s in STOP_SEQUENCES) if i >= 0), default=-1)
+        if cut >= 0:
+            self.raw = self.raw[:cut]
+            self.done = True
+        text = _strip_echo(self.raw)
+        if len(_SENTENCE_SPLIT.split(text, maxsplit=1)) > 1 or len(text) > _MAX_ANSWER_CHARS:
+            self.done = True
+        if self.done:
+            stable = _cleanup_answer(self.raw)
+        else:
+            m = re.search(r"\s\S*$", self.raw)
+            head = self.raw[:m.start()] if m else ""
+            # "Doc" ainda pode virar "Doc 3" (eco de contexto, removido até o fim da linha)
+            stable = _cleanup_answer(re.sub(r"\[?Doc\s*$", "", head))
+        if not stable.startswith(self.sent):
+            return ""  # a limpeza reescreveu o começo (ex.: "Doc 3" virou eco) → o evento final corrige
+        delta, self.sent = stable[len(self.sent):], stable
+        return delta
+
+def _stream_from_prompt(
+    question: str,
+    ctx: List[Dict[str, Any]],
+    prompt: str,
+    temperature: float,
+    max_new_tokens: int,
+    on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Eventos (nome, dados): "context" → "token"* → "done" com a resposta final (igual à do modo sem stream)."""
+    t0 = time.perf_counter()
+    sources = {"sources": [c["id"] for c in ctx], "meta": [c.get("meta", {}) for c in ctx]}
+    yield "context", sources
+    if not ctx:  # ⚠️ sem contexto relevante → não chama LLM
+        yield "done", {"answer": "Não sei com base nos documentos disponíveis.", **sources,
+                       "debug": {"prompt": "(sem contexto)"}}
+        return
+
+    stats: Dict[str, Any] = {"tokens": 0}
+    cleaner = _AnswerStream()
+    ttft = None
+    gen = stream_hf_inference(prompt, temperature=temperature, max_new_tokens=max_new_tokens, stats=stats)
+    try:
+        for piece in gen:
+            delta = cleaner.feed(piece)
+            if delta:
+                ttft = ttft if ttft is not None else time.perf_counter() - t0
+                yield "token", {"text": delta}
+            if cleaner.done:
+                break
+    finally:
+        gen.close()  # resposta completa (ou cliente saiu) → cancela a geração
+
+    clean = _cleanup_answer(cleaner.raw)
+    if clean.startswith(cleaner.sent) and len(clean) > len(cleaner.sent):
+        yield "token", {"text": clean[len(cleaner.sent):]}  # a geração acabou: a última palavra já é estável
+    answer = _finalize_answer(clean, question, ctx)
+    done = {
+        "answer": answer,
+        **sources,
+        "debug": {"prompt": prompt[:1000]},
+        "stream": {
+            "ttft_s": round(ttft, 3) if ttft is not None else None,
+            "total_s": round(time.perf_counter() - t0, 3),
+            "generated_tokens": stats["tokens"],
+            "stopped_early": cleaner.done,
+        },
+    }
+    if on_done is not None:
+        on_done(done)
+    yield "done", done
+
+def _cached_events(out: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Resposta do cache no mesmo formato de eventos (sem tokens: vai inteira no "done")."""
+    yield "context", {"sources": out.get("sources", []), "meta": out.get("meta", [])}
+    yield "done", out
+
+def stream_rag(
+    question: str,
+    k: int = 3,
+    temperature: float = 0.7,
+    max_new_tokens: int = 256,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    scope = _query_scope(k, temperature, max_new_tokens, nprobe, ef_search, filters)
+    cached, q_vec, generation = _cache_lookup(question, scope)
+    if cached is not None:
+        return _cached_events(cached)
+    ctx = _retrieve_contexts(question, k, nprobe=nprobe, ef_search=ef_search, filters=filters, query_vector=q_vec)
+    prompt = make_prompt(question, ctx) if ctx else ""
+    return _stream_from_prompt(
+        question, ctx, prompt, temperature, max_new_tokens,
+        on_done=lambda out: _cache_store(q_vec, scope, generation, out),
+    )
+
+def stream_chat(
+    message: str,
+    history: List[Dict[str, str]],
+    top_k: int = 3,
+    temperature: float = 0.7,
+    max_new_tokens: int = 256,
+    system_prompt: Optional[str] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    scope = _chat_scope(history, top_k, temperature, max_new_tokens, system_prompt, nprobe, ef_search, filters)
+    cached, q_vec, generation = _cache_lookup(message, scope)
+    if cached is not None:
+        return _cached_events(cached)
+    ctx = _retrieve_contexts(message, top_k, nprobe=nprobe, ef_search=ef_search, filters=filters, query_vector=q_vec)
+    prompt = make_chat_prompt(message, ctx, history, system_prompt=system_prompt) if ctx else ""
+    return _stream_from_prompt(
+        message, ctx, prompt, temperature, max_new_tokens,
+        on_done=lambda out: _cache_store(q_vec, scope, generation, out),
+    )
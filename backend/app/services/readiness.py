@@ -0,0 +1,114 @@
+# app/services/readiness.py
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+
+
+class Readiness:
+    """
+    Estado de carga dos componentes (índice, embeddings, LLM local...) para /health/ready.
+    - liveness: o processo responde (sempre, desde o 1º instante)
+    - readiness: todos os componentes obrigatórios carregaram com sucesso
+    - degraded: algum componente falhou; se for opcional (seed, llm_local, embed_pool) o serviço segue
+      respondendo sem ele; se for obrigatório fica em 503, com o erro no corpo
+    Cada componente roda numa thread própria; tempos e erros ficam em components.
+    """
+
+    def __init__(self):
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self._required: set = set()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.started_at = time.time()
+
+    def _set(self, name: str, **fields) -> None:
+        with self._lock:
+            self.components.setdefault(name, {}).update(fields)
+
+    def _run(self, name: str, fn: Callable[[], Any], after: Optional[str], dep: Optional[threading.Thread]) -> None:
+        if dep is not None:
+            dep.join()
+            if self.components[after]["status"] == "failed":
+                # ex.: seed sobre um índice que não abriu regravaria o snapshot com os exemplos
+                self._set(name, status="skipped", reason=f"{after} falhou")
+                self._check_done()
+                return
+        self._set(name, status="loading")
+        t0 = time.perf_counter()
+        try:
+            fn()
+            self._set(name, status="ready", seconds=round(time.perf_counter() - t0, 3))
+        except Exception as e:
+            self._set(name, status="failed", seconds=round(time.perf_counter() - t0, 3), error=str(e))
+            print(f"[startup] {name} falhou: {e}")
+        self._check_done()
+
+    def _check_done(self) -> None:
+        with self._lock:
+            if all(c["status"] in ("ready", "failed", "skipped") for c in self.components.values()):
+                self._done.set()
+
+    def start(self, tasks: List[Tuple[str, Callable[[], Any], bool, Optional[str]]]) -> None:
+        """
+        tasks: (nome, função, obrigatório?, depende_de) — roda em paralelo, respeitando a dependência
+        (se a dependência falhar, a tarefa é pulada). Componentes não obrigatórios não seguram a prontidão.
+        """
+        threads: Dict[str, threading.Thread] = {}
+        for name, _fn, required, _after in tasks:
+            self._set(name, status="pending", required=required)
+            if required:
+                self._required.add(name)
+        for name, fn, _required, after in tasks:
+            t = threading.Thread(
+                target=self._run, args=(name, fn, after, threads.get(after)), name=f"warmup-{name}", daemon=True
+            )
+            threads[name] = t
+            self._threads.append(t)
+        for t in self._threads:
+            t.start()
+        if not tasks:
+            self._done.set()
+
+    def skip(self, name: str, reason: str) -> None:
+        self._set(name, status="skipped", reason=reason, required=False)
+
+    @property
+    def ready(self) -> bool:
+        """Todos os obrigatórios prontos (um obrigatório que falhou nunca libera o tráfego)."""
+        with self._lock:
+            return all(self.components[n]["status"] == "ready" for n in self._required)
+
+    @property
+    def loading(self) -> bool:
+        """Algum obrigatório ainda pendente/carregando."""
+        with self._lock:
+            return any(self.components[n]["status"] in ("pending", "loading") for n in self._required)
+
+    @property
+    def degraded(self) -> List[str]:
+        """Componentes que falharam na carga."""
+        with self._lock:
+            return sorted(n for n, c in self.components.items() if c["status"] == "failed")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Espera a carga terminar (com sucesso ou não). Retorna self.ready."""
+        self._done.wait(timeout)
+        return self.ready
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            comps = {k: dict(v) for k, v in self.components.items()}
+        ready, degraded, loading = self.ready, self.degraded, self.loading
+        return {
+            "status": "starting" if loading else "degraded" if degraded else "ready",
+            "ready": ready,
+            "degraded": degraded,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "components": comps,
+        }
+
+
+# singleton exportado
+readiness = Readiness()
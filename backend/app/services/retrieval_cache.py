@@ -0,0 +1,89 @@
+# app/services/retrieval_cache.py
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import threading
+
+from app.core.config import settings
+from app.utils.text import normalize_text
+
+
+def retrieval_key(question: str, k: int, **params: Any) -> bytes:
+    """(pergunta normalizada, k, filtros/nprobe/ef_search) → chave de 16 bytes."""
+    raw = json.dumps([normalize_text(question), k, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+
+class RetrievalCache:
+    """
+    LRU dos hits finais da recuperação (busca densa + BM25 + fusão + MMR + limiar).
+    - amarrado à geração do índice: geração nova → tudo descartado, nunca devolve hits velhos
+    - put() com geração anterior à atual (índice mudou durante a busca) é ignorado
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(0, capacity)
+        self._lru: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _sync(self, generation: int) -> bool:
+        if self._generation is not None and generation < self._generation:
+            return False
+        if generation != self._generation:
+            if self._lru:
+                self.invalidations += 1
+            self._lru.clear()
+            self._generation = generation
+        return True
+
+    def get_many(self, keys: List[bytes], generation: int) -> List[Optional[List[Dict[str, Any]]]]:
+        """Hits de cada chave (cópias) ou None = miss."""
+        out: List[Optional[List[Dict[str, Any]]]] = []
+        with self._lock:
+            self._sync(generation)
+            for key in keys:
+                hits = self._lru.get(key)
+                if hits is None:
+                    self.misses += 1
+                    out.append(None)
+                    continue
+                self.hits += 1
+                self._lru.move_to_end(key)
+                out.append([dict(h) for h in hits])
+        return out
+
+    def put(self, key: bytes, generation: int, hits: List[Dict[str, Any]]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if not self._sync(generation):
+                return
+            self._lru[key] = tuple(dict(h) for h in hits)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.capacity:
+                self._lru.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+# singleton exportado
+retrieval_cache = RetrievalCache(settings.RETRIEVAL_CACHE_SIZE)
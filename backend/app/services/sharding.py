@@ -0,0 +1,229 @@
+# app/services/sharding.py
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import os
+import threading
+import time
+import zlib
+
+import faiss
+import numpy as np
+
+from app.services.index import VectorIndex, SNAPSHOT_FILE, _read_json, _write_json_atomic
+
+SHARDS_FILE = "shards.json"
+
+
+def _shard_dir(path: str, i: int) -> str:
+    return os.path.join(path, f"shard-{i:02d}")
+
+
+class ShardedVectorIndex:
+    """
+    N VectorIndex independentes (FAISS + doc store + WAL próprios), com a mesma API do VectorIndex.
+    - add: cada chunk vai para o shard crc32(texto) % N (estável entre execuções)
+    - ids: seq * N + shard → delete por id vai direto ao shard dono
+    - busca: fan-out em paralelo (o FAISS solta o GIL) e merge top-k com heap
+    - save/load: um subdiretório por shard (shard-00, shard-01, ...)
+    """
+
+    def __init__(self, n_shards: int, index_type: str | None = None):
+        if n_shards < 1:
+            raise ValueError(f"INDEX_SHARDS inválido: {n_shards}")
+        self.n_shards = n_shards
+        self.shards = [VectorIndex(index_type, shard=i, n_shards=n_shards) for i in range(n_shards)]
+        self.index_type = self.shards[0].index_type
+        self.load_stats: Dict[str, Any] = {}
+        self._pool = ThreadPoolExecutor(max_workers=n_shards, thread_name_prefix="index-shard")
+        self._write_lock = threading.Lock()   # upsert = delete em todos + add (sem intercalar)
+
+    # ---------- util ----------
+    def _map(self, fn, *iterables) -> list:
+        """Executa fn em cada shard em paralelo, preservando a ordem."""
+        return list(self._pool.map(fn, *iterables))
+
+    def _route(self, texts: List[str]) -> np.ndarray:
+        return np.fromiter(
+            (zlib.crc32((t or "").encode("utf-8")) % self.n_shards for t in texts),
+            dtype=np.int64, count=len(texts),
+        )
+
+    @property
+    def index(self) -> faiss.Index | None:
+        return next((s.index for s in self.shards if s.index is not None), None)
+
+    @property
+    def dim(self) -> int | None:
+        return next((s.dim for s in self.shards if s.dim is not None), None)
+
+    @property
+    def generation(self) -> int:
+        """Soma das gerações dos shards (cresce a cada alteração em qualquer um)."""
+        return sum(s.generation for s in self.shards)
+
+    def current_type(self) -> str:
+        return self.shards[0].current_type()
+
+    def count(self) -> int:
+        return sum(s.count() for s in self.shards)
+
+    def deleted_count(self) -> int:
+        return sum(s.deleted_count() for s in self.shards)
+
+    # ---------- escrita ----------
+    def add_documents(
+        self,
+        texts: List[str],
+        metas: List[Dict[str, Any]],
+        vectors,
+        *,
+        replace: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        if not texts:
+            return {"ingested": 0, "total_docs": self.count()}
+        if len(metas) < len(texts):
+            metas = metas + [{} for _ in range(len(texts) - len(metas))]
+        vecs = VectorIndex._as_ndarray(vectors)
+        if vecs.ndim != 2:
+            raise ValueError(f"Esperado shape (n, dim) para vectors, obtido {vecs.shape}")
+
+        route = self._route(texts)
+        with self._write_lock:
+            # o upsert remove em todos os shards: os chunks antigos podem estar em qualquer um
+            replaced = self.delete_where(replace) if replace else 0
+            for i, shard in enumerate(self.shards):
+                rows = np.flatnonzero(route == i)
+                if len(rows):
+                    shard.add_documents(
+                        [texts[r] for r in rows], [metas[r] for r in rows], vecs[rows]
+                    )
+
+        out = {"ingested": len(texts), "total_docs": self.count()}
+        if replace:
+            out["replaced"] = replaced
+        return out
+
+    def delete(self, ids) -> int:
+        ids = np.asarray(list(ids), dtype=np.int64)
+        return sum(
+            shard.delete(ids[ids % self.n_shards == i].tolist())
+            for i, shard in enumerate(self.shards)
+            if (ids % self.n_shards == i).any()
+        )
+
+    def delete_where(self, where: Dict[str, Any]) -> int:
+        return sum(self._map(lambda s: s.delete_where(where), self.shards))
+
+    def ids_where(self, where: Dict[str, Any]) -> List[int]:
+        return sorted(itertools.chain.from_iterable(self._map(lambda s: s.ids_where(where), self.shards)))
+
+    def owned_ids_where(self, where: Dict[str, Any]) -> List[int]:
+        return sorted(itertools.chain.from_iterable(self._map(lambda s: s.owned_ids_where(where), self.shards)))
+
+    def find_existing(self, hashes: List[bytes], exclude: Optional[set] = None) -> List[Optional[int]]:
+        per_shard = self._map(lambda s: s.find_existing(hashes, exclude), self.shards)
+        return [next((r[i] for r in per_shard if r[i] is not None), None) for i in range(len(hashes))]
+
+    def merge_meta(self, ids: List[int], metas: List[Dict[str, Any]]) -> int:
+        total = 0
+        for i, shard in enumerate(self.shards):
+            pos = [j for j, did in enumerate(ids) if did % self.n_shards == i]
+            if pos:
+                total += shard.merge_meta([ids[j] for j in pos], [metas[j] for j in pos])
+        return total
+
+    def compact(self) -> Dict[str, Any]:
+        outs = self._map(lambda s: s.compact(), self.shards)
+        return {
+            "compacted": any(o["compacted"] for o in outs),
+            "removed": sum(o["removed"] for o in outs),
+            "total_docs": self.count(),
+        }
+
+    # ---------- busca ----------
+    def search_many(self, query_vectors, k: int = 3, **kwargs) -> List[List[Dict[str, Any]]]:
+        """Fan-out do search_many em todos os shards + merge dos top-k por score (mesmos kwargs)."""
+        q = VectorIndex._as_ndarray(query_vectors)
+        n_queries = 1 if q.ndim == 1 else int(q.shape[0])
+        per_shard = self._map(lambda s: s.search_many(q, k, **kwargs), self.shards)
+        return [
+            heapq.nlargest(k, itertools.chain.from_iterable(r[qi] for r in per_shard), key=lambda h: h["score"])
+            for qi in range(n_queries)
+        ]
+
+    def search_lexical_many(self, queries: List[str], k: int = 3, **kwargs) -> List[List[Dict[str, Any]]]:
+        """BM25 em cada shard + merge por score (idf/tamanho médio são estatísticas locais de cada shard)."""
+        per_shard = self._map(lambda s: s.search_lexical_many(queries, k, **kwargs), self.shards)
+        return [
+            heapq.nlargest(k, itertools.chain.from_iterable(r[qi] for r in per_shard), key=lambda h: h["score"])
+            for qi in range(len(queries))
+        ]
+
+    def vectors_of(self, ids) -> Optional[np.ndarray]:
+        """Vetores dos ids, cada um lido do shard dono (id % N)."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if self.dim is None or len(ids) == 0:
+            return None
+        out = np.empty((len(ids), self.dim), dtype=np.float32)
+        for i, shard in enumerate(self.shards):
+            mask = ids % self.n_shards == i
+            if mask.any():
+                vecs = shard.vectors_of(ids[mask])
+                if vecs is None:
+                    return None
+                out[mask] = vecs
+        return out
+
+    def search_with_scores(self, query_vectors, k: int = 3, **kwargs) -> List[Dict[str, Any]]:
+        q = VectorIndex._as_ndarray(query_vectors)
+        if q.ndim == 2:
+            q = q[:1]
+        return self.search_many(q, k, **kwargs)[0]
+
+    def search(self, query_vectors, k: int = 3, **kwargs) -> List[Dict[str, Any]]:
+        return self.search_with_scores(query_vectors, k, **kwargs)
+
+    # ---------- persistência ----------
+    def save(self, path: str = "data") -> None:
+        os.makedirs(path, exist_ok=True)
+        self._map(lambda i: self.shards[i].save(_shard_dir(path, i)), range(self.n_shards))
+        _write_json_atomic(os.path.join(path, SHARDS_FILE), {"n_shards": self.n_shards})
+
+    def load(self, path: str = "data", wal: Optional[bool] = None) -> None:
+        t0 = time.perf_counter()
+        layout = _read_json(os.path.join(path, SHARDS_FILE))
+        if layout is not None and int(layout["n_shards"]) != self.n_shards:
+            raise ValueError(
+                f"{path} tem {layout['n_shards']} shards, mas INDEX_SHARDS={self.n_shards} "
+                "(reindexe ou ajuste o .env)."
+            )
+        if layout is None and os.path.exists(os.path.join(path, SNAPSHOT_FILE)):
+            raise ValueError(f"{path} contém um índice sem shards; use INDEX_SHARDS=1 ou reindexe.")
+        os.makedirs(path, exist_ok=True)
+        _write_json_atomic(os.path.join(path, SHARDS_FILE), {"n_shards": self.n_shards})
+        self._map(lambda i: self.shards[i].load(_shard_dir(path, i), wal=wal), range(self.n_shards))
+        stats = [s.load_stats for s in self.shards]
+        self.load_stats = {
+            "seconds": round(time.perf_counter() - t0, 3),
+            "mmap": all(st.get("mmap") for st in stats),
+            "wal_replayed": sum(st.get("wal_replayed", 0) for st in stats),
+            "shards": stats,
+        }
+
+    def checkpoint(self, path: Optional[str] = None) -> bool:
+        saved = self._map(
+            lambda i: self.shards[i].checkpoint(_shard_dir(path, i) if path else None),
+            range(self.n_shards),
+        )
+        return any(saved)
+
+    def start_checkpointer(self, interval_s: Optional[float] = None) -> None:
+        for s in self.shards:
+            s.start_checkpointer(interval_s)
+
+    def stop_checkpointer(self) -> None:
+        for s in self.shards:
+            s.stop_checkpointer()
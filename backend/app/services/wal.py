@@ -0,0 +1,124 @@
+# app/services/wal.py
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import os
+import json
+import struct
+import zlib
+
+import numpy as np
+
+# registro = cabeçalho (lsn, len(json), len(vetores), crc32) + JSON + vetores float32
+_HEADER = struct.Struct("<QIII")
+_PREFIX = "wal-"
+_SUFFIX = ".log"
+
+
+class WriteAheadLog:
+    """
+    Log append-only das mutações do índice, em segmentos `wal-<lsn>.log`.
+    - append(): grava 1 registro (custo proporcional ao tamanho da ingestão, não do corpus)
+    - replay(): devolve os registros com lsn > after_lsn; um final truncado (crash) é descartado
+    - rotate()/drop_until(): usados no checkpoint para aposentar segmentos já consolidados
+    """
+
+    def __init__(self, directory: str, fsync: bool = True):
+        self.directory = directory
+        self.fsync = fsync
+        self.last_lsn = 0
+        self._fh = None
+        self._active: Optional[str] = None
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------- util ----------
+    def _segments(self) -> List[str]:
+        names = [n for n in os.listdir(self.directory) if n.startswith(_PREFIX) and n.endswith(_SUFFIX)]
+        return [os.path.join(self.directory, n) for n in sorted(names)]
+
+    def _open_segment(self, first_lsn: int) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        self._active = os.path.join(self.directory, f"{_PREFIX}{first_lsn:016d}{_SUFFIX}")
+        self._fh = open(self._active, "ab")
+
+    @staticmethod
+    def _read_records(path: str) -> Iterator[Tuple[int, int, Dict[str, Any], Optional[np.ndarray]]]:
+        """Itera (offset_final, lsn, payload, vetores) até o fim ou o 1º registro inválido."""
+        with open(path, "rb") as f:
+            while True:
+                head = f.read(_HEADER.size)
+                if len(head) < _HEADER.size:
+                    return
+                lsn, jlen, vlen, crc = _HEADER.unpack(head)
+                body = f.read(jlen + vlen)
+                if len(body) < jlen + vlen or zlib.crc32(body) != crc:
+                    return
+                payload = json.loads(body[:jlen].decode("utf-8"))
+                vecs = None
+                if vlen:
+                    vecs = np.frombuffer(body[jlen:], dtype=np.float32).reshape(payload.pop("shape"))
+                yield f.tell(), lsn, payload, vecs
+
+    # ---------- API ----------
+    def size(self) -> int:
+        """Bytes ainda não consolidados por checkpoint."""
+        return sum(os.path.getsize(p) for p in self._segments())
+
+    def replay(self, after_lsn: int = 0) -> Iterator[Tuple[int, Dict[str, Any], Optional[np.ndarray]]]:
+        for path in self._segments():
+            good_end = 0
+            for good_end, lsn, payload, vecs in self._read_records(path):
+                self.last_lsn = max(self.last_lsn, lsn)
+                if lsn > after_lsn:
+                    yield lsn, payload, vecs
+            if good_end < os.path.getsize(path):
+                # cauda corrompida/truncada (crash no meio de um append): descarta
+                with open(path, "r+b") as f:
+                    f.truncate(good_end)
+        self.last_lsn = max(self.last_lsn, after_lsn)
+
+    def append(self, op: str, payload: Dict[str, Any], vectors: Optional[np.ndarray] = None) -> int:
+        if self._fh is None:
+            segs = self._segments()
+            if segs:
+                self._active = segs[-1]
+                self._fh = open(self._active, "ab")
+            else:
+                self._open_segment(self.last_lsn + 1)
+        vbytes = b""
+        payload = {"op": op, **payload}
+        if vectors is not None:
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            payload["shape"] = list(vectors.shape)
+            vbytes = vectors.tobytes()
+        jbytes = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        lsn = self.last_lsn + 1
+        self._fh.write(_HEADER.pack(lsn, len(jbytes), len(vbytes), zlib.crc32(jbytes + vbytes)))
+        self._fh.write(jbytes)
+        self._fh.write(vbytes)
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+        self.last_lsn = lsn
+        return lsn
+
+    def rotate(self) -> None:
+        """Fecha o segmento atual; o próximo append abre um novo."""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self._open_segment(self.last_lsn + 1)
+
+    def drop_until(self, lsn: int) -> None:
+        """Remove segmentos cujos registros são todos <= lsn (já estão no snapshot)."""
+        segs = self._segments()
+        for path, nxt in zip(segs, segs[1:]):
+            # o nome do segmento seguinte traz o 1º lsn dele → todos deste são menores
+            next_first = int(os.path.basename(nxt)[len(_PREFIX):-len(_SUFFIX)])
+            if path != self._active and next_first - 1 <= lsn:
+                os.remove(path)
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
@@ -0,0 +1,93 @@
+# app/tools/chunk_bench.py
+"""
+Compara o chunker por palavras (chunk_text) com o chunker por tokens do modelo (TokenChunker):
+velocidade (chunks/s, MB/s) e aproveitamento do max_seq_length (preenchimento × texto truncado).
+
+Uso (na pasta backend/):
+    python -m app.tools.chunk_bench
+    python -m app.tools.chunk_bench --file dump.txt --mb 20 --json
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import EmbeddingsService
+from app.tools.embed_parity import _SAMPLES
+from app.tools.index_report import _print_table
+from app.utils.chunk import chunk_text
+
+
+def _corpus(path: str | None, mb: float, seed: int = 0) -> str:
+    if path:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read(int(mb * 1024 * 1024))
+    # parágrafos com frases de tamanhos variados, até ~mb MB
+    rnd = random.Random(seed)
+    words = " ".join(_SAMPLES).split()
+    paras, size = [], 0
+    while size < mb * 1024 * 1024:
+        sents = [" ".join(rnd.choice(words) for _ in range(rnd.randint(5, 30))) + "." for _ in range(rnd.randint(1, 8))]
+        paras.append(" ".join(sents))
+        size += len(paras[-1]) + 2
+    return "\n\n".join(paras)
+
+
+def _row(mode: str, text: str, chunks: List[str], secs: float, tokenizer, limit: int) -> Dict[str, Any]:
+    lens = np.fromiter(
+        (len(ids) for ids in tokenizer(chunks, add_special_tokens=False)["input_ids"]), dtype=np.int64, count=len(chunks)
+    )
+    over = np.maximum(lens - limit, 0)
+    return {
+        "mode": mode,
+        "chunks": len(chunks),
+        "chunks_per_s": round(len(chunks) / secs, 1),
+        "mb_per_s": round(len(text.encode("utf-8")) / secs / 1e6, 2),
+        "avg_tokens": round(float(lens.mean()), 1),
+        "fill": round(float(np.minimum(lens, limit).mean() / limit), 3),      # uso do max_seq_length
+        "truncated_chunks": round(float((over > 0).mean()), 4),               # chunks cortados pelo modelo
+        "truncated_tokens": round(float(over.sum() / lens.sum()), 4),         # texto que nunca vira vetor
+    }
+
+
+def bench(text: str) -> List[Dict[str, Any]]:
+    svc = EmbeddingsService(cache=False)
+    chunker = svc.chunker()
+    if chunker is None:
+        raise SystemExit("O backend de embeddings não expõe um tokenizer fast (ou CHUNK_MODE != tokens).")
+    limit = svc.model.max_seq_length - 2  # o que cabe além de [CLS]/[SEP]
+
+    t0 = time.perf_counter()
+    words = chunk_text(text)
+    words_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    tokens = chunker.chunk(text)
+    tokens_s = time.perf_counter() - t0
+    return [
+        _row("words (chunk_text)", text, words, words_s, chunker.tokenizer, limit),
+        _row(f"tokens (max={chunker.max_tokens}, overlap={chunker.overlap})", text, tokens, tokens_s, chunker.tokenizer, limit),
+    ]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Chunker por palavras × por tokens do EMBED_MODEL.")
+    ap.add_argument("--file", default=None, help=".txt de entrada (padrão: texto sintético)")
+    ap.add_argument("--mb", type=float, default=5.0, help="tamanho do texto em MB")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    print(f"[chunk_bench] modelo: {settings.EMBED_MODEL}")
+    rows = bench(_corpus(args.file, args.mb))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        _print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
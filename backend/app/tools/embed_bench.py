@@ -0,0 +1,121 @@
+# app/tools/embed_bench.py
+"""
+Benchmark do encode: batch fixo do sentence-transformers × lotes por orçamento de tokens
+numa mistura realista (chunks de ~180 palavras do chunk_text + perguntas curtas).
+
+Uso (na pasta backend/):
+    python -m app.tools.embed_bench
+    python -m app.tools.embed_bench --file notas.txt --questions 500 --budgets 4096,8192,16384 --json
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import EmbeddingsService, encode_bucketed, token_batches, token_lengths
+from app.tools.embed_parity import _SAMPLES
+from app.tools.index_report import _print_table
+from app.utils.chunk import chunk_text
+
+
+def _mix(path: str | None, n_chunks: int, n_questions: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    if path:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            words = f.read().split()
+    else:
+        words = " ".join(_SAMPLES).split()
+    # documentos de tamanho variado → chunks cheios de 180 palavras + "restos" mais curtos
+    chunks: List[str] = []
+    while len(chunks) < n_chunks:
+        doc = " ".join(rnd.choice(words) for _ in range(rnd.randint(40, 900)))
+        chunks += chunk_text(doc)
+    questions = [" ".join(rnd.choice(words) for _ in range(rnd.randint(4, 14))) + "?" for _ in range(n_questions)]
+    texts = chunks[:n_chunks] + questions
+    rnd.shuffle(texts)  # ordem de chegada misturada, como numa ingestão + consultas
+    return texts
+
+
+def _padding(lengths: np.ndarray, batches: List[np.ndarray]) -> float:
+    """Fração dos tokens processados que é padding."""
+    total = sum(len(b) * int(lengths[b].max()) for b in batches)
+    return round(1 - int(lengths.sum()) / total, 4) if total else 0.0
+
+
+def _fixed_batches(texts: List[str], batch_size: int) -> List[np.ndarray]:
+    # o sentence-transformers ordena por nº de caracteres (decrescente) e fatia em batch_size
+    order = np.argsort([-len(t) for t in texts], kind="stable")
+    return [order[a:a + batch_size] for a in range(0, len(order), batch_size)]
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench(texts: List[str], budgets: List[int], batch_size: int, max_items: int, repeat: int) -> List[Dict[str, Any]]:
+    svc = EmbeddingsService(cache=False)
+    model = svc.load()
+    svc.warmup()
+    normed = [svc._normalize_text(t) for t in texts]
+    lengths = token_lengths(model, normed)
+
+    ref = np.asarray(model.encode(normed, batch_size=batch_size, normalize_embeddings=True), dtype="float32")
+    base_s = _best_of(lambda: model.encode(normed, batch_size=batch_size, normalize_embeddings=True), repeat)
+    rows = [{
+        "mode": f"fixed batch_size={batch_size}",
+        "texts": len(texts),
+        "batches": len(_fixed_batches(normed, batch_size)),
+        "padding": _padding(lengths, _fixed_batches(normed, batch_size)),
+        "texts_per_s": round(len(texts) / base_s, 1),
+        "speedup": 1.0,
+        "max_abs_diff": 0.0,
+    }]
+    for budget in budgets:
+        batches = token_batches(lengths, budget, max_items)
+        vecs = encode_bucketed(model, normed, budget, max_items)
+        secs = _best_of(lambda: encode_bucketed(model, normed, budget, max_items), repeat)
+        rows.append({
+            "mode": f"token_budget={budget}",
+            "texts": len(texts),
+            "batches": len(batches),
+            "padding": _padding(lengths, batches),
+            "texts_per_s": round(len(texts) / secs, 1),
+            "speedup": round(base_s / secs, 2),
+            "max_abs_diff": float(np.abs(vecs - ref).max()),  # mesma saída, só muda o agrupamento
+        })
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Throughput do encode: batch fixo × orçamento de tokens.")
+    ap.add_argument("--file", default=None, help=".txt usado como vocabulário (padrão: frases de exemplo)")
+    ap.add_argument("--chunks", type=int, default=1000)
+    ap.add_argument("--questions", type=int, default=1000)
+    ap.add_argument("--budgets", default=str(settings.EMBED_TOKEN_BUDGET))
+    ap.add_argument("--batch-size", type=int, default=32, help="batch fixo de referência (padrão do sentence-transformers)")
+    ap.add_argument("--max-items", type=int, default=settings.EMBED_MAX_BATCH)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    budgets = [int(b) for b in args.budgets.split(",") if b.strip()]
+    texts = _mix(args.file, args.chunks, args.questions)
+    rows = bench(texts, budgets, args.batch_size, args.max_items, args.repeat)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        _print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
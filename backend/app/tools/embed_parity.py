@@ -0,0 +1,116 @@
+# app/tools/embed_parity.py
+"""
+Compara os backends de embeddings (torch / onnx / onnx_int8) num corpus de amostra:
+drift de cosine contra o backend de referência, concordância dos vizinhos top-k e tempo de encode.
+
+Uso (na pasta backend/):
+    python -m app.tools.embed_parity
+    python -m app.tools.embed_parity --backends torch,onnx_int8 --file notas.txt --limit 1000 --json
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import BACKENDS, EmbeddingsService
+from app.tools.index_report import _print_table
+from app.utils.chunk import chunk_text
+
+_SAMPLES = [
+    "RAG combina recuperação de informação com geração de texto, melhorando precisão.",
+    "Hugging Face Hub oferece modelos, datasets e spaces para IA.",
+    "Prompt Engineering é a prática de desenhar prompts para melhorar a resposta de LLMs.",
+    "FAISS faz busca por similaridade em vetores densos com índices exatos ou aproximados.",
+    "Embeddings representam frases como vetores; frases parecidas ficam próximas.",
+    "O que é RAG e por que é útil?",
+]
+
+
+def _sample_corpus(path: str | None, limit: int) -> List[str]:
+    if path:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return chunk_text(f.read())[:limit]
+    # sem arquivo: usa os chunks já indexados (ou as amostras fixas, se o índice estiver vazio)
+    from app.services.index import _make_index
+    vi = _make_index()
+    vi.load(settings.INDEX_DIR, wal=False)
+    texts: List[str] = []
+    for s in getattr(vi, "shards", [vi]):
+        texts += [s.docs.text(i) for i in range(min(limit - len(texts), len(s.docs)))]
+    return texts or _SAMPLES
+
+
+def _encode(backend: str, texts: List[str], batch_size: int) -> Dict[str, Any]:
+    svc = EmbeddingsService(backend=backend, cache=False)
+    t0 = time.perf_counter()
+    svc.load()
+    load_s = time.perf_counter() - t0
+    svc.warmup()
+    normed = [svc._normalize_text(t) for t in texts]
+    t0 = time.perf_counter()
+    vecs = np.concatenate([svc._encode_model(normed[a:a + batch_size]) for a in range(0, len(normed), batch_size)])
+    encode_s = time.perf_counter() - t0
+    return {"vecs": vecs, "load_s": load_s, "encode_s": encode_s}
+
+
+def _neighbors(vecs: np.ndarray, n_queries: int, k: int) -> np.ndarray:
+    sims = vecs[:n_queries] @ vecs.T
+    np.fill_diagonal(sims[:, :n_queries], -np.inf)  # ignora o próprio texto
+    return np.argsort(-sims, axis=1)[:, :k]
+
+
+def parity(backends: List[str], reference: str, texts: List[str], k: int, batch_size: int = 64) -> List[Dict[str, Any]]:
+    out = {b: _encode(b, texts, batch_size) for b in dict.fromkeys([reference, *backends])}
+    ref = out[reference]["vecs"]
+    k = max(1, min(k, len(texts) - 1))
+    n_queries = min(200, len(texts))
+    ref_nn = _neighbors(ref, n_queries, k)
+
+    rows = []
+    for b in backends:
+        vecs = out[b]["vecs"]
+        cos = np.sum(ref * vecs, axis=1)  # ambos L2-normalizados
+        nn = _neighbors(vecs, n_queries, k)
+        overlap = np.mean([len(np.intersect1d(a, c)) / k for a, c in zip(ref_nn, nn)])
+        rows.append({
+            "backend": b,
+            "texts": len(texts),
+            "cos_mean": round(float(cos.mean()), 6),
+            "cos_min": round(float(cos.min()), 6),
+            "drift_mean": round(float(1 - cos.mean()), 6),
+            f"top{k}_overlap": round(float(overlap), 4),
+            "load_s": round(out[b]["load_s"], 2),
+            "ms_per_text": round(out[b]["encode_s"] * 1000 / len(texts), 3),
+            "speedup": round(out[reference]["encode_s"] / out[b]["encode_s"], 2) if out[b]["encode_s"] else None,
+        })
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Drift de cosine e velocidade entre backends de embeddings.")
+    ap.add_argument("--backends", default=",".join(BACKENDS))
+    ap.add_argument("--reference", default="torch")
+    ap.add_argument("--file", default=None, help=".txt de amostra (padrão: chunks do índice em INDEX_DIR)")
+    ap.add_argument("--limit", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    unknown = [b for b in [*backends, args.reference] if b not in BACKENDS]
+    if unknown:
+        raise SystemExit(f"Backends desconhecidos: {unknown} (use {tuple(BACKENDS)})")
+
+    rows = parity(backends, args.reference, _sample_corpus(args.file, args.limit), args.k)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        _print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
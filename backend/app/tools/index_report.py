@@ -0,0 +1,151 @@
+# app/tools/index_report.py
+"""
+Compara os tipos de índice no corpus atual: memória, latência e recall@k contra o IndexFlatIP.
+
+Uso (na pasta backend/):
+    python -m app.tools.index_report
+    python -m app.tools.index_report --types flat,sq8,fp16,hnsw --k 10 --queries 500 --json
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.index import INDEX_TYPES, LOSSY_TYPES, VectorIndex
+
+
+def _corpus_vectors(path: str) -> np.ndarray:
+    # com shards, junta os vetores de todos (data/shard-XX)
+    shards = sorted(d for d in os.listdir(path) if d.startswith("shard-")) if os.path.isdir(path) else []
+    parts = []
+    for p in [os.path.join(path, d) for d in shards] or [path]:
+        vi = VectorIndex("flat")
+        vi.load(p, wal=False)
+        if vi.count() == 0:
+            continue
+        # só docs ativos (sem tombstones)
+        ids = vi.docs.ids()
+        live = ~np.isin(ids, np.fromiter(vi._tombstones, dtype=np.int64))
+        parts.append(vi.docs.vectors(np.flatnonzero(live)))
+    if not parts:
+        raise SystemExit(f"Índice vazio em {path} (ingira documentos antes).")
+    return np.ascontiguousarray(np.concatenate(parts))
+
+
+def _build(index_type: str, vecs: np.ndarray) -> faiss.Index:
+    vi = VectorIndex(index_type)
+    vi.dim = vecs.shape[1]
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(vi.dim)
+    else:
+        index = vi._build_ann(vecs)
+    index.add(vecs)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = settings.IVF_NPROBE
+    return index
+
+
+def _recall(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(t, f[f != -1])) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def _timed_search(index: faiss.Index, q: np.ndarray, k: int):
+    # latência por consulta (1 a 1, como no /query) + vazão do lote (como no /query/batch)
+    t0 = time.perf_counter()
+    for i in range(len(q)):
+        index.search(q[i:i + 1], k)
+    single_ms = (time.perf_counter() - t0) * 1000 / len(q)
+    t0 = time.perf_counter()
+    distances, indices = index.search(q, k)
+    batch_ms = (time.perf_counter() - t0) * 1000 / len(q)
+    return distances, indices, single_ms, batch_ms
+
+
+def _rescored(vecs: np.ndarray, q: np.ndarray, indices: np.ndarray, k: int) -> np.ndarray:
+    safe = np.maximum(indices, 0)
+    exact = np.einsum("qkd,qd->qk", vecs[safe], q)
+    exact[indices == -1] = -np.inf
+    order = np.argsort(-exact, axis=1)[:, :k]
+    return np.take_along_axis(indices, order, axis=1)
+
+
+def report(path: str, types: List[str], k: int, n_queries: int, seed: int = 0) -> List[Dict[str, Any]]:
+    vecs = _corpus_vectors(path)
+    n, dim = vecs.shape
+    rng = np.random.default_rng(seed)
+    # consultas = vetores do corpus com ruído (perto de docs reais, mas não idênticas)
+    q = vecs[rng.choice(n, min(n_queries, n), replace=False)]
+    q = q + rng.normal(scale=0.05, size=q.shape).astype(np.float32)
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    k = min(k, n)
+
+    truth = faiss.IndexFlatIP(dim)
+    truth.add(vecs)
+    _, gt = truth.search(q, k)
+
+    rows = []
+    factor = max(settings.RESCORE_FACTOR, 2)
+    for t in types:
+        t0 = time.perf_counter()
+        index = _build(t, vecs)
+        build_s = time.perf_counter() - t0
+        _, found, single_ms, batch_ms = _timed_search(index, q, k)
+        row = {
+            "type": t,
+            "docs": n,
+            "memory_mb": round(faiss.serialize_index(index).nbytes / 2**20, 2),
+            "build_s": round(build_s, 2),
+            "latency_ms": round(single_ms, 3),
+            "batch_ms_per_query": round(batch_ms, 3),
+            f"recall@{k}": round(_recall(gt, found), 4),
+        }
+        if t in LOSSY_TYPES:
+            t0 = time.perf_counter()
+            _, cand = index.search(q, min(k * factor, n))
+            rescored = _rescored(vecs, q, cand, k)
+            row[f"recall@{k}_rescore"] = round(_recall(gt, rescored), 4)
+            row["rescore_ms_per_query"] = round((time.perf_counter() - t0) * 1000 / len(q), 3)
+        rows.append(row)
+    return rows
+
+
+def _print_table(rows: List[Dict[str, Any]]) -> None:
+    cols = list(dict.fromkeys(c for r in rows for c in r))
+    widths = {c: max(len(c), *(len(str(r.get(c, "-"))) for r in rows)) for c in cols}
+    print("  ".join(c.ljust(widths[c]) for c in cols))
+    for r in rows:
+        print("  ".join(str(r.get(c, "-")).ljust(widths[c]) for c in cols))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Memória × latência × recall dos tipos de índice no corpus atual.")
+    ap.add_argument("--path", default=settings.INDEX_DIR, help="diretório do índice (padrão: INDEX_DIR)")
+    ap.add_argument("--types", default="flat,sq8,fp16,hnsw,ivf_flat,ivf_pq")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--json", action="store_true", help="saída em JSON (1 objeto por tipo)")
+    args = ap.parse_args()
+
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = [t for t in types if t not in INDEX_TYPES]
+    if unknown:
+        raise SystemExit(f"Tipos desconhecidos: {unknown} (use {INDEX_TYPES})")
+
+    rows = report(args.path, types, args.k, args.queries)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        _print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,115 @@
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+def iter_chunks(pieces: Iterable[str], max_tokens: int = 180, overlap: int = 30) -> Iterator[str]:
+    """
+    Mesmo split do chunk_text, mas consumindo o texto aos pedaços (ex.: leituras de um upload).
+    Guarda só a janela atual: a sobreposição e palavras cortadas entre leituras passam p/ o próximo pedaço.
+    """
+    step = max(1, max_tokens - overlap)
+    words: List[str] = []
+    tail = ""  # palavra possivelmente incompleta no fim do pedaço anterior
+    for piece in pieces:
+        if not piece:
+            continue
+        piece = tail + piece
+        parts = piece.split()
+        # se o pedaço não termina em espaço, a última palavra pode continuar na próxima leitura
+        tail = parts.pop() if parts and not piece[-1].isspace() else ""
+        words.extend(parts)
+        while len(words) >= max_tokens:
+            yield " ".join(words[:max_tokens])
+            del words[:step]
+    if tail:
+        words.append(tail)
+    while words:
+        yield " ".join(words[:max_tokens])
+        del words[:step]
 
 def chunk_text(text: str, max_tokens: int = 180, overlap: int = 30) -> List[str]:
     """Split simples por palavras (heurístico)."""
-    words = text.split()
-    chunks = []
-    i = 0
-    while i < len(words):
-        chunk = words[i : i + max_tokens]
-        if not chunk:
-            break
-        chunks.append(" ".join(chunk))
-        i += max_tokens - overlap
+    chunks = list(iter_chunks([text], max_tokens, overlap))
     return chunks if chunks else [text]
+
+# ------------------------------------------------------------
+# Chunker por tokens do próprio modelo de embeddings
+# - orçamento = max_seq_length do modelo (menos [CLS]/[SEP]): nada é truncado em silêncio
+# - usa os offsets do tokenizer "fast" p/ cortar em parágrafo > linha > frase > palavra
+# - overlap em tokens, começando sempre numa fronteira de palavra
+# ------------------------------------------------------------
+_SENTENCE_END_CPS = np.array([ord(c) for c in ".!?…;:"], dtype=np.uint32)
+
+class TokenChunker:
+    def __init__(self, tokenizer, max_tokens: int, overlap: int = 32, min_fill: float = 0.5):
+        self.tokenizer = tokenizer
+        self.max_tokens = max(8, max_tokens)
+        self.overlap = max(0, min(overlap, self.max_tokens // 2))
+        self.min_fill = min_fill  # não corta antes de preencher essa fração do orçamento
+
+    def _offsets(self, text: str) -> np.ndarray:
+        enc = self.tokenizer(
+            text, add_special_tokens=False, return_offsets_mapping=True,
+            return_attention_mask=False, return_token_type_ids=False, verbose=False,
+        )
+        offs = np.asarray(enc["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+        return offs[offs[:, 1] > offs[:, 0]]  # descarta tokens vazios (ex.: ▁ isolado)
+
+    @staticmethod
+    def _levels(text: str, offs: np.ndarray) -> np.ndarray:
+        """levels[i] = qualidade de cortar ANTES do token i (0 = meio de palavra ... 4 = parágrafo)."""
+        n = len(offs)
+        levels = np.zeros(n + 1, dtype=np.int8)
+        levels[n] = 4
+        prev_end, start = offs[:-1, 1], offs[1:, 0]
+        gap = start > prev_end  # espaço entre os tokens i-1 e i
+        # tudo vetorizado: code points do texto + posições das quebras de linha
+        cps = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        sentence = np.isin(cps[prev_end - 1], _SENTENCE_END_CPS)
+        newlines = np.flatnonzero(cps == 10)
+        n_nl = np.searchsorted(newlines, start) - np.searchsorted(newlines, prev_end)
+        inner = np.where(n_nl > 1, 4, np.where(n_nl == 1, 3, np.where(sentence, 2, 1)))
+        levels[1:n] = np.where(gap, inner, 0)
+        return levels
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """Intervalos (início, fim) em caracteres de cada chunk."""
+        offs = self._offsets(text)
+        n = len(offs)
+        if n == 0:
+            return []
+        levels = self._levels(text, offs)
+        out: List[Tuple[int, int]] = []
+        start = 0
+        while True:
+            end = min(start + self.max_tokens, n)
+            if end < n:
+                # melhor fronteira (maior nível; entre iguais, a mais tardia) na 2ª metade da janela
+                lo = start + max(1, int(self.max_tokens * self.min_fill))
+                window = levels[lo:end + 1]
+                end = lo + len(window) - 1 - int(np.argmax(window[::-1]))
+            out.append((int(offs[start, 0]), int(offs[end - 1, 1])))
+            if end >= n:
+                return out
+            # overlap: volta `overlap` tokens e avança até o início de uma palavra
+            nxt = max(start + 1, end - self.overlap)
+            while nxt < end and levels[nxt] == 0:
+                nxt += 1
+            start = nxt
+
+    def chunk(self, text: str) -> List[str]:
+        return [text[a:b] for a, b in self.spans(text)]
+
+    def iter_chunks(self, pieces: Iterable[str], buffer_chars: int = 1 << 16) -> Iterator[str]:
+        """Versão em fluxo: tokeniza ~buffer_chars por vez; o último chunk do buffer é refeito com o texto seguinte."""
+        buf = ""
+        for piece in pieces:
+            buf += piece
+            if len(buf) < buffer_chars:
+                continue
+            spans = self.spans(buf)
+            for a, b in spans[:-1]:
+                yield buf[a:b]
+            buf = buf[spans[-1][0]:] if spans else ""
+        for a, b in self.spans(buf):
+            yield buf[a:b]
@@ -0,0 +1,28 @@
+import json
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from fastapi.responses import StreamingResponse
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Um evento Server-Sent Events (data em JSON numa linha)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(events: Iterable[Tuple[str, Dict[str, Any]]]) -> StreamingResponse:
+    """StreamingResponse text/event-stream; erro no meio do stream vira um evento "error"."""
+    def _gen() -> Iterator[str]:
+        it = iter(events)
+        try:
+            for event, data in it:
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event("error", {"detail": getattr(e, "detail", None) or str(e)})
+        finally:
+            close = getattr(it, "close", None)
+            if close:
+                close()  # cliente desconectou → fecha o gerador (e cancela a geração do LLM)
+
+    return StreamingResponse(
+        _gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
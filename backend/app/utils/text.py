@@ -0,0 +1,42 @@
+import hashlib
+import re
+import unicodedata
+from typing import List
+
+def normalize_text(s: str) -> str:
+    # NFKC + casefold + colapsa espaços => robusto p/ maiúsculas/minúsculas/acentos
+    if not isinstance(s, str):
+        return ""
+    s = unicodedata.normalize("NFKC", s).casefold()
+    s = " ".join(s.split())
+    return s
+
+def content_hash(text: str) -> bytes:
+    """Hash (16 bytes) do texto normalizado: chunks iguais a menos de caixa/espaços colidem."""
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+# ---------------------------
+# tokens p/ busca lexical (BM25) e palavras-chave do prompt
+# ---------------------------
+STOPWORDS_PT = frozenset({
+    "a","o","as","os","um","uma","uns","umas","de","do","da","dos","das","em","no","na","nos","nas",
+    "para","por","e","ou","que","com","se","ao","aos","à","às","é","são","como","sobre","até","mais",
+    "menos","sem","sua","seu","suas","seus","minha","meu","nossa","nosso","nossas","nossos","isto",
+    "isso","aquilo","este","esta","esse","essa","aquele","aquela","ele","ela","eles","elas","você",
+    "vocês","eu","me","te","se","lhe","nos","vos","del","das","dos"
+})
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# blocos de diacríticos combinantes (o que sobra de "á" = "a" + U+0301 depois do NFKD)
+_COMBINING_RE = re.compile("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]+")
+
+def strip_accents(s: str) -> str:
+    # NFKD separa letra + acento e uma regex remove os acentos (sem loop por caractere em Python)
+    return _COMBINING_RE.sub("", unicodedata.normalize("NFKD", s or "")).lower().strip()
+
+def tokenize(text: str) -> List[str]:
+    toks = _WORD_RE.findall(strip_accents(text))
+    toks = [w for w in toks if len(w) >= 3 and w not in STOPWORDS_PT]
+    # sinônimos simples
+    if "h2o" in toks and "agua" not in toks:
+        toks.append("agua")
+    return toks
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# permite `pytest` a partir de backend/ (import app.*)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
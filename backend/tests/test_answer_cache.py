@@ -0,0 +1,24 @@
+# tests/test_answer_cache.py
+from app.core.config import settings
+from app.services import rag
+
+
+def test_scope_includes_retrieval_params(monkeypatch):
+    base = rag._query_scope(3, 0.7, 256, None, None, None)
+    assert base == rag._query_scope(3, 0.72, 256, None, None, None)   # mesma faixa de temperatura
+    assert base != rag._query_scope(3, 0.7, 256, 8, None, None)       # nprobe
+    assert base != rag._query_scope(3, 0.7, 256, None, 64, None)      # ef_search
+    assert base != rag._query_scope(3, 0.7, 256, None, None, {"source": "x"})
+    monkeypatch.setattr(settings, "HYBRID_SEARCH", not settings.HYBRID_SEARCH)
+    assert base != rag._query_scope(3, 0.7, 256, None, None, None)
+    monkeypatch.setattr(settings, "MMR_ENABLED", True)
+    mmr = rag._query_scope(3, 0.7, 256, None, None, None)
+    monkeypatch.setattr(settings, "MMR_LAMBDA", settings.MMR_LAMBDA / 2)
+    assert mmr != rag._query_scope(3, 0.7, 256, None, None, None)
+
+
+def test_chat_scope_includes_retrieval_params():
+    hist = [{"role": "user", "content": "oi"}]
+    assert rag._chat_scope(hist, 3, 0.7, 256, None, None, None, None) != rag._chat_scope(
+        hist, 3, 0.7, 256, None, 8, None, None
+    )
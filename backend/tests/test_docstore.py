@@ -0,0 +1,59 @@
+# tests/test_docstore.py
+import os
+
+import numpy as np
+import pytest
+
+from app.services import docstore
+from app.services.index import VectorIndex
+
+DIM = 8
+
+
+def _add(idx, start, n):
+    rng = np.random.default_rng(start)
+    idx.add_documents(
+        [f"doc {i}" for i in range(start, start + n)], [{"i": i} for i in range(start, start + n)],
+        rng.standard_normal((n, DIM)).astype(np.float32),
+    )
+
+
+def _check(idx):
+    rows = idx.docs.rows_of([3])
+    assert idx.docs.meta(int(rows[0])) == {"i": 3}
+    assert [h["id"] for h in idx.search_many(np.ones((1, DIM)), k=5, filters={"i": 3})[0]] == [3]
+
+
+def test_crash_while_rewriting_meta_ids_keeps_old_file(tmp_path, monkeypatch):
+    idx = VectorIndex("flat")
+    idx.load(str(tmp_path), wal=True)
+    _add(idx, 0, 50)
+    idx.checkpoint()
+    _add(idx, 50, 50)
+
+    real_replace = os.replace
+
+    def crash(src, dst):
+        if dst.endswith(docstore.META_IDS_FILE):
+            raise OSError("crash simulado")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(docstore.os, "replace", crash)
+    with pytest.raises(OSError):
+        idx.checkpoint()
+    monkeypatch.undo()
+
+    again = VectorIndex("flat")
+    again.load(str(tmp_path), wal=True)   # snapshot antigo + WAL
+    assert again.count() == 100
+    _check(again)
+
+
+def test_short_meta_ids_fails_loudly(tmp_path):
+    idx = VectorIndex("flat")
+    idx.load(str(tmp_path), wal=True)
+    _add(idx, 0, 50)
+    idx.checkpoint()
+    open(os.path.join(str(tmp_path), docstore.META_IDS_FILE), "wb").close()
+    with pytest.raises(ValueError, match="corrompido"):
+        VectorIndex("flat").load(str(tmp_path), wal=False)
@@ -0,0 +1,61 @@
+# tests/test_embed_cache.py
+import os
+
+import numpy as np
+
+from app.services import embed_cache
+from app.services.embed_cache import EmbeddingCache, cache_key
+
+DIM = 8
+
+
+def _batch(start, n):
+    keys = [cache_key("m", f"texto {i}") for i in range(start, start + n)]
+    vecs = np.arange(start, start + n, dtype=np.float32)[:, None].repeat(DIM, axis=1)
+    return keys, vecs
+
+
+def test_disk_lookup_after_reopen_uses_sorted_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_cache, "TAIL_MIN", 100)
+    c = EmbeddingCache("m", capacity=0, directory=str(tmp_path))
+    for start in range(0, 1000, 250):
+        c.put_many(*_batch(start, 250))
+    assert c.stats()["disk_entries"] == 1000
+    assert len(c._tail) <= max(100, len(c._sorted_prefix) // 8)   # só as chaves novas ficam em dict
+
+    again = EmbeddingCache("m", capacity=0, directory=str(tmp_path))
+    keys, vecs = _batch(0, 1000)
+    got = again.get_many(keys, DIM)
+    assert all(g is not None for g in got)
+    np.testing.assert_array_equal(np.stack(got), vecs)
+    assert again.get_many([cache_key("m", "nunca visto")], DIM) == [None]
+    assert again.stats()["hits_disk"] == 1000 and again.stats()["misses"] == 1
+
+    again.put_many(*_batch(0, 10))   # repetidas não são regravadas
+    assert again.stats()["disk_entries"] == 1000
+
+
+def test_prefix_collision_checks_full_key(tmp_path):
+    c = EmbeddingCache("m", capacity=0, directory=str(tmp_path))
+    a = b"\x01" * 8 + b"\x02" * 8
+    b = b"\x01" * 8 + b"\x03" * 8   # mesmo prefixo de 64 bits
+    c.put_many([a, b], np.array([[1.0] * DIM, [2.0] * DIM], dtype=np.float32))
+    again = EmbeddingCache("m", capacity=0, directory=str(tmp_path))
+    got = again.get_many([b, a, b"\x01" * 8 + b"\x04" * 8], DIM)
+    assert got[0][0] == 2.0 and got[1][0] == 1.0 and got[2] is None
+
+
+def test_rebuilds_index_after_torn_append(tmp_path):
+    c = EmbeddingCache("m", capacity=0, directory=str(tmp_path))
+    c.put_many(*_batch(0, 20))
+    slug_dir = c._dir
+    EmbeddingCache("m", capacity=0, directory=str(tmp_path)).get_many([], DIM)   # abre → grava o índice ordenado
+    assert os.path.exists(os.path.join(slug_dir, embed_cache.PREFIX_FILE))
+    # crash no meio do append: meia chave a mais e índice ordenado perdido
+    with open(os.path.join(slug_dir, embed_cache.KEYS_FILE), "ab") as f:
+        f.write(b"\xff" * 7)
+    os.remove(os.path.join(slug_dir, embed_cache.PREFIX_FILE))
+    again = EmbeddingCache("m", capacity=0, directory=str(tmp_path))
+    keys, vecs = _batch(0, 20)
+    np.testing.assert_array_equal(np.stack(again.get_many(keys, DIM)), vecs)
+    assert again.stats()["disk_entries"] == 20
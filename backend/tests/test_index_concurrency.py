@@ -0,0 +1,141 @@
+# tests/test_index_concurrency.py
+import threading
+
+import numpy as np
+
+from app.services.index import VectorIndex
+
+DIM = 16
+
+
+def _vecs(rng, n):
+    v = rng.standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_search_during_add_and_checkpoint(tmp_path):
+    """Buscas concorrentes nunca veem o índice/doc store vazio ou pela metade durante add + checkpoint."""
+    rng = np.random.default_rng(0)
+    idx = VectorIndex("flat")
+    idx.load(str(tmp_path), wal=True)
+    base = _vecs(rng, 50)
+    idx.add_documents([f"doc {i}" for i in range(50)], [{"i": i} for i in range(50)], base)
+    idx.checkpoint()
+
+    stop = threading.Event()
+    errors, empty = [], []
+
+    def reader():
+        q = base[:4]
+        while not stop.is_set():
+            try:
+                res = idx.search_many(q, k=3)
+                if any(len(r) == 0 for r in res) or any(h["text"] is None for r in res for h in r):
+                    empty.append(res)
+            except Exception as e:  # pragma: no cover - falha do teste
+                errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    try:
+        for rnd in range(20):
+            idx.add_documents([f"novo {rnd}-{j}" for j in range(5)], [{"rnd": rnd}] * 5, _vecs(rng, 5))
+            assert idx.checkpoint()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    assert not errors, errors[:3]
+    assert not empty, empty[:1]
+    assert idx.count() == 150
+    # o snapshot consolidado recarrega igual
+    again = VectorIndex("flat")
+    again.load(str(tmp_path), wal=False)
+    assert again.count() == 150
+    assert again.search_many(base[:1], k=1)[0][0]["text"] == "doc 0"
+
+
+def test_search_during_background_compaction(tmp_path):
+    """delete() que passa do COMPACT_THRESHOLD compacta em background sem esvaziar as buscas."""
+    rng = np.random.default_rng(1)
+    idx = VectorIndex("flat")
+    idx.load(str(tmp_path), wal=True)
+    vecs = _vecs(rng, 10)
+    idx.add_documents([f"doc {i}" for i in range(10)], [{"i": i} for i in range(10)], vecs)
+    idx.checkpoint()
+
+    stop = threading.Event()
+    bad = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                res = idx.search_many(vecs[[7, 8, 6]], k=1)
+                if [r[0]["id"] if r else None for r in res] != [7, 8, 6]:
+                    bad.append(res)
+            except Exception as e:  # pragma: no cover - falha do teste
+                bad.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    try:
+        assert idx.delete([3, 5]) == 2   # 2/10 ≥ 0.2 → compactação em background
+        idx._compact_thread.join(timeout=30)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+    assert not bad, bad[:1]
+    assert idx.deleted_count() == 0 and idx.count() == 8
+    assert [r[0]["id"] for r in idx.search_many(vecs[[7, 8, 6]], k=1)] == [7, 8, 6]
+
+
+def test_add_and_meta_proceed_while_checkpoint_writes(tmp_path, monkeypatch):
+    """A escrita do snapshot corre fora do lock: add/merge_meta não esperam o disco, e nada se perde."""
+    from app.services.docstore import DocStore
+
+    rng = np.random.default_rng(2)
+    idx = VectorIndex("flat")
+    idx.load(str(tmp_path), wal=True)
+    idx.add_documents([f"doc {i}" for i in range(20)], [{"i": i} for i in range(20)], _vecs(rng, 20))
+    idx.checkpoint()
+    idx.add_documents([f"doc {i}" for i in range(20, 30)], [{"i": i} for i in range(20, 30)], _vecs(rng, 10))
+
+    writing, release = threading.Event(), threading.Event()
+    real_save = DocStore.save
+
+    def slow_save(self, path):
+        writing.set()
+        assert release.wait(10)
+        return real_save(self, path)
+
+    monkeypatch.setattr(DocStore, "save", slow_save)
+    ckpt = threading.Thread(target=idx.checkpoint)
+    ckpt.start()
+    try:
+        assert writing.wait(10)
+        # checkpoint parado no disco: o writer não pode ficar bloqueado
+        done = threading.Event()
+
+        def writer():
+            idx.add_documents(["durante"], [{"i": 30}], _vecs(rng, 1))
+            idx.merge_meta([3], [{"extra": 1}])
+            done.set()
+
+        threading.Thread(target=writer).start()
+        assert done.wait(5)
+    finally:
+        release.set()
+        ckpt.join()
+    monkeypatch.undo()
+
+    assert idx.count() == 31
+    assert idx.docs.meta(3) == {"i": 3, "extra": 1} and idx.docs.text(30) == "durante"
+    idx.checkpoint()
+    again = VectorIndex("flat")
+    again.load(str(tmp_path), wal=False)
+    assert again.count() == 31 and again.docs.meta(3) == {"i": 3, "extra": 1}
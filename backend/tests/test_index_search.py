@@ -0,0 +1,60 @@
+# tests/test_index_search.py
+import threading
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.index import VectorIndex
+
+DIM = 32
+
+
+def test_range_search_on_quantized_index_returns_exact_scores(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_PROMOTE_AT", 100)
+    monkeypatch.setattr(settings, "RESCORE_FACTOR", 4)
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((300, DIM)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    idx = VectorIndex("sq8")
+    idx.add_documents([f"doc {i}" for i in range(300)], [{} for _ in range(300)], vecs)
+    idx._promote_thread.join(timeout=30)
+    assert idx.current_type() == "sq8"
+
+    q = vecs[:8] + 0.05 * rng.standard_normal((8, DIM)).astype(np.float32)
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    for res, qv in zip(idx.search_many(q, k=5, min_sim=0.3, use_range=True), q):
+        assert res
+        for h in res:
+            exact = float(vecs[h["id"]] @ qv)
+            assert abs(h["score"] - exact) < 1e-5 and h["score"] <= 1.0 + 1e-6 and h["score"] >= 0.3
+
+
+def test_promotion_builds_in_background_and_replays_late_adds(monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_PROMOTE_AT", 100)
+    rng = np.random.default_rng(1)
+    vecs = rng.standard_normal((160, DIM)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    idx = VectorIndex("ivf_flat")
+    building, release = threading.Event(), threading.Event()
+    real_build = VectorIndex._build_ann
+
+    def slow_build(self, v):
+        building.set()
+        assert release.wait(10)
+        return real_build(self, v)
+
+    monkeypatch.setattr(VectorIndex, "_build_ann", slow_build)
+    idx.add_documents([f"doc {i}" for i in range(100)], [{} for _ in range(100)], vecs[:100])
+    assert building.wait(5)
+    # build parado: adds e buscas seguem no Flat, sem esperar o treino
+    idx.add_documents([f"doc {i}" for i in range(100, 150)], [{} for _ in range(50)], vecs[100:150])
+    idx.delete([120])
+    assert idx.current_type() == "flat"
+    assert idx.search_many(vecs[140:141], k=1)[0][0]["id"] == 140
+    release.set()
+    idx._promote_thread.join(timeout=30)
+
+    assert idx.current_type() == "ivf_flat" and idx.index.ntotal == 150
+    top = [r[0]["id"] for r in idx.search_many(vecs[[3, 110, 149]], k=1, nprobe=64)]
+    assert top == [3, 110, 149]
+    assert all(h["id"] != 120 for h in idx.search_many(vecs[120:121], k=5, nprobe=64)[0])
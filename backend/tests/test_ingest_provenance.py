@@ -0,0 +1,84 @@
+# tests/test_ingest_provenance.py
+import zlib
+
+import numpy as np
+import pytest
+
+from app.routes import ingest
+from app.services.index import VectorIndex
+
+DIM = 16
+
+
+def _fake_encode(texts, bulk=False):
+    """Vetor determinístico por texto (sem modelo): mesmo texto → mesmo vetor."""
+    out = np.stack([np.random.default_rng(zlib.crc32(t.encode())).standard_normal(DIM) for t in texts])
+    return (out / np.linalg.norm(out, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture
+def idx(monkeypatch, tmp_path):
+    index = VectorIndex("flat")
+    index.load(str(tmp_path), wal=True)
+    monkeypatch.setattr(ingest, "vector_index", index)
+    monkeypatch.setattr(ingest.embeddings_service, "encode", _fake_encode)
+    return index
+
+
+def _upsert(name, texts):
+    meta = {"filename": name}
+    return ingest._ingest_texts_impl(texts, [meta] * len(texts), do_chunk=False, replace=meta)
+
+
+def _top(index, text):
+    hits = index.search(_fake_encode([text]), k=1)
+    return hits[0] if hits and hits[0]["text"] == text else None
+
+
+def test_reupsert_keeps_shared_chunk_of_other_file(idx):
+    _upsert("a.txt", ["trecho comum", "só no A v1"])
+    out = _upsert("b.txt", ["trecho comum", "só no B"])
+    assert out["deduplicated"] == 1 and out["merged"] == 1
+    assert _top(idx, "trecho comum")["meta"]["filename"] == ["a.txt", "b.txt"]
+
+    # reenviar A sem o trecho comum: o chunk continua, agora só com a origem B
+    _upsert("a.txt", ["só no A v2"])
+    hit = _top(idx, "trecho comum")
+    assert hit is not None and hit["meta"]["filename"] == "b.txt"
+    assert _top(idx, "só no A v1") is None
+    assert _top(idx, "só no A v2") is not None
+    assert sorted(idx.ids_where({"filename": "b.txt"})) == sorted(
+        h["id"] for t in ("trecho comum", "só no B") for h in [_top(idx, t)]
+    )
+
+
+def test_delete_where_only_drops_provenance_of_shared_chunk(idx):
+    _upsert("a.txt", ["trecho comum", "só no A"])
+    _upsert("b.txt", ["trecho comum"])
+    assert idx.delete_where({"filename": "a.txt"}) == 1   # só o "só no A" sai
+    hit = _top(idx, "trecho comum")
+    assert hit is not None and hit["meta"]["filename"] == "b.txt"
+    assert idx.delete_where({"filename": "b.txt"}) == 1
+    assert idx.count() == 0
+
+
+def test_reupsert_same_file_with_shared_chunk(idx):
+    _upsert("a.txt", ["trecho comum"])
+    _upsert("b.txt", ["trecho comum"])
+    out = _upsert("a.txt", ["trecho comum"])   # A reenviado igual: nada é reindexado nem duplicado
+    assert out["ingested"] == 0 and out["deduplicated"] == 1
+    assert idx.count() == 1
+    assert _top(idx, "trecho comum")["meta"]["filename"] == ["b.txt", "a.txt"]
+
+
+def test_stripped_provenance_survives_reload(idx, tmp_path):
+    _upsert("a.txt", ["trecho comum", "só no A"])
+    _upsert("b.txt", ["trecho comum"])
+    _upsert("a.txt", ["só no A v2"])
+    if idx._compact_thread is not None:
+        idx._compact_thread.join(timeout=30)
+    idx.checkpoint()
+    again = VectorIndex("flat")
+    again.load(str(tmp_path), wal=False)
+    assert again.count() == 2
+    assert _top(again, "trecho comum")["meta"]["filename"] == "b.txt"
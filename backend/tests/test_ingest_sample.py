@@ -0,0 +1,23 @@
+# tests/test_ingest_sample.py
+import pytest
+from fastapi import HTTPException
+
+from app.routes import ingest
+from app.services.index import VectorIndex
+
+from test_ingest_provenance import _fake_encode
+
+
+def test_sample_runs_as_ingest_job(monkeypatch):
+    monkeypatch.setattr(ingest, "vector_index", VectorIndex("flat"))
+    monkeypatch.setattr(ingest.embeddings_service, "encode", _fake_encode)
+    out = ingest.ingest_sample()
+    assert out["ingested"] == 3
+    assert ingest.ingest_jobs.list(1)[0]["kind"] == "sample"
+
+
+def test_sample_respects_pending_limit(monkeypatch):
+    monkeypatch.setattr(ingest.ingest_jobs, "max_pending", 0)
+    with pytest.raises(HTTPException) as e:
+        ingest.ingest_sample()
+    assert e.value.status_code == 429
@@ -0,0 +1,56 @@
+# tests/test_lexical.py
+import os
+
+import numpy as np
+
+from app.services import lexical
+from app.services.index import VectorIndex
+
+DIM = 8
+
+
+def _add(idx, texts):
+    rng = np.random.default_rng(len(idx.docs))
+    idx.add_documents(texts, [{} for _ in texts], rng.standard_normal((len(texts), DIM)).astype(np.float32))
+
+
+def _lex_hits(idx, query):
+    return [h["text"] for h in idx.search_lexical_many([query], k=5)[0]]
+
+
+def test_checkpoint_appends_bm25_segment_instead_of_rewriting(tmp_path):
+    path = str(tmp_path)
+    idx = VectorIndex("flat")
+    idx.load(path, wal=True)
+    _add(idx, ["gato preto", "cachorro branco"])
+    idx.checkpoint()
+    base = os.path.join(path, lexical.LEXICAL_FILE)
+    inode = os.stat(base).st_ino
+
+    _add(idx, ["gato amarelo", "papagaio verde"])
+    idx.checkpoint()
+    _add(idx, ["papagaio azul"])
+    idx.checkpoint()
+    assert os.stat(base).st_ino == inode   # lexical.npz intocado
+    assert len([n for n in os.listdir(path) if n.endswith(".seg.npz")]) == 2
+
+    again = VectorIndex("flat")
+    again.load(path, wal=False)
+    assert again._lexical is not None        # carregado do disco (não remontado)
+    assert sorted(_lex_hits(again, "gato")) == ["gato amarelo", "gato preto"]
+    assert sorted(_lex_hits(again, "papagaio")) == ["papagaio azul", "papagaio verde"]
+
+
+def test_too_many_segments_rewrites_bm25(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.index.MAX_SEGMENTS", 2)
+    path = str(tmp_path)
+    idx = VectorIndex("flat")
+    idx.load(path, wal=True)
+    for i in range(4):
+        _add(idx, [f"termo{i} comum"])
+        idx.checkpoint()
+    # 1º checkpoint: npz; 2º e 3º: segmentos; 4º: regrava o npz e apaga os segmentos
+    assert not [n for n in os.listdir(path) if n.endswith(".seg.npz")]
+    again = VectorIndex("flat")
+    again.load(path, wal=False)
+    assert again._lexical is not None and len(_lex_hits(again, "comum")) == 4
@@ -0,0 +1,23 @@
+# tests/test_rag_rerank.py
+import numpy as np
+
+from app.core.config import settings
+from app.services import rag
+
+
+def test_dense_only_path_keeps_keyword_rerank(monkeypatch):
+    dense = [
+        {"id": 1, "text": "O futebol é popular no Brasil.", "meta": {}, "score": 0.50},
+        {"id": 2, "text": "O rio Amazonas é o maior rio do mundo.", "meta": {}, "score": 0.40},
+    ]
+    monkeypatch.setattr(settings, "HYBRID_SEARCH", False)
+    monkeypatch.setattr(settings, "MMR_ENABLED", False)
+    monkeypatch.setattr(rag.vector_index, "search_many", lambda q, k, **kw: [[dict(h) for h in dense]])
+    monkeypatch.setattr(rag.vector_index, "search_lexical_many", _no_bm25)
+    out = rag._search_contexts(["qual o maior rio?"], 2, None, None, None, query_vectors=np.zeros((1, 4)))
+    assert [h["id"] for h in out[0]] == [2]
+    assert out[0][0]["orig_score"] == 0.40 and out[0][0]["_overlap"] == 2
+
+
+def _no_bm25(*args, **kwargs):
+    raise AssertionError("HYBRID_SEARCH=0 não deve consultar o BM25")
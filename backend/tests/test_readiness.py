@@ -0,0 +1,45 @@
+# tests/test_readiness.py
+import threading
+
+from app.services.readiness import Readiness
+
+
+def _boom():
+    raise RuntimeError("snapshot corrompido")
+
+
+def test_failed_required_component_stays_unready():
+    r = Readiness()
+    r.start([("embeddings", lambda: None, True, None), ("index", _boom, True, None)])
+    assert not r.wait(5)
+    snap = r.snapshot()
+    assert snap["ready"] is False
+    assert snap["status"] == "degraded" and snap["degraded"] == ["index"]
+    assert snap["components"]["index"]["error"] == "snapshot corrompido"
+
+
+def test_optional_seed_failure_does_not_block():
+    r = Readiness()
+    r.start([("index", lambda: None, True, None), ("seed", _boom, False, "index")])
+    assert r.wait(5)
+    assert r.snapshot()["status"] == "degraded" and r.snapshot()["ready"] is True
+    assert r.snapshot()["components"]["seed"]["required"] is False
+
+
+def test_not_ready_while_required_component_loads():
+    r = Readiness()
+    release = threading.Event()
+    r.start([("index", release.wait, True, None), ("llm_local", lambda: None, False, None)])
+    assert not r.wait(0.2)
+    assert r.snapshot()["status"] == "starting"
+    release.set()
+    assert r.wait(5) and r.snapshot()["status"] == "ready" and r.degraded == []
+
+
+def test_task_is_skipped_when_its_dependency_fails():
+    r = Readiness()
+    ran = []
+    r.start([("index", _boom, True, None), ("seed", lambda: ran.append(1), False, "index")])
+    assert not r.wait(5)
+    assert ran == [] and r.snapshot()["components"]["seed"]["status"] == "skipped"
+    assert r.degraded == ["index"]
@@ -78,6 +78,20 @@ def _post_multipart(url: str, files, data: dict, timeout=120):
     r.raise_for_status()
     return r.json(), dt
 
+def _wait_job(job_id: str, timeout=600, every=0.5):
+    """Acompanha um job de ingestão (/ingest/jobs/{id}) até terminar."""
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        r = requests.get(f"{BACKEND_URL}/ingest/jobs/{job_id}", timeout=10)
+        r.raise_for_status()
+        job = r.json()
+        if job["status"] == "done":
+            return job["result"]
+        if job["status"] == "failed":
+            raise RuntimeError(job.get("error") or "job falhou")
+        time.sleep(every)
+    raise TimeoutError(f"job {job_id} ainda em andamento")
+
 # ===================== utils =====================
 def _snippet(txt: str, limit=260):
     txt = " ".join((txt or "").split())
@@ -172,8 +186,9 @@ with left:
             data = {"chunk": str(chunk).lower()}
             with st.spinner("Indexando arquivo…"):
                 _res, _ = _post_multipart(f"{BACKEND_URL}/ingest/file", files, data)
+                _res = _wait_job(_res["job_id"])  # a indexação roda em background no backend
             remember_snippets(snippets, f"arquivo:{up.name}")
-            st.success(f"Ingerido: {up.name}")
+            st.success(f"Ingerido: {up.name} • {_res.get('ingested','?')} chunks")
         except Exception as e:
             st.error(f"Falha ao ingerir arquivo: {e}")
 